@@ -1,9 +1,12 @@
 import psycopg2
 import psycopg2.extras
-import csv
 import time
 import os
 from multiprocessing import Pool, cpu_count
+from familias import actualizar_familias
+from claves import normalizar_matricula, separar_matriculas
+from mapa_compartido import MapaCompartido
+from rangos_csv import leer_filas, planificar_rangos
 
 # --- COPIA AQUÍ TUS CREDENCIALES DE LA BASE DE DATOS ---
 db_host = "aws-0-sa-east-1.pooler.supabase.com"
@@ -13,76 +16,117 @@ db_password = "cristianpixel01@"
 db_port = "6543"
 
 # --- CONFIGURACIÓN ---
-CARPETA_CHUNKS = 'chunks_para_procesar'
+ARCHIVO_CSV = 'Libro4.csv'
 # Usa casi todos los núcleos disponibles para dejar uno libre para el sistema
 NUMERO_DE_PROCESOS = max(1, cpu_count() - 1) 
+# Cada proceso recibe varios rangos de bytes del archivo para repartir mejor la carga
+RANGOS_POR_PROCESO = 4
 
-def procesar_chunk(nombre_archivo_chunk):
+# Mapa matrícula -> id de cada proceso trabajador: apunta a la memoria compartida
+# que publica el proceso principal (no es una copia)
+matriculas_cache = None
+
+def iniciar_trabajador(descriptor_mapa):
+    """Inicializador del Pool: se conecta al mapa compartido (costo constante, sin consultar la BD)."""
+    global matriculas_cache
+    matriculas_cache = MapaCompartido.conectar(descriptor_mapa)
+
+def publicar_mapa_matriculas():
+    """Descarga una sola vez el mapa matrícula -> id y lo publica en memoria compartida."""
+    conn = psycopg2.connect(host=db_host, dbname=db_name, user=db_user, password=db_password, port=db_port)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT matricula_norm, id FROM Matriculas")
+            return MapaCompartido.construir(cursor.fetchall())
+    finally:
+        conn.close()
+
+def procesar_chunk(rango):
     """
     Esta es la función que ejecutará cada trabajador en paralelo.
     Se conecta a la BD, procesa su chunk asignado y solo inserta relaciones.
+    Los IDs salen del mapa compartido que publicó el proceso principal.
+    rango es (inicio, fin) en bytes dentro de ARCHIVO_CSV.
     """
+    inicio, fin = rango
+    nombre_rango = f"bytes {inicio}-{fin}"
     conn = None
     try:
         # Cada proceso debe tener su PROPIA conexión a la base de datos
         conn = psycopg2.connect(host=db_host, dbname=db_name, user=db_user, password=db_password, port=db_port)
         cursor = conn.cursor()
 
-        # Obtenemos todos los IDs de matrícula en un caché para este proceso
-        cursor.execute("SELECT no_matricula_inmobiliaria, id FROM Matriculas")
-        matriculas_cache = dict(cursor.fetchall())
-        
         relaciones_a_insertar = set()
-        with open(nombre_archivo_chunk, mode='r', encoding='utf-8') as archivo_csv:
-            lector_csv = csv.reader(archivo_csv, delimiter=';')
-            next(lector_csv, None)  # Saltar encabezado
+        # Solo se lee el rango asignado, directamente del archivo original (el encabezado no está en ningún rango)
+        for fila in leer_filas(ARCHIVO_CSV, inicio, fin):
+            if not fila: continue
+            no_matricula_actual = normalizar_matricula(fila[0])
+            padres_str = fila[2].strip()
+            hija_str = normalizar_matricula(fila[3])
 
-            for fila in lector_csv:
-                no_matricula_actual = fila[0].strip()
-                padres_str = fila[2].strip()
-                hija_str = fila[3].strip()
+            id_actual = matriculas_cache.get(no_matricula_actual)
+            if not id_actual: continue
 
-                id_actual = matriculas_cache.get(no_matricula_actual)
-                if not id_actual: continue
-
-                if padres_str:
-                    for padre in [p.strip() for p in padres_str.split(',')]:
-                        id_padre = matriculas_cache.get(padre)
-                        if id_padre:
-                            relaciones_a_insertar.add((id_padre, id_actual))
-                
-                if hija_str:
-                    id_hija = matriculas_cache.get(hija_str)
-                    if id_hija:
-                        relaciones_a_insertar.add((id_actual, id_hija))
-        
+            if padres_str:
+                for padre in separar_matriculas(padres_str):
+                    id_padre = matriculas_cache.get(padre)
+                    if id_padre:
+                        relaciones_a_insertar.add((id_padre, id_actual))
+            
+            if hija_str:
+                id_hija = matriculas_cache.get(hija_str)
+                if id_hija:
+                    relaciones_a_insertar.add((id_actual, id_hija))
+    
         if relaciones_a_insertar:
             sql_insert_relaciones = "INSERT INTO RelacionesMatriculas (matricula_padre_id, matricula_hija_id) VALUES %s ON CONFLICT DO NOTHING"
             psycopg2.extras.execute_values(cursor, sql_insert_relaciones, list(relaciones_a_insertar))
             conn.commit()
 
-        return f"Éxito: {os.path.basename(nombre_archivo_chunk)} procesado, {len(relaciones_a_insertar)} relaciones insertadas."
+        return f"Éxito: {nombre_rango} procesado, {len(relaciones_a_insertar)} relaciones insertadas.", relaciones_a_insertar
     except Exception as e:
         if conn: conn.rollback()
-        return f"Error en {os.path.basename(nombre_archivo_chunk)}: {e}"
+        return f"Error en {nombre_rango}: {e}", set()
     finally:
         if conn:
             conn.close()
 
 if __name__ == '__main__':
-    archivos_chunk = [os.path.join(CARPETA_CHUNKS, f) for f in os.listdir(CARPETA_CHUNKS) if f.endswith('.csv')]
-    
-    if not archivos_chunk:
-        print("No se encontraron archivos 'chunk' para procesar. Ejecuta primero 'preparar_y_dividir_csv.py'.")
+    rangos = []
+    if os.path.exists(ARCHIVO_CSV):
+        _, rangos = planificar_rangos(ARCHIVO_CSV, NUMERO_DE_PROCESOS * RANGOS_POR_PROCESO)
+
+    if not rangos:
+        print(f"No se encontraron filas para procesar: '{ARCHIVO_CSV}' no existe o solo tiene el encabezado.")
     else:
-        print(f"Iniciando procesamiento paralelo con {NUMERO_DE_PROCESOS} procesos para {len(archivos_chunk)} archivos.")
+        print(f"Iniciando procesamiento paralelo con {NUMERO_DE_PROCESOS} procesos para {len(rangos)} rangos de '{ARCHIVO_CSV}'.")
         start_time = time.time()
         
-        # Pool es la magia del paralelismo: distribuye la lista de archivos entre los trabajadores
-        with Pool(processes=NUMERO_DE_PROCESOS) as pool:
-            resultados = pool.map(procesar_chunk, archivos_chunk)
-            
-            for res in resultados:
-                print(res)
+        # El mapa de IDs se descarga una vez y todos los procesos lo leen de la misma memoria
+        mapa_matriculas = publicar_mapa_matriculas()
+        print(f"Mapa de {len(mapa_matriculas)} matrículas publicado en memoria compartida.")
+        try:
+            # Pool es la magia del paralelismo: reparte los rangos de bytes de ARCHIVO_CSV entre los trabajadores
+            with Pool(processes=NUMERO_DE_PROCESOS, initializer=iniciar_trabajador,
+                      initargs=(mapa_matriculas.descriptor(),)) as pool:
+                resultados = pool.map(procesar_chunk, rangos)
+        finally:
+            mapa_matriculas.cerrar()
+
+        relaciones_cargadas = set()
+        for mensaje, relaciones in resultados:
+            print(mensaje)
+            relaciones_cargadas.update(relaciones)
+
+        # Las familias se actualizan una sola vez en el proceso principal para no competir entre workers
+        if relaciones_cargadas:
+            conn = psycopg2.connect(host=db_host, dbname=db_name, user=db_user, password=db_password, port=db_port)
+            try:
+                with conn.cursor() as cursor:
+                    actualizar_familias(cursor, relaciones_cargadas)
+                conn.commit()
+                print("Familias actualizadas.")
+            finally:
+                conn.close()
 
         print(f"\n✅ ¡Procesamiento paralelo completado en {time.time() - start_time:.2f} segundos!")
\ No newline at end of file
@@ -1,27 +1,187 @@
 import streamlit as st
-import psycopg2
+import streamlit.components.v1 as components
 import pandas as pd
+import psycopg2.errors
 import networkx as nx
-from pyvis.network import Network
 import os
 import json
+import time
 import folium
+from folium.plugins import VectorGridProtobuf
+import uuid
 from streamlit_folium import st_folium
+from conexiones import PoolConexiones
+from instrumentacion import cerrar_rerun, iniciar_rerun, medir
+from claves import normalizar_matricula
+from familias import SQL_RELACIONES_FAMILIA
+from indice_grafo import IndiceGrafo, leer_version_grafo
+from nivel_detalle import TOPE_NODOS, vista_grafo
+from disposicion_grafo import disposicion_por_capas
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
 st.set_page_config(layout="wide")
 
-# --- FUNCIONES DE BASE DE DATOS (sin cambios) ---
+# --- POOL DE CONEXIONES ---
+@st.cache_resource(show_spinner=False)
+def obtener_pool(credenciales):
+    """Un único pool por proceso, compartido entre reruns y sesiones de Streamlit."""
+    return PoolConexiones(dict(credenciales))
+
+def _clave_credenciales(db_params):
+    return tuple(sorted(dict(db_params).items()))
+
+def conexion_db(db_params):
+    return obtener_pool(_clave_credenciales(db_params)).conexion()
+
+# --- ÍNDICE DEL GRAFO EN MEMORIA ---
+# Si está activo, las familias se resuelven en memoria en lugar de con la consulta recursiva
+USAR_INDICE_GRAFO = True
+# Si está activo (y ya se ejecutó familias.sql), la familia se lee por matriculas.familia_id
+USAR_FAMILIA_ID = True
+SEGUNDOS_REFRESCO_INDICE = 300
+
+# --- MEMORIA DE GRAFOS ---
+# Grafos ya generados que se conservan entre reruns: los más recientes (LRU) y por un tiempo máximo
+GRAFOS_EN_MEMORIA = 64
+SEGUNDOS_VIDA_GRAFO = 1800
+
+# --- COMPONENTE DEL GRAFO ---
+# vis-network se sirve una sola vez como componente estático; cada render solo envía un payload JSON compacto
+_componente_grafo = components.declare_component(
+    "grafo_vis", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "componentes", "grafo_vis")
+)
+
+def mostrar_grafo(payload, alto=800):
+    # El valor del componente (el último grupo que se pidió expandir) queda en st.session_state.grafo_vis
+    _componente_grafo(payload=payload, alto=alto, key="grafo_vis", default=None)
+
+# --- NIVEL DE DETALLE ---
+# Familias grandes: los subárboles lejanos se muestran como grupos que se expanden con un clic
+USAR_NIVEL_DETALLE = True
+# Coordenadas por capas calculadas en el servidor (el navegador no hace layout)
+USAR_DISPOSICION_SERVIDOR = True
+
+# --- GEOMETRÍAS DE TERRENOS ---
+# Si está activo y geojson_terrenos.sql ya se ejecutó, se lee el GeoJSON 4326 precalculado
+# en lugar de reproyectar con ST_Transform en cada consulta; sin la columna se reproyecta
+USAR_GEOJSON_PRECALCULADO = True
+# Terrenos que se conservan en memoria (LRU), por versión de los datos (version_terrenos.sql)
+TERRENOS_EN_MEMORIA = 512
+SEGUNDOS_VIDA_TERRENO = 3600
+SEGUNDOS_VERSION_TERRENOS = 30
+
+@st.cache_resource(show_spinner=False)
+def _hay_geojson_precalculado(credenciales):
+    """Si public.terrenos ya tiene la columna geojson_wgs84; se consulta una vez por proceso."""
+    try:
+        with obtener_pool(credenciales).conexion() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'terrenos' AND column_name = 'geojson_wgs84'
+            """)
+            return cur.fetchone() is not None
+    except Exception:
+        return False
+
+def _sql_geojson(alias, credenciales):
+    if USAR_GEOJSON_PRECALCULADO and _hay_geojson_precalculado(credenciales):
+        return f"{alias}.geojson_wgs84"
+    return f"ST_AsGeoJSON(ST_Transform({alias}.geom, 4326))"
+
+@st.cache_data(ttl=SEGUNDOS_VERSION_TERRENOS, show_spinner=False)
+def _version_terrenos_db(credenciales):
+    try:
+        with medir("version_terrenos"), obtener_pool(credenciales).conexion() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM public.version_terrenos_seq")
+                return cur.fetchone()[0]
+    except Exception:
+        # Sin version_terrenos.sql la caché de terrenos solo se renueva por tiempo
+        return None
+
+# --- TESELAS VECTORIALES DE TERRENOS ---
+# Capa de contexto con todos los predios, servida por servidor_teselas.py. La URL la pide el
+# navegador de quien ve la app, no el servidor, así que debe ser una dirección pública:
+# se lee de st.secrets["teselas_terrenos"]["url"] o de la variable TESELAS_TERRENOS_URL
+USAR_TESELAS_TERRENOS = False
+
+def url_teselas_terrenos():
+    try:
+        return st.secrets["teselas_terrenos"]["url"]
+    except Exception:
+        return os.environ.get("TESELAS_TERRENOS_URL")
+
+def agregar_capa_terrenos(m):
+    """Agrega al mapa folium los predios de public.terrenos como capa vectorial (MVT)."""
+    url = url_teselas_terrenos() if USAR_TESELAS_TERRENOS else None
+    if not url:
+        return
+    opciones = {
+        "minZoom": 12,
+        "vectorTileLayerStyles": {
+            "terrenos": {"weight": 1, "color": "#555555", "fill": True, "fillColor": "#cccccc", "fillOpacity": 0.15},
+        },
+    }
+    VectorGridProtobuf(url, "Predios", opciones).add_to(m)
+
+# --- DEPURACIÓN ---
+# Panel lateral con el desglose de tiempos del rerun; también se activa con ?debug=1 en la URL
+MOSTRAR_PANEL_DEPURACION = False
+
+@st.cache_resource(show_spinner="Cargando índice del grafo de matrículas...")
+def obtener_indice_grafo(credenciales):
+    with medir("indice_carga_completa"), obtener_pool(credenciales).conexion() as conn:
+        return IndiceGrafo.desde_db(conn)
+
+def indice_grafo(db_params):
+    """Devuelve el índice compartido, refrescándolo de forma incremental si está vencido."""
+    credenciales = _clave_credenciales(db_params)
+    indice = obtener_indice_grafo(credenciales)
+    if time.monotonic() - indice.ultimo_refresco > SEGUNDOS_REFRESCO_INDICE:
+        with medir("indice_refresco"), obtener_pool(credenciales).conexion() as conn:
+            indice.refrescar(conn)
+    return indice
+
+@st.cache_data(ttl=SEGUNDOS_REFRESCO_INDICE, show_spinner=False)
+def _version_datos_db(credenciales):
+    with medir("version_datos"), obtener_pool(credenciales).conexion() as conn:
+        with conn.cursor() as cur:
+            version = leer_version_grafo(cur)
+            if version is not None:
+                return version[0]
+            # Sin version_grafo.sql solo se notan las altas y los cambios en el total de relaciones
+            cur.execute("SELECT (SELECT max(id) FROM public.matriculas), (SELECT count(*) FROM public.relacionesmatriculas)")
+            return cur.fetchone()
+
+def version_datos(db_params):
+    """
+    Ficha de versión del grafo: cambia con cada escritura en matrículas o
+    relaciones (version_grafo.sql). Con el índice en memoria sale de su último
+    refresco, sin ir a la base de datos; si no, de una consulta que se repite
+    cada SEGUNDOS_REFRESCO_INDICE.
+    """
+    if USAR_INDICE_GRAFO:
+        try:
+            indice = indice_grafo(db_params)
+            if indice.version_db is not None:
+                return indice.version_db
+            return (indice.max_id_matricula, indice.total_relaciones_db)
+        except Exception:
+            pass  # obtener_relaciones_familia avisa y usa la base de datos
+    return _version_datos_db(_clave_credenciales(db_params))
+
+# --- FUNCIONES DE BASE DE DATOS ---
 def obtener_info_catastral(matricula, db_params):
     if not matricula: return {}
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with medir("info_catastral") as medicion, conexion_db(db_params) as conn:
             query = """
-                SELECT TRIM("Matricula") as "Matricula", numero_predial, area_terreno, area_construida, nombre, numero_predial_nacional
+                SELECT matricula_norm as "Matricula", numero_predial, area_terreno, area_construida, nombre, numero_predial_nacional
                 FROM public.informacioncatastral
-                WHERE TRIM("Matricula") = %(matricula)s;
+                WHERE matricula_norm = %(matricula)s;
             """
-            df = pd.read_sql_query(query, conn, params={'matricula': str(matricula).strip()})
+            df = pd.read_sql_query(query, conn, params={'matricula': normalizar_matricula(matricula)})
+            medicion.filas = len(df)
             if df.empty: return {}
             info_catastral = {}
             for m, group in df.groupby('Matricula'):
@@ -37,59 +197,181 @@ def obtener_info_catastral(matricula, db_params):
         st.error(f"Error en info catastral: {e}")
         return {}
 
+@st.cache_data(max_entries=TERRENOS_EN_MEMORIA, ttl=SEGUNDOS_VIDA_TERRENO, show_spinner=False)
+def _terreno_memorizado(numero_predial, version, credenciales):
+    # version solo forma parte de la llave: al recargar terrenos las entradas viejas dejan de usarse
+    geojson = _sql_geojson('t', credenciales)
+    with medir("terreno_por_predial") as medicion, obtener_pool(credenciales).conexion() as conn:
+        query = f"""
+            SELECT
+                direccion,
+                terrarfi,
+                {geojson} as geojson
+            FROM public.terrenos t
+            WHERE codigo = %(numero_predial)s
+            LIMIT 1;
+        """
+        df = pd.read_sql_query(query, conn, params={'numero_predial': numero_predial})
+        medicion.filas = len(df)
+        if not df.empty:
+            return df.to_dict('records')[0]
+        return None
+
 def obtener_info_terreno_por_predial(numero_predial, db_params):
+    """Dirección, área y GeoJSON (EPSG:4326) del terreno; los repetidos salen de memoria."""
     try:
-        with psycopg2.connect(**db_params) as conn:
-            query = """
-                SELECT 
-                    direccion, 
-                    terrarfi,
-                    ST_AsGeoJSON(ST_Transform(geom, 4326)) as geojson
-                FROM public.terrenos
-                WHERE codigo = %(numero_predial)s
-                LIMIT 1;
-            """
-            df = pd.read_sql_query(query, conn, params={'numero_predial': str(numero_predial).strip()})
-            if not df.empty:
-                return df.to_dict('records')[0]
-            return None
+        credenciales = _clave_credenciales(db_params)
+        return _terreno_memorizado(str(numero_predial).strip(), _version_terrenos_db(credenciales), credenciales)
     except Exception as e:
         st.error(f"Error en info terreno: {e}")
         return None
 
 def obtener_existencia_catastral_batch(matriculas, db_params):
     if not matriculas: return set()
-    matriculas_limpias = [str(m).strip() for m in matriculas]
+    matriculas_limpias = [normalizar_matricula(m) for m in matriculas]
     try:
-        with psycopg2.connect(**db_params) as conn_batch:
-            query_batch = 'SELECT DISTINCT TRIM("Matricula") AS matricula_limpia FROM public.informacioncatastral WHERE TRIM("Matricula") = ANY(%(matriculas)s);'
+        with medir("existencia_catastral_batch") as medicion, conexion_db(db_params) as conn_batch:
+            query_batch = 'SELECT DISTINCT matricula_norm AS matricula_limpia FROM public.informacioncatastral WHERE matricula_norm = ANY(%(matriculas)s);'
             df_batch = pd.read_sql_query(query_batch, conn_batch, params={'matriculas': matriculas_limpias})
+            medicion.filas = len(df_batch)
             return set(df_batch['matricula_limpia'].tolist())
     except Exception as e:
         st.error(f"Error al verificar existencia catastral: {e}")
         return set()
 
-def obtener_info_geografica_batch(prediales, db_params):
-    """Verifica si los números prediales tienen información geográfica."""
+def obtener_info_geografica_batch(prediales, db_params, lanzar_errores=False):
+    """
+    Verifica si los números prediales tienen información geográfica.
+    Con lanzar_errores el error se propaga en lugar de devolver un conjunto vacío.
+    """
     if not prediales:
         return set()
     prediales_limpios = [str(p).strip() for p in prediales]
     try:
-        with psycopg2.connect(**db_params) as conn:
+        with medir("geo_batch") as medicion, conexion_db(db_params) as conn:
             query = 'SELECT DISTINCT codigo FROM public.terrenos WHERE codigo = ANY(%(prediales)s);'
             df = pd.read_sql_query(query, conn, params={'prediales': prediales_limpios})
+            medicion.filas = len(df)
             return set(df['codigo'].tolist())
     except Exception as e:
+        if lanzar_errores:
+            raise
         st.error(f"Error al verificar existencia geográfica: {e}")
         return set()
 
-# --- FUNCIÓN DEL GRAFO ---
-def generar_grafo_interactivo(no_matricula_inicial, db_params):
+def _extension_features(features):
+    """[[lat_min, lon_min], [lat_max, lon_max]] de las coordenadas de los features (None si no hay)."""
+    lons, lats = [], []
+    def recorrer(coordenadas):
+        if coordenadas and isinstance(coordenadas[0], (int, float)):
+            lons.append(coordenadas[0])
+            lats.append(coordenadas[1])
+        else:
+            for parte in coordenadas:
+                recorrer(parte)
+    for feature in features:
+        if feature.get('geometry'):
+            recorrer(feature['geometry']['coordinates'])
+    if not lons:
+        return None
+    return [[min(lats), min(lons)], [max(lats), max(lons)]]
+
+def obtener_geometrias_familia(matriculas, db_params):
+    """
+    Devuelve en una sola consulta las geometrías (EPSG:4326) de un conjunto de
+    matrículas como un FeatureCollection GeoJSON, junto con su extensión
+    [[lat_min, lon_min], [lat_max, lon_max]], que se calcula aquí a partir de
+    las coordenadas para no reproyectar nada en la base de datos.
+    """
+    if not matriculas:
+        return None, None
+    matriculas_limpias = [normalizar_matricula(m) for m in matriculas]
     try:
-        with psycopg2.connect(**db_params) as conn:
-            query_recursiva = """
+        geojson = _sql_geojson('t', _clave_credenciales(db_params))
+        with medir("geometrias_familia") as medicion, conexion_db(db_params) as conn:
+            query = f"""
+                WITH predios AS (
+                    SELECT DISTINCT ON (ic.matricula_norm)
+                        ic.matricula_norm AS matricula, ic.numero_predial_nacional
+                    FROM public.informacioncatastral ic
+                    WHERE ic.matricula_norm = ANY(%(matriculas)s)
+                ),
+                geometrias AS (
+                    SELECT DISTINCT ON (p.matricula)
+                        p.matricula,
+                        p.numero_predial_nacional,
+                        m.estado_folio,
+                        {geojson} AS geojson
+                    FROM predios p
+                    JOIN public.terrenos t ON t.codigo = p.numero_predial_nacional
+                    LEFT JOIN public.matriculas m ON m.matricula_norm = p.matricula
+                    WHERE t.geom IS NOT NULL
+                )
+                SELECT
+                    json_build_object(
+                        'type', 'FeatureCollection',
+                        'features', COALESCE(json_agg(json_build_object(
+                            'type', 'Feature',
+                            'geometry', g.geojson::json,
+                            'properties', json_build_object(
+                                'matricula', g.matricula,
+                                'estado_folio', COALESCE(g.estado_folio, 'No disponible'),
+                                'numero_predial_nacional', g.numero_predial_nacional
+                            )
+                        )), '[]'::json)
+                    ) AS feature_collection
+                FROM geometrias g;
+            """
+            with conn.cursor() as cur:
+                cur.execute(query, {'matriculas': matriculas_limpias})
+                feature_collection = cur.fetchone()[0]
+            if isinstance(feature_collection, dict):
+                medicion.filas = len(feature_collection.get('features') or [])
+        if isinstance(feature_collection, str):
+            feature_collection = json.loads(feature_collection)
+        return feature_collection, _extension_features(feature_collection['features'])
+    except Exception as e:
+        st.error(f"Error al obtener las geometrías de la familia: {e}")
+        return None, None
+
+# --- FUNCIÓN DEL GRAFO ---
+def obtener_relaciones_familia(no_matricula_inicial, db_params):
+    """
+    Relaciones (padre, hija, padre_estado, hija_estado) de toda la familia de
+    una matrícula. Usa el índice en memoria si está activo; si no, la familia
+    materializada en matriculas.familia_id y, como último recurso, la
+    consulta recursiva sobre la base de datos.
+    """
+    columnas = ['padre', 'hija', 'padre_estado', 'hija_estado']
+    if USAR_INDICE_GRAFO:
+        try:
+            indice = indice_grafo(db_params)
+            with medir("familia_indice_memoria") as medicion:
+                filas = indice.relaciones_familia(no_matricula_inicial)
+                medicion.filas = len(filas)
+            return pd.DataFrame(filas, columns=columnas)
+        except Exception as e:
+            st.warning(f"Índice del grafo no disponible, usando la base de datos: {e}")
+
+    if USAR_FAMILIA_ID:
+        query_familia = SQL_RELACIONES_FAMILIA.format(esquema="public")
+        try:
+            with medir("familia_por_familia_id") as medicion, conexion_db(db_params) as conn:
+                df_familia = pd.read_sql_query(query_familia, conn, params={'start_node': normalizar_matricula(no_matricula_inicial)})
+                medicion.filas = len(df_familia)
+            # Vacío si la matrícula aún no tiene familia asignada: se confirma con la consulta recursiva
+            if not df_familia.empty:
+                return df_familia
+        except (psycopg2.errors.UndefinedColumn, pd.errors.DatabaseError) as e:
+            # Base sin familias.sql aplicado: no hay matriculas.familia_id y se usa la
+            # consulta recursiva (pandas < 3 envuelve el error de psycopg2 en DatabaseError)
+            if not isinstance(e.__cause__ or e, psycopg2.errors.UndefinedColumn):
+                raise
+
+    with medir("familia_recursiva") as medicion, conexion_db(db_params) as conn:
+        query_recursiva = """
             WITH RECURSIVE familia_grafo AS (
-                SELECT id, no_matricula_inmobiliaria FROM public.matriculas WHERE TRIM(no_matricula_inmobiliaria) = %(start_node)s
+                SELECT id, no_matricula_inmobiliaria FROM public.matriculas WHERE matricula_norm = %(start_node)s
                 UNION
                 SELECT
                     CASE WHEN r.matricula_padre_id = fg.id THEN m_hija.id ELSE m_padre.id END,
@@ -100,8 +382,8 @@ def generar_grafo_interactivo(no_matricula_inicial, db_params):
                 JOIN public.matriculas m_hija ON r.matricula_hija_id = m_hija.id
             )
             SELECT DISTINCT
-                TRIM(padre.no_matricula_inmobiliaria) AS padre,
-                TRIM(hija.no_matricula_inmobiliaria) AS hija,
+                padre.matricula_norm AS padre,
+                hija.matricula_norm AS hija,
                 padre.estado_folio AS padre_estado,
                 hija.estado_folio AS hija_estado
             FROM public.relacionesmatriculas rel
@@ -110,65 +392,111 @@ def generar_grafo_interactivo(no_matricula_inicial, db_params):
             WHERE padre.id IN (SELECT id FROM familia_grafo)
                 AND hija.id IN (SELECT id FROM familia_grafo);
             """
-            df_relaciones = pd.read_sql_query(query_recursiva, conn, params={'start_node': str(no_matricula_inicial).strip()})
-
-        if df_relaciones.empty:
-            return None, f"⚠️ No se encontraron relaciones para '{no_matricula_inicial}'.", pd.DataFrame()
-
-        nodos_del_grafo = set(df_relaciones['padre']).union(set(df_relaciones['hija']))
-        
-        info_catastral_full = {}
-        with psycopg2.connect(**db_params) as conn_batch:
-            query_catastral = 'SELECT TRIM("Matricula") as matricula, numero_predial_nacional FROM public.informacioncatastral WHERE TRIM("Matricula") = ANY(%(matriculas)s);'
-            df_catastral = pd.read_sql_query(query_catastral, conn_batch, params={'matriculas': list(nodos_del_grafo)})
-        
-        matriculas_en_catastro = set(df_catastral['matricula'].tolist())
-        prediales_nacionales = {row['matricula']: row['numero_predial_nacional'] for index, row in df_catastral.iterrows()}
-        
-        prediales_con_geo = obtener_info_geografica_batch(list(prediales_nacionales.values()), db_params)
-
-        estado_folio_map = {}
-        for index, row in df_relaciones.iterrows():
-            estado_folio_map[row['padre']] = row['padre_estado']
-            estado_folio_map[row['hija']] = row['hija_estado']
-
-        # Crear el DataFrame para la exportación con la nueva columna
-        df_export = pd.DataFrame(list(nodos_del_grafo), columns=['Matrícula'])
-        df_export['Estado_Folio'] = df_export['Matrícula'].apply(lambda x: estado_folio_map.get(x, 'No disponible'))
-        df_export['Tiene_Info_Catastral'] = df_export['Matrícula'].isin(matriculas_en_catastro).apply(lambda x: 'Sí' if x else 'No')
-        df_export['Tiene_Info_Geográfica'] = df_export.apply(
-            lambda row: 'Sí' if row['Tiene_Info_Catastral'] == 'Sí' and prediales_nacionales.get(row['Matrícula']) in prediales_con_geo else 'No', axis=1
-        )
-        
-        g = nx.from_pandas_edgelist(df_relaciones, 'padre', 'hija', create_using=nx.DiGraph())
-        net = Network(height="800px", width="100%", directed=True, notebook=True, cdn_resources='in_line')
-
-        for node_id in g.nodes():
-            estado_folio = estado_folio_map.get(str(node_id), 'No disponible')
-            
-            tiene_catastral = str(node_id) in matriculas_en_catastro
-            
-            if tiene_catastral:
-                title = f"Matrícula: {node_id}\nEstado Folio: {estado_folio}\nEstado: Se encuentra en la base catastral."
-                color = "#28a745"
-            else:
-                title = f"Matrícula: {node_id}\nEstado Folio: {estado_folio}\nEstado: No se encuentra en la base catastral."
-                color = "#ffc107"
-
-            if str(node_id) == str(no_matricula_inicial).strip():
-                color = "#dc3545"
-                size = 40
-            else:
-                size = 25
-
-            net.add_node(str(node_id), label=str(node_id), title=title, color=color, size=size)
-
-        net.add_edges(g.edges())
-        options = {"layout": {"hierarchical": {"enabled": True, "direction": "UD", "sortMethod": "directed", "levelSeparation": 150, "nodeSpacing": 200}}, "physics": {"enabled": False}}
-        net.set_options(json.dumps(options))
-        nombre_archivo = f"grafo_{no_matricula_inicial}.html"
-        net.save_graph(nombre_archivo)
-        return nombre_archivo, f"✅ Grafo interactivo generado con {len(g.nodes())} nodos.", df_export
+        df_recursiva = pd.read_sql_query(query_recursiva, conn, params={'start_node': normalizar_matricula(no_matricula_inicial)})
+        medicion.filas = len(df_recursiva)
+        return df_recursiva
+
+def _payload_grafo(clave, df_relaciones, estado_folio_map, matriculas_en_catastro):
+    """
+    Payload compacto para el componente grafo_vis: los nodos van una sola vez
+    y las aristas como pares de índices; colores, tamaños y textos de ayuda
+    los arma el navegador.
+    """
+    nodos = sorted(set(df_relaciones['padre']).union(df_relaciones['hija']))
+    posicion = {matricula: i for i, matricula in enumerate(nodos)}
+    estados_nodo = [str(estado_folio_map.get(m) or 'No disponible') for m in nodos]
+    estados = sorted(set(estados_nodo))
+    posicion_estado = {estado: i for i, estado in enumerate(estados)}
+    aristas = []
+    for padre, hija in dict.fromkeys(zip(df_relaciones['padre'], df_relaciones['hija'])):
+        aristas.extend((posicion[padre], posicion[hija]))
+    return {
+        'nodos': nodos,
+        'estados': estados,
+        'estado': [posicion_estado[e] for e in estados_nodo],
+        'catastro': [1 if m in matriculas_en_catastro else 0 for m in nodos],
+        'aristas': aristas,
+        'buscada': posicion.get(clave, -1),
+    }
+
+def _construir_grafo(clave, db_params):
+    """Relaciones, datos de los nodos y payload del grafo de la familia de una matrícula ya normalizada."""
+    df_relaciones = obtener_relaciones_familia(clave, db_params)
+
+    if df_relaciones.empty:
+        return None, f"⚠️ No se encontraron relaciones para '{clave}'.", pd.DataFrame()
+
+    nodos_del_grafo = set(df_relaciones['padre']).union(set(df_relaciones['hija']))
+
+    with medir("catastral_batch") as medicion, conexion_db(db_params) as conn_batch:
+        query_catastral = 'SELECT matricula_norm as matricula, numero_predial_nacional FROM public.informacioncatastral WHERE matricula_norm = ANY(%(matriculas)s);'
+        df_catastral = pd.read_sql_query(query_catastral, conn_batch, params={'matriculas': list(nodos_del_grafo)})
+        medicion.filas = len(df_catastral)
+
+    matriculas_en_catastro = set(df_catastral['matricula'].tolist())
+    prediales_nacionales = {row['matricula']: row['numero_predial_nacional'] for index, row in df_catastral.iterrows()}
+
+    prediales_con_geo = obtener_info_geografica_batch(list(prediales_nacionales.values()), db_params, lanzar_errores=True)
+
+    estado_folio_map = {}
+    for index, row in df_relaciones.iterrows():
+        estado_folio_map[row['padre']] = row['padre_estado']
+        estado_folio_map[row['hija']] = row['hija_estado']
+
+    # Crear el DataFrame para la exportación con la nueva columna
+    df_export = pd.DataFrame(list(nodos_del_grafo), columns=['Matrícula'])
+    df_export['Estado_Folio'] = df_export['Matrícula'].apply(lambda x: estado_folio_map.get(x, 'No disponible'))
+    df_export['Tiene_Info_Catastral'] = df_export['Matrícula'].isin(matriculas_en_catastro).apply(lambda x: 'Sí' if x else 'No')
+    df_export['Tiene_Info_Geográfica'] = df_export.apply(
+        lambda row: 'Sí' if row['Tiene_Info_Catastral'] == 'Sí' and prediales_nacionales.get(row['Matrícula']) in prediales_con_geo else 'No', axis=1
+    )
+
+    with medir("payload_grafo", tipo="render") as medicion:
+        payload = _payload_grafo(clave, df_relaciones, estado_folio_map, matriculas_en_catastro)
+        medicion.filas = len(payload['nodos'])
+    return payload, f"✅ Grafo interactivo generado con {len(payload['nodos'])} nodos.", df_export
+
+@st.cache_data(max_entries=GRAFOS_EN_MEMORIA, ttl=SEGUNDOS_VIDA_GRAFO, show_spinner=False)
+def _grafo_memorizado(clave, version, credenciales):
+    # version solo forma parte de la llave: al cargar datos nuevos las entradas viejas dejan de usarse
+    return _construir_grafo(clave, dict(credenciales))
+
+@st.cache_data(max_entries=GRAFOS_EN_MEMORIA, ttl=SEGUNDOS_VIDA_GRAFO, show_spinner=False)
+def _vista_memorizada(clave, version, expandidos, credenciales, _payload):
+    # Streamlit no hashea los argumentos que empiezan con _: clave, version y
+    # credenciales (la misma llave de _grafo_memorizado) ya identifican al payload
+    vista = dict(_payload)
+    if USAR_NIVEL_DETALLE:
+        with medir("nivel_detalle", tipo="render") as medicion:
+            vista = vista_grafo(_payload, expandidos)
+            medicion.filas = len(vista['nodos'])
+    if USAR_DISPOSICION_SERVIDOR:
+        with medir("disposicion_capas", tipo="render") as medicion:
+            g = nx.DiGraph()
+            g.add_nodes_from(range(len(vista['nodos'])))
+            g.add_edges_from(zip(vista['aristas'][0::2], vista['aristas'][1::2]))
+            posiciones = disposicion_por_capas(g)
+            vista['x'] = [posiciones[i][0] for i in range(len(vista['nodos']))]
+            vista['y'] = [posiciones[i][1] for i in range(len(vista['nodos']))]
+            medicion.filas = len(vista['nodos'])
+    return vista
+
+def generar_grafo_interactivo(no_matricula_inicial, db_params, expandidos=()):
+    """
+    Devuelve (payload, mensaje, df_nodos) del grafo de la matrícula. Tanto la
+    familia completa como la vista que se dibuja (grupos expandidos y
+    coordenadas) se memorizan por matrícula normalizada y versión de los
+    datos, así que los reruns que no cambian nada no consultan ni recalculan.
+    Los errores no se memorizan.
+    """
+    try:
+        clave = normalizar_matricula(no_matricula_inicial)
+        version = version_datos(db_params)
+        credenciales = _clave_credenciales(db_params)
+        payload, mensaje, df_nodos = _grafo_memorizado(clave, version, credenciales)
+        if payload:
+            payload = _vista_memorizada(clave, version, tuple(expandidos), credenciales, payload)
+        return payload, mensaje, df_nodos
     except Exception as e:
         st.error(f"❌ Ocurrió un error al generar el grafo: {e}")
         return None, None, pd.DataFrame()
@@ -184,87 +512,53 @@ def generar_mapa_multiple(df_nodos, no_matricula_inicial, db_params):
         st.warning("⚠️ Ninguno de los predios del grafo tiene información geográfica para mostrar.")
         return
 
-    m = folium.Map(tiles="OpenStreetMap")
-    has_polygons = False
-    bounds = None
-
-    for index, row in predios_con_geo.iterrows():
-        matricula = row['Matrícula']
-        estado_folio = row['Estado_Folio']
-        
-        # Obtener el numero predial nacional para buscar el GeoJSON
-        with psycopg2.connect(**db_params) as conn:
-            query = 'SELECT numero_predial_nacional FROM public.informacioncatastral WHERE TRIM("Matricula") = %(matricula)s;'
-            df_predial = pd.read_sql_query(query, conn, params={'matricula': matricula})
-            if not df_predial.empty:
-                numero_predial_nacional = df_predial['numero_predial_nacional'].iloc[0]
+    feature_collection, bounds = obtener_geometrias_familia(predios_con_geo['Matrícula'].tolist(), db_params)
+
+    if feature_collection and feature_collection['features']:
+        # Asignar color según el estado del folio
+        for feature in feature_collection['features']:
+            props = feature['properties']
+            if props['matricula'] == normalizar_matricula(no_matricula_inicial):
+                props['color'] = "#FFD700"  # Amarillo para la matrícula inicial
+            elif props['estado_folio'] == 'ACTIVO':
+                props['color'] = "#28a745"  # Verde para activo
+            elif props['estado_folio'] == 'CANCELADO':
+                props['color'] = "#dc3545"  # Rojo para cancelado
             else:
-                continue
-
-        # Obtener el GeoJSON para el predio
-        info_terreno = obtener_info_terreno_por_predial(numero_predial_nacional, db_params)
-        
-        if info_terreno and info_terreno.get('geojson'):
-            geojson_data = json.loads(info_terreno['geojson'])
-            
-            # Asignar color según el estado del folio
-            if matricula == no_matricula_inicial:
-                color = "#FFD700"  # Amarillo para la matrícula inicial
-            elif estado_folio == 'ACTIVO':
-                color = "#28a745"  # Verde para activo
-            elif estado_folio == 'CANCELADO':
-                color = "#dc3545"  # Rojo para cancelado
-            else:
-                color = "#007BFF"  # Azul para otros casos
-
-            # Crear el popup con la información
-            popup_html = f"""
-            <strong>Matrícula:</strong> {matricula}<br>
-            <strong>Estado Folio:</strong> {estado_folio}<br>
-            <strong>Predial Nacional:</strong> {numero_predial_nacional}
-            """
-            
-            folium_geojson = folium.GeoJson(
-                geojson_data,
+                props['color'] = "#007BFF"  # Azul para otros casos
+
+        with medir("render_folium_familia", tipo="render") as medicion:
+            medicion.filas = len(feature_collection['features'])
+            m = folium.Map(tiles="OpenStreetMap")
+            agregar_capa_terrenos(m)
+            # Una sola capa para toda la familia; el estilo y el popup salen de las propiedades
+            folium.GeoJson(
+                feature_collection,
                 style_function=lambda feature: {
-                    'fillColor': color,
-                    'color': color,
+                    'fillColor': feature['properties']['color'],
+                    'color': feature['properties']['color'],
                     'weight': 2,
                     'fillOpacity': 0.5
-                }
-            )
-            folium_geojson.add_child(folium.Popup(popup_html))
-            folium_geojson.add_to(m)
-            has_polygons = True
-            
-            # Ajustar los límites del mapa para que se vean todos los polígonos
-            if bounds is None:
-                bounds = folium_geojson.get_bounds()
-            else:
-                bounds = [
-                    (min(bounds[0][0], folium_geojson.get_bounds()[0][0]), min(bounds[0][1], folium_geojson.get_bounds()[0][1])),
-                    (max(bounds[1][0], folium_geojson.get_bounds()[1][0]), max(bounds[1][1], folium_geojson.get_bounds()[1][1]))
-                ]
-
-    if has_polygons:
-        if bounds:
-            m.fit_bounds(bounds)
+                },
+                popup=folium.GeoJsonPopup(
+                    fields=['matricula', 'estado_folio', 'numero_predial_nacional'],
+                    aliases=['Matrícula:', 'Estado Folio:', 'Predial Nacional:']
+                )
+            ).add_to(m)
+            if bounds:
+                m.fit_bounds(bounds)
         
-        st.write("**Visualización Geográfica de todos los predios del grafo:**")
-        mapa_path = f"mapa_grafo_{no_matricula_inicial}.html"
-        m.save(mapa_path)
-        with open(mapa_path, "r", encoding="utf-8") as f:
-            map_html = f.read()
-        st.components.v1.html(map_html, height=500)
-        os.remove(mapa_path)
+            st.write("**Visualización Geográfica de todos los predios del grafo:**")
+            # En memoria: sin archivo temporal que compartan dos sesiones con la misma matrícula
+            st.components.v1.html(m.get_root().render(), height=500)
     else:
         st.info("No se encontró información geográfica para los predios del grafo.")
 
-# --- FUNCIÓN PARA MOSTRAR LA TARJETA DE ANÁLISIS (sin cambios) ---
+# --- FUNCIÓN PARA MOSTRAR LA TARJETA DE ANÁLISIS ---
 def mostrar_tarjeta_analisis(matricula_a_analizar, db_params):
     st.markdown("---")
     
-    info_catastral = obtener_info_catastral(matricula_a_analizar, db_params).get(matricula_a_analizar.strip())
+    info_catastral = obtener_info_catastral(matricula_a_analizar, db_params).get(normalizar_matricula(matricula_a_analizar))
     
     if not info_catastral:
         st.error(f"❌ No se encontró la matrícula '{matricula_a_analizar}' en la base catastral.")
@@ -303,30 +597,54 @@ def mostrar_tarjeta_analisis(matricula_a_analizar, db_params):
 
                 if info_terreno.get('geojson'):
                     geojson_data = json.loads(info_terreno['geojson'])
-                    m = folium.Map(tiles="OpenStreetMap")
-                    folium.GeoJson(geojson_data).add_to(m)
-                    m.fit_bounds(folium.GeoJson(geojson_data).get_bounds())
+                    with medir("render_folium_terreno", tipo="render"):
+                        m = folium.Map(tiles="OpenStreetMap")
+                        agregar_capa_terrenos(m)
+                        folium.GeoJson(geojson_data).add_to(m)
+                        m.fit_bounds(folium.GeoJson(geojson_data).get_bounds())
                     
-                    st.write("**Visualización Geográfica del Terreno:**")
-                    mapa_path = "mapa_terreno.html"
-                    m.save(mapa_path)
-                    with open(mapa_path, "r", encoding="utf-8") as f:
-                        map_html = f.read()
-                    st.components.v1.html(map_html, height=500)
-                    os.remove(mapa_path)
+                        st.write("**Visualización Geográfica del Terreno:**")
+                        st.components.v1.html(m.get_root().render(), height=500)
 
             else:
                 st.warning(f"⚠️ No se encontró registro geográfico para el número predial: '{numero_predial_nacional}'.")
         else:
             st.warning("⚠️ La información catastral no contiene un 'Número Predial Nacional' para buscar.")
 
+# --- PANEL DE DEPURACIÓN ---
+def mostrar_panel_depuracion(resumen):
+    """Desglose del rerun en la barra lateral: consultas, renders y espera por conexiones."""
+    if not resumen:
+        return
+    with st.sidebar:
+        st.subheader("🛠️ Depuración")
+        st.caption(f"Rerun {resumen['rerun']} · {resumen['ms_total']:.0f} ms en total")
+        c1, c2 = st.columns(2)
+        c1.metric("Consultas", resumen['consultas'])
+        c2.metric("ms en consultas", f"{resumen['ms_consultas']:.0f}")
+        c1.metric("ms en render", f"{resumen['ms_render']:.0f}")
+        c2.metric("ms esperando conexión", f"{resumen['ms_espera_conexion']:.0f}")
+        if resumen['posible_n_mas_1']:
+            repetidas = ", ".join(resumen['consultas_repetidas']) or "demasiadas consultas"
+            st.warning(f"⚠️ Posible N+1 en este rerun: {repetidas}")
+        if resumen['mediciones']:
+            st.dataframe(pd.DataFrame(resumen['mediciones']), hide_index=True, use_container_width=True)
+        with st.expander("JSON del rerun"):
+            st.json(resumen)
+
 # --- INTERFAZ GRÁFICA Y LÓGICA PRINCIPAL ---
+if 'id_sesion' not in st.session_state:
+    st.session_state.id_sesion = uuid.uuid4().hex[:12]
+iniciar_rerun(st.session_state.id_sesion)
+
 st.title("Asistente de Análisis Catastral 🗺️")
 
 if 'matricula_grafo' not in st.session_state:
     st.session_state.matricula_grafo = ""
 if 'matricula_analisis' not in st.session_state:
     st.session_state.matricula_analisis = ""
+if 'grafo_expandidos' not in st.session_state:
+    st.session_state.grafo_expandidos = []
 
 col_grafo, col_analisis = st.columns([2, 1])
 
@@ -341,6 +659,7 @@ with col_grafo:
                 st.session_state.matricula_grafo = matricula_input_grafo
                 st.session_state.matricula_analisis = matricula_input_grafo
                 st.session_state.df_nodos = pd.DataFrame() # Reiniciar el DataFrame del mapa
+                st.session_state.grafo_expandidos = []
             else:
                 st.warning("Por favor, introduce una matrícula para generar el grafo.")
     
@@ -351,12 +670,19 @@ with col_grafo:
                 
     if st.session_state.matricula_grafo:
         db_credentials = st.secrets["db_credentials"]
+        # Clic en un grupo: el componente deja el pedido en su valor y provoca este rerun
+        evento = st.session_state.get("grafo_vis")
+        if USAR_NIVEL_DETALLE and evento and evento.get('id') != st.session_state.get('grafo_ultimo_evento'):
+            st.session_state.grafo_ultimo_evento = evento['id']
+            st.session_state.grafo_expandidos.append(evento['expandir'])
         with st.spinner("Generando grafo..."):
-            nombre_archivo_html, mensaje, df_nodos = generar_grafo_interactivo(st.session_state.matricula_grafo, db_credentials)
+            payload_grafo, mensaje, df_nodos = generar_grafo_interactivo(
+                st.session_state.matricula_grafo, db_credentials, st.session_state.grafo_expandidos
+            )
             st.session_state.df_nodos = df_nodos
         st.info(mensaje)
 
-        if nombre_archivo_html:
+        if payload_grafo:
             st.markdown("""
                 **Leyenda:** &nbsp;
                 <span style="display:inline-block; width:12px; height:12px; border-radius:50%; background-color:#dc3545; vertical-align:middle; border:1px solid #555;"></span> Matrícula Buscada &nbsp;
@@ -365,10 +691,20 @@ with col_grafo:
             """, unsafe_allow_html=True)
             st.markdown("---")
             
-            with open(nombre_archivo_html, 'r', encoding='utf-8') as f:
-                source_code = f.read()
-                st.components.v1.html(source_code, height=800, scrolling=True)
-            os.remove(nombre_archivo_html)
+            if payload_grafo.get('grupos'):
+                col_indicador, col_contraer = st.columns([3, 1])
+                col_indicador.caption(
+                    f"🔎 Se muestran {payload_grafo['visibles']} de {payload_grafo['total_familia']} matrículas. "
+                    f"Los nodos grises agrupan el resto: haz clic en uno para expandirlo."
+                )
+                if st.session_state.grafo_expandidos and col_contraer.button("Contraer grupos"):
+                    st.session_state.grafo_expandidos = []
+                    st.rerun()
+            if payload_grafo.get('recortado'):
+                st.warning(f"⚠️ Se alcanzó el tope de {TOPE_NODOS} nodos en pantalla; contrae los grupos o descarga los datos del grafo para ver la familia completa.")
+
+            with medir("mostrar_grafo", tipo="render"):
+                mostrar_grafo(payload_grafo)
 
             # Botón de descarga
             if not df_nodos.empty:
@@ -398,4 +734,9 @@ with col_analisis:
         db_credentials = st.secrets["db_credentials"]
         mostrar_tarjeta_analisis(st.session_state.matricula_analisis, db_credentials)
     else:
-        st.info("Introduce una matrícula y presiona 'Analizar'.")
\ No newline at end of file
+        st.info("Introduce una matrícula y presiona 'Analizar'.")
+
+# --- CIERRE DEL RERUN (log JSON y panel de depuración) ---
+resumen_rerun = cerrar_rerun()
+if MOSTRAR_PANEL_DEPURACION or st.query_params.get("debug") == "1":
+    mostrar_panel_depuracion(resumen_rerun)
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+import psycopg2
+
+# ==============================================================================
+# Benchmark antes/después de las claves normalizadas (normalizar_claves.sql).
+# Crea una tabla sintética con la forma de informacioncatastral en el esquema
+# "benchmark_claves" de una base de datos LOCAL y desechable, y compara con
+# EXPLAIN ANALYZE el filtro TRIM("Matricula") contra la columna matricula_norm.
+#
+# Uso: python benchmark_claves.py --dsn postgresql://postgres@localhost/postgres --filas 1000000
+# ==============================================================================
+
+DSN_POR_DEFECTO = os.environ.get("BENCHMARK_DSN", "postgresql://postgres@localhost:5432/postgres")
+ESQUEMA = "benchmark_claves"
+CONSULTAS_POR_CASO = 25
+TAMANO_LOTE_ANY = 200
+
+
+def definicion_funcion():
+    """Toma el CREATE FUNCTION de normalizar_claves.sql para medir exactamente la misma regla."""
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), "normalizar_claves.sql")
+    with open(ruta, encoding="utf-8") as f:
+        sql = f.read()
+    inicio = sql.index("CREATE OR REPLACE FUNCTION")
+    fin = sql.index("$$;", inicio) + 3
+    return sql[inicio:fin]
+
+
+def crear_tabla_sintetica(cur, filas):
+    print(f"Creando tabla sintética con {filas} filas...")
+    cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE; CREATE SCHEMA {ESQUEMA};")
+    # ~1.3 filas por matrícula (varios propietarios) y relleno de espacios como en los datos reales
+    cur.execute(f"""
+        CREATE TABLE {ESQUEMA}.informacioncatastral AS
+        SELECT
+            CASE WHEN g %% 7 = 0 THEN ' ' ELSE '' END
+                || (1000000 + (g / 1.3)::int)::text
+                || CASE WHEN g %% 3 = 0 THEN '  ' ELSE '' END AS "Matricula",
+            lpad(g::text, 30, '0') AS numero_predial_nacional,
+            md5(g::text) AS nombre
+        FROM generate_series(1, %s) g;
+    """, (filas,))
+    # Estado "antes": el índice btree que existiría sobre la columna cruda
+    cur.execute(f'CREATE INDEX ON {ESQUEMA}.informacioncatastral ("Matricula");')
+    cur.execute(f"ANALYZE {ESQUEMA}.informacioncatastral;")
+
+
+def aplicar_migracion(cur):
+    print("Aplicando columna normalizada e índice...")
+    cur.execute(definicion_funcion())
+    cur.execute(f"""
+        ALTER TABLE {ESQUEMA}.informacioncatastral
+            ADD COLUMN matricula_norm TEXT
+            GENERATED ALWAYS AS (public.normalizar_matricula("Matricula")) STORED;
+    """)
+    cur.execute(f"CREATE INDEX ON {ESQUEMA}.informacioncatastral (matricula_norm);")
+    cur.execute(f"ANALYZE {ESQUEMA}.informacioncatastral;")
+
+
+def nodos_del_plan(plan):
+    yield plan
+    for hijo in plan.get("Plans", []):
+        yield from nodos_del_plan(hijo)
+
+
+def medir(cur, etiqueta, sql, parametros):
+    """Ejecuta EXPLAIN (ANALYZE, BUFFERS) para cada parámetro y resume tiempos, nodos y bloques leídos."""
+    tiempos, bloques, tipos_nodo = [], [], set()
+    for valor in parametros:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, {"valor": valor})
+        plan = cur.fetchone()[0][0]
+        tiempos.append(plan["Execution Time"])
+        raiz = plan["Plan"]
+        bloques.append(raiz.get("Shared Hit Blocks", 0) + raiz.get("Shared Read Blocks", 0))
+        tipos_nodo.update(nodo["Node Type"] for nodo in nodos_del_plan(raiz))
+    tiempos.sort()
+    resultado = {
+        "caso": etiqueta,
+        "p50_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": round(tiempos[max(0, int(len(tiempos) * 0.95) - 1)], 3),
+        "bloques_promedio": round(statistics.mean(bloques), 1),
+        "nodos_plan": sorted(tipos_nodo),
+    }
+    print(f"  {etiqueta:<32} p50={resultado['p50_ms']:>9} ms  p95={resultado['p95_ms']:>9} ms  "
+          f"bloques={resultado['bloques_promedio']:>9}  {', '.join(resultado['nodos_plan'])}")
+    return resultado
+
+
+def ejecutar(dsn, filas, salida):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    resultados = {"filas": filas, "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "casos": []}
+    try:
+        with conn.cursor() as cur:
+            crear_tabla_sintetica(cur, filas)
+            cur.execute(f'SELECT DISTINCT "Matricula" FROM {ESQUEMA}.informacioncatastral')
+            muestra = random.sample([r[0] for r in cur.fetchall()], CONSULTAS_POR_CASO * (TAMANO_LOTE_ANY + 1))
+            claves = [m.strip() for m in muestra[:CONSULTAS_POR_CASO]]
+            lotes = [
+                [m.strip() for m in muestra[i:i + TAMANO_LOTE_ANY]]
+                for i in range(CONSULTAS_POR_CASO, len(muestra), TAMANO_LOTE_ANY)
+            ][:CONSULTAS_POR_CASO]
+
+            tabla = f"{ESQUEMA}.informacioncatastral"
+            print("\nANTES (TRIM en el predicado):")
+            resultados["casos"].append(medir(
+                cur, "antes: igualdad TRIM",
+                f'SELECT * FROM {tabla} WHERE TRIM("Matricula") = %(valor)s', claves))
+            resultados["casos"].append(medir(
+                cur, "antes: ANY TRIM (lote)",
+                f'SELECT DISTINCT TRIM("Matricula") FROM {tabla} WHERE TRIM("Matricula") = ANY(%(valor)s)', lotes))
+
+            aplicar_migracion(cur)
+            print("\nDESPUÉS (matricula_norm indexada):")
+            resultados["casos"].append(medir(
+                cur, "después: igualdad matricula_norm",
+                f"SELECT * FROM {tabla} WHERE matricula_norm = %(valor)s", claves))
+            resultados["casos"].append(medir(
+                cur, "después: ANY matricula_norm (lote)",
+                f"SELECT DISTINCT matricula_norm FROM {tabla} WHERE matricula_norm = ANY(%(valor)s)", lotes))
+
+            cur.execute(f"DROP SCHEMA {ESQUEMA} CASCADE;")
+    finally:
+        conn.close()
+
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Resultados guardados en: {salida}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EXPLAIN de TRIM() contra claves normalizadas.")
+    parser.add_argument("--dsn", default=DSN_POR_DEFECTO, help="Conexión a una base PostgreSQL local y desechable.")
+    parser.add_argument("--filas", type=int, default=1_000_000, help="Filas de la tabla sintética.")
+    parser.add_argument("--salida", default="benchmark_claves.json", help="Archivo JSON de resultados.")
+    args = parser.parse_args()
+    ejecutar(args.dsn, args.filas, args.salida)
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Value
+
+import psycopg2
+import psycopg2.extensions
+
+from generador_libro4 import escribir_csv, generar_filas
+
+# ==============================================================================
+# Benchmark de los cargadores de Libro4.csv contra una base PostgreSQL local
+# y desechable (las tablas se borran y se recrean antes de cada variante).
+#
+# Cada variante corre en su propio proceso, con el script original sin
+# modificar: psycopg2.connect se reemplaza para que ignore las credenciales
+# de Supabase escritas en el script y use --dsn, y las conexiones cuentan
+# cada execute / COPY / commit como una ida a la base de datos (también en
+# los procesos del Pool, que heredan el contador). Se reporta filas/s,
+# relaciones/s, pico de RSS (proceso principal y trabajadores) e idas a la BD.
+#
+# Los datos salen de generador_libro4.py (--escala) o de un CSV existente
+# (--archivo). Se copian como Libro4.csv en un directorio de trabajo, que es
+# el nombre que esperan los scripts.
+#
+# Una base desechable se levanta por ejemplo con:
+#   docker run --rm -p 5433:5432 -e POSTGRES_PASSWORD=bench postgres:16
+# Uso: python benchmark_etl.py --dsn "host=localhost port=5433 user=postgres password=bench" --escala 2
+# ==============================================================================
+
+DIRECTORIO_REPO = os.path.dirname(os.path.abspath(__file__))
+MARCA_RESULTADO = "@@RESULTADO@@ "
+
+# variante -> scripts que se ejecutan en orden, con sus argumentos
+VARIANTES = {
+    "et": [("ET.PY", [])],
+    "chunks_etl": [("chunks.py", []), ("ETL.py", [])],
+    "verificar_csv": [("verificar_csv.py", [])],
+    "carga_incremental": [("carga_incremental.py", ["Libro4.csv", "--completa"])],
+    "carga_staging": [("carga_staging.py", ["Libro4.csv"])],
+}
+
+ESQUEMA = """
+DROP TABLE IF EXISTS public.relacionesmatriculas, public.matriculas, public.informacioncatastral,
+                     public.staging_libro4, public.staging_libro4_relaciones CASCADE;
+DROP SEQUENCE IF EXISTS public.familias_seq;
+CREATE TABLE public.matriculas (
+    id SERIAL PRIMARY KEY,
+    no_matricula_inmobiliaria VARCHAR(100) UNIQUE,
+    estado_folio VARCHAR(50)
+);
+CREATE TABLE public.relacionesmatriculas (
+    matricula_padre_id INTEGER REFERENCES public.matriculas(id),
+    matricula_hija_id INTEGER REFERENCES public.matriculas(id),
+    PRIMARY KEY (matricula_padre_id, matricula_hija_id)
+);
+CREATE TABLE public.informacioncatastral ("Matricula" VARCHAR(100));
+"""
+
+
+# --- Lado del proceso de cada variante ---------------------------------------
+
+_idas_bd = None
+_conexiones = None
+
+
+class _CursorContado(psycopg2.extensions.cursor):
+    def execute(self, *args, **kwargs):
+        _contar(_idas_bd)
+        return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        _contar(_idas_bd)
+        return super().executemany(*args, **kwargs)
+
+    def copy_expert(self, *args, **kwargs):
+        _contar(_idas_bd)
+        return super().copy_expert(*args, **kwargs)
+
+    def copy_from(self, *args, **kwargs):
+        _contar(_idas_bd)
+        return super().copy_from(*args, **kwargs)
+
+
+class _ConexionContada(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = _CursorContado
+
+    def commit(self):
+        _contar(_idas_bd)
+        return super().commit()
+
+    def rollback(self):
+        _contar(_idas_bd)
+        return super().rollback()
+
+
+def _contar(contador):
+    with contador.get_lock():
+        contador.value += 1
+
+
+def _instalar_conexion(dsn):
+    """Redirige psycopg2.connect a dsn con conexiones que cuentan sus idas a la BD."""
+    global _idas_bd, _conexiones
+    # Value vive en memoria compartida: los procesos del Pool (fork) suman al mismo contador
+    _idas_bd = Value('q', 0)
+    _conexiones = Value('q', 0)
+    conectar_original = psycopg2.connect
+
+    def conectar(*args, **kwargs):
+        _contar(_conexiones)
+        return conectar_original(dsn, connection_factory=_ConexionContada)
+
+    psycopg2.connect = conectar
+
+
+def ejecutar_variante(variante, dsn):
+    """Corre los scripts de la variante en el directorio actual y devuelve sus métricas."""
+    _instalar_conexion(dsn)
+    sys.path.insert(0, DIRECTORIO_REPO)
+    inicio = time.perf_counter()
+    for script, argumentos in VARIANTES[variante]:
+        sys.argv = [script] + argumentos
+        runpy.run_path(os.path.join(DIRECTORIO_REPO, script), run_name="__main__")
+    segundos = time.perf_counter() - inicio
+    # ru_maxrss está en KB en Linux; RUSAGE_CHILDREN es el mayor de los trabajadores ya terminados
+    return {
+        "segundos": segundos,
+        "idas_bd": _idas_bd.value,
+        "conexiones": _conexiones.value,
+        "rss_pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "rss_pico_trabajadores_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+# --- Lado del orquestador ----------------------------------------------------
+
+def preparar_esquema(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ESQUEMA)
+            for script_sql in ("normalizar_claves.sql", "familias.sql", "version_grafo.sql"):
+                with open(os.path.join(DIRECTORIO_REPO, script_sql), encoding="utf-8") as f:
+                    cur.execute(f.read())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def contar_resultado(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM public.matriculas")
+            matriculas = cur.fetchone()[0]
+            cur.execute("SELECT count(*) FROM public.relacionesmatriculas")
+            relaciones = cur.fetchone()[0]
+            cur.execute("SELECT count(DISTINCT familia_id) FROM public.matriculas")
+            familias = cur.fetchone()[0]
+        return matriculas, relaciones, familias
+    finally:
+        conn.close()
+
+
+def medir_variante(variante, dsn, directorio, filas):
+    preparar_esquema(dsn)
+    log = os.path.join(directorio, f"{variante}.log")
+    with open(log, "w", encoding="utf-8") as salida:
+        proceso = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--dsn", dsn, "--ejecutar", variante],
+            cwd=directorio, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        salida.write(proceso.stdout)
+
+    metricas = None
+    errores = []
+    for linea in proceso.stdout.splitlines():
+        if linea.startswith(MARCA_RESULTADO):
+            metricas = json.loads(linea[len(MARCA_RESULTADO):])
+        elif linea.lstrip().startswith(("❌", "🚨", "Error", "Traceback")):
+            errores.append(linea.strip())
+    if metricas is None:
+        return {"variante": variante, "ok": False, "errores": errores or ["la variante no terminó"], "log": log}
+
+    matriculas, relaciones, familias = contar_resultado(dsn)
+    segundos = metricas["segundos"]
+    return {
+        "variante": variante,
+        "ok": proceso.returncode == 0 and not errores,
+        "segundos": round(segundos, 3),
+        "filas": filas,
+        "filas_por_segundo": round(filas / segundos, 1),
+        "matriculas": matriculas,
+        "relaciones": relaciones,
+        "relaciones_por_segundo": round(relaciones / segundos, 1),
+        "familias": familias,
+        "idas_bd": metricas["idas_bd"],
+        "conexiones": metricas["conexiones"],
+        "rss_pico_mb": metricas["rss_pico_mb"],
+        "rss_pico_trabajadores_mb": metricas["rss_pico_trabajadores_mb"],
+        "errores": errores,
+        "log": log,
+    }
+
+
+def ejecutar(dsn, variantes, escala, semilla, archivo, salida, directorio):
+    if "supabase.com" in dsn:
+        print("❌ El benchmark borra las tablas: usa una base local desechable, no Supabase.")
+        return False
+
+    directorio = directorio or tempfile.mkdtemp(prefix="benchmark_etl_")
+    os.makedirs(directorio, exist_ok=True)
+    destino = os.path.join(directorio, "Libro4.csv")
+    if archivo:
+        shutil.copyfile(archivo, destino)
+        origen = os.path.abspath(archivo)
+    else:
+        escribir_csv(destino, generar_filas(escala, semilla))
+        origen = f"sintético escala={escala} semilla={semilla}"
+    with open(destino, encoding="utf-8-sig") as f:
+        filas = sum(1 for linea in f if linea.strip()) - 1
+    print(f"Datos: {origen} ({filas} filas) en {directorio}\n")
+
+    resultados = []
+    for variante in variantes:
+        print(f"▶️  {variante}...")
+        resultado = medir_variante(variante, dsn, directorio, filas)
+        resultados.append(resultado)
+        if resultado.get("segundos") is not None:
+            print(f"   {resultado['segundos']:.2f} s, {resultado['filas_por_segundo']:.0f} filas/s, "
+                  f"{resultado['relaciones_por_segundo']:.0f} relaciones/s, {resultado['idas_bd']} idas a la BD, "
+                  f"RSS {resultado['rss_pico_mb']} MB (+{resultado['rss_pico_trabajadores_mb']} MB trabajadores)")
+        for error in resultado["errores"]:
+            print(f"   🚨 {error}")
+
+    reporte = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "datos": origen,
+        "filas": filas,
+        "escala": None if archivo else escala,
+        "semilla": None if archivo else semilla,
+        "variantes": resultados,
+    }
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+
+    fallidas = [r["variante"] for r in resultados if not r["ok"]]
+    if fallidas:
+        print(f"\n❌ Variantes con errores: {', '.join(fallidas)}. Resultados en: {salida}")
+        return False
+    print(f"\n✅ Resultados en: {salida}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los cargadores de Libro4.csv sobre una base local desechable.")
+    parser.add_argument("--dsn", default=os.environ.get("BENCHMARK_DSN"),
+                        help="DSN de la base desechable (o variable BENCHMARK_DSN).")
+    parser.add_argument("--variantes", nargs="+", choices=list(VARIANTES), default=list(VARIANTES))
+    parser.add_argument("--escala", type=float, default=1.0, help="Tamaño de los datos sintéticos (1.0 = Libro4.csv).")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--archivo", help="Usa este CSV en lugar de generar datos sintéticos.")
+    parser.add_argument("--directorio", help="Directorio de trabajo (por defecto uno temporal).")
+    parser.add_argument("--salida", default="benchmark_etl.json")
+    parser.add_argument("--ejecutar", choices=list(VARIANTES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("falta --dsn (o la variable BENCHMARK_DSN)")
+    if args.ejecutar:
+        # Proceso hijo: corre una variante y entrega sus métricas al orquestador
+        metricas = ejecutar_variante(args.ejecutar, args.dsn)
+        print(MARCA_RESULTADO + json.dumps(metricas), flush=True)
+        sys.exit(0)
+    sys.exit(0 if ejecutar(args.dsn, args.variantes, args.escala, args.semilla,
+                           args.archivo, args.salida, args.directorio) else 1)
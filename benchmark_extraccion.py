@@ -0,0 +1,115 @@
+import argparse
+import json
+import sys
+import time
+
+import pandas as pd
+
+from claves import normalizar_matricula, separar_matriculas
+from verificar_csv import extraer_matriculas_y_relaciones
+
+# ==============================================================================
+# Comparación de la extracción vectorizada de verificar_csv.py contra la
+# implementación anterior con iterrows(). Parte Libro4.csv en chunks como
+# chunks.py, comprueba que ambas den exactamente el mismo mapa
+# matrícula -> estado y el mismo conjunto de relaciones (por chunk y unidos en
+# orden) y mide el tiempo de cada una. Termina con código 1 si difieren.
+#
+# Uso: python benchmark_extraccion.py --archivo Libro4.csv --lineas-por-chunk 5000
+# ==============================================================================
+
+MEDICIONES = 3
+
+
+def extraccion_iterrows(df):
+    """Réplica de procesar_chunk_para_recolectar antes de vectorizar (referencia)."""
+    relaciones_potenciales = set()
+    matriculas_con_estado = {}
+    for index, row in df.iterrows():
+        matricula_actual = normalizar_matricula(row['no_matricula_inmobiliaria'])
+        if not matricula_actual:
+            continue
+        matriculas_con_estado[matricula_actual] = row['estado_folio'].strip()
+        if row['matriculas_matriz']:
+            for padre in separar_matriculas(row['matriculas_matriz']):
+                if padre not in matriculas_con_estado:
+                    matriculas_con_estado[padre] = 'ACTIVO'
+                relaciones_potenciales.add((padre, matricula_actual))
+        if row['matriculas_derivadas']:
+            for hija in separar_matriculas(row['matriculas_derivadas']):
+                if hija not in matriculas_con_estado:
+                    matriculas_con_estado[hija] = 'ACTIVO'
+                relaciones_potenciales.add((matricula_actual, hija))
+    return matriculas_con_estado, relaciones_potenciales
+
+
+def extraccion_vectorizada(df):
+    matriculas, relaciones = extraer_matriculas_y_relaciones(df)
+    return dict(zip(matriculas['matricula'], matriculas['estado'])), set(zip(relaciones['padre'], relaciones['hija']))
+
+
+def medir(funcion, chunks):
+    mejor = None
+    for _ in range(MEDICIONES):
+        inicio = time.perf_counter()
+        salida = [funcion(chunk) for chunk in chunks]
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return salida, mejor
+
+
+def ejecutar(archivo, lineas_por_chunk, salida):
+    df = pd.read_csv(archivo, sep=';', dtype=str).fillna('')
+    chunks = [df.iloc[i:i + lineas_por_chunk] for i in range(0, len(df), lineas_por_chunk)]
+    print(f"Archivo: {archivo} ({len(df)} filas, {len(chunks)} chunks)\n")
+
+    antes, t_antes = medir(extraccion_iterrows, chunks)
+    despues, t_despues = medir(extraccion_vectorizada, chunks)
+
+    diferencias = 0
+    for i, ((mat_a, rel_a), (mat_d, rel_d)) in enumerate(zip(antes, despues)):
+        if mat_a != mat_d or rel_a != rel_d:
+            diferencias += 1
+            print(f"🚨 Chunk {i}: {len(set(mat_a.items()) ^ set(mat_d.items()))} matrículas y "
+                  f"{len(rel_a ^ rel_d)} relaciones distintas")
+
+    # Unión en orden como en la Fase 2 de verificar_csv.py
+    total_antes, total_despues = {}, {}
+    for (mat_a, _), (mat_d, _) in zip(antes, despues):
+        total_antes.update(mat_a)
+        total_despues.update(mat_d)
+    if total_antes != total_despues:
+        diferencias += 1
+        print("🚨 El mapa matrícula -> estado unido difiere.")
+
+    resultados = {
+        "archivo": archivo,
+        "filas": len(df),
+        "chunks": len(chunks),
+        "segundos_iterrows": round(t_antes, 4),
+        "segundos_vectorizado": round(t_despues, 4),
+        "aceleracion": round(t_antes / t_despues, 2),
+        "matriculas": len(total_despues),
+        "relaciones": len(set().union(*(rel for _, rel in despues))),
+        "diferencias": diferencias,
+    }
+    print(f"  iterrows:    {t_antes:.3f} s")
+    print(f"  vectorizado: {t_despues:.3f} s  ({resultados['aceleracion']}x)")
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    if diferencias:
+        print(f"\n❌ Las salidas difieren en {diferencias} casos.")
+        return False
+    print(f"\n✅ Salidas idénticas ({resultados['matriculas']} matrículas, {resultados['relaciones']} relaciones). "
+          f"Resultados en: {salida}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara la extracción vectorizada con la de iterrows().")
+    parser.add_argument("--archivo", default="Libro4.csv")
+    parser.add_argument("--lineas-por-chunk", type=int, default=5000)
+    parser.add_argument("--salida", default="benchmark_extraccion.json")
+    args = parser.parse_args()
+    sys.exit(0 if ejecutar(args.archivo, args.lineas_por_chunk, args.salida) else 1)
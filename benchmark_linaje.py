@@ -0,0 +1,354 @@
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import time
+
+import psycopg2
+import psycopg2.errors
+
+from familias import SQL_RELACIONES_FAMILIA, UnionFind
+from indice_grafo import IndiceGrafo
+
+# ==============================================================================
+# Benchmark de latencia de las consultas de linaje (familia de una matrícula)
+# sobre grafos sintéticos con formas difíciles, en el esquema
+# "benchmark_linaje" de una base de datos LOCAL y desechable:
+#
+#   cadena      una cadena larga padre -> hija -> nieta ...
+#   abanico     una matriz con miles de derivadas
+#   diamantes   diamantes apilados (una matriz con ANCHO hijas que vuelven a
+#               unirse en una sola nieta, PROFUNDIDAD veces), como 1037472
+#               con sus seis matrices: el número de caminos crece como ANCHO^PROFUNDIDAD
+#   grande      una componente grande con la forma de Libro4 (árbol con
+#               uniones preferenciales y un 10% de segundas matrices)
+#   pequenas    muchas familias de 2 a 5 matrículas (el caso común)
+#
+# Estrategias medidas (las consultas son réplicas de las de producción):
+#   recursiva_union_or     CTE de app.obtener_relaciones_familia (UNION + JOIN con OR)
+#   recursiva_caminos      CTE de visualizar_grafo.py (UNION ALL con arreglos de camino)
+#   recursiva_aristas      candidata: UNION con un LATERAL por sentido (dos búsquedas
+#                          por índice por matrícula), sin OR ni arreglos de camino
+#   familia_id             familia materializada en matriculas.familia_id (familias.sql);
+#                          es familias.SQL_RELACIONES_FAMILIA, la consulta de producción
+#   indice_memoria         IndiceGrafo en memoria (sin base de datos)
+#
+# Por forma y estrategia: latencia p50/p95/p99 (vista desde el cliente), filas
+# leídas de las tablas y bloques según EXPLAIN (ANALYZE, BUFFERS), y si el
+# resultado coincide con el del índice en memoria. Cada consulta tiene un
+# statement_timeout; la estrategia que lo supera deja de medirse en esa forma.
+#
+# Uso: python benchmark_linaje.py --dsn postgresql://postgres@localhost/postgres --escala 1
+# ==============================================================================
+
+DSN_POR_DEFECTO = os.environ.get("BENCHMARK_DSN", "postgresql://postgres@localhost:5432/postgres")
+ESQUEMA = "benchmark_linaje"
+REPETICIONES = 30
+TIMEOUT_MS = 5000
+
+# Tamaños con --escala 1
+LARGO_CADENA = 2000
+HIJAS_ABANICO = 5000
+ANCHO_DIAMANTE = 6
+PROFUNDIDAD_DIAMANTES = 5
+NODOS_COMPONENTE_GRANDE = 20000
+FAMILIAS_PEQUENAS = 20000
+
+ESTRATEGIAS_SQL = {
+    "recursiva_union_or": """
+        WITH RECURSIVE familia_grafo AS (
+            SELECT id, no_matricula_inmobiliaria FROM {esquema}.matriculas WHERE matricula_norm = %(start_node)s
+            UNION
+            SELECT
+                CASE WHEN r.matricula_padre_id = fg.id THEN m_hija.id ELSE m_padre.id END,
+                CASE WHEN r.matricula_padre_id = fg.id THEN m_hija.no_matricula_inmobiliaria ELSE m_padre.no_matricula_inmobiliaria END
+            FROM {esquema}.relacionesmatriculas r
+            JOIN familia_grafo fg ON r.matricula_padre_id = fg.id OR r.matricula_hija_id = fg.id
+            JOIN {esquema}.matriculas m_padre ON r.matricula_padre_id = m_padre.id
+            JOIN {esquema}.matriculas m_hija ON r.matricula_hija_id = m_hija.id
+        )
+        SELECT DISTINCT
+            padre.matricula_norm AS padre,
+            hija.matricula_norm AS hija
+        FROM {esquema}.relacionesmatriculas rel
+        JOIN {esquema}.matriculas padre ON rel.matricula_padre_id = padre.id
+        JOIN {esquema}.matriculas hija ON rel.matricula_hija_id = hija.id
+        WHERE padre.id IN (SELECT id FROM familia_grafo)
+            AND hija.id IN (SELECT id FROM familia_grafo)
+    """,
+    "recursiva_caminos": """
+        WITH RECURSIVE familia_grafo (id, path) AS (
+            SELECT m.id, ARRAY[m.id] AS path
+            FROM {esquema}.matriculas m
+            WHERE m.matricula_norm = %(start_node)s
+            UNION ALL
+            SELECT
+                CASE WHEN r.matricula_padre_id = fg.id THEN r.matricula_hija_id ELSE r.matricula_padre_id END AS id,
+                fg.path || CASE WHEN r.matricula_padre_id = fg.id THEN r.matricula_hija_id ELSE r.matricula_padre_id END
+            FROM {esquema}.relacionesmatriculas r
+            JOIN familia_grafo fg
+            ON r.matricula_padre_id = fg.id
+            OR r.matricula_hija_id = fg.id
+            WHERE NOT (
+                CASE WHEN r.matricula_padre_id = fg.id THEN r.matricula_hija_id ELSE r.matricula_padre_id END
+            ) = ANY (fg.path)
+        )
+        SELECT
+            padre.matricula_norm AS padre,
+            hija.matricula_norm AS hija
+        FROM {esquema}.relacionesmatriculas rel
+        JOIN {esquema}.matriculas padre ON rel.matricula_padre_id = padre.id
+        JOIN {esquema}.matriculas hija ON rel.matricula_hija_id = hija.id
+        WHERE rel.matricula_padre_id IN (SELECT id FROM familia_grafo)
+        AND rel.matricula_hija_id IN (SELECT id FROM familia_grafo)
+    """,
+    "recursiva_aristas": """
+        WITH RECURSIVE familia_grafo (id) AS (
+            SELECT id FROM {esquema}.matriculas WHERE matricula_norm = %(start_node)s
+            UNION
+            SELECT e.vecino
+            FROM familia_grafo fg
+            CROSS JOIN LATERAL (
+                SELECT matricula_hija_id AS vecino FROM {esquema}.relacionesmatriculas WHERE matricula_padre_id = fg.id
+                UNION ALL
+                SELECT matricula_padre_id FROM {esquema}.relacionesmatriculas WHERE matricula_hija_id = fg.id
+            ) e
+        )
+        SELECT
+            padre.matricula_norm AS padre,
+            hija.matricula_norm AS hija
+        FROM familia_grafo fg
+        JOIN {esquema}.relacionesmatriculas rel ON rel.matricula_padre_id = fg.id
+        JOIN {esquema}.matriculas padre ON padre.id = rel.matricula_padre_id
+        JOIN {esquema}.matriculas hija ON hija.id = rel.matricula_hija_id
+    """,
+    # La misma consulta que app.py, no una copia
+    "familia_id": SQL_RELACIONES_FAMILIA,
+}
+ESTRATEGIAS = list(ESTRATEGIAS_SQL) + ["indice_memoria"]
+
+
+# --- Grafos sintéticos --------------------------------------------------------
+
+def generar_formas(escala, semilla):
+    """Devuelve {forma: (aristas [(padre, hija)], matrículas de inicio posibles)}."""
+    rnd = random.Random(semilla)
+    formas = {}
+
+    largo = max(2, round(LARGO_CADENA * escala))
+    cadena = [f"C{i}" for i in range(largo)]
+    formas["cadena"] = (list(zip(cadena, cadena[1:])), cadena)
+
+    hijas = [f"A{i}" for i in range(max(1, round(HIJAS_ABANICO * escala)))]
+    formas["abanico"] = ([("A_MATRIZ", h) for h in hijas], ["A_MATRIZ"] + hijas)
+
+    aristas, nodos = [], ["D0"]
+    for nivel in range(PROFUNDIDAD_DIAMANTES):
+        arriba, abajo = f"D{nivel}", f"D{nivel + 1}"
+        for j in range(ANCHO_DIAMANTE):
+            medio = f"D{nivel}_{j}"
+            aristas += [(arriba, medio), (medio, abajo)]
+            nodos.append(medio)
+        nodos.append(abajo)
+    formas["diamantes"] = (aristas, nodos)
+
+    # Unión preferencial: las matrices con muchas hijas tienden a recibir más
+    total = max(2, round(NODOS_COMPONENTE_GRANDE * escala))
+    aristas, padres_elegibles = [], ["G0"]
+    for i in range(1, total):
+        nodo = f"G{i}"
+        padre = rnd.choice(padres_elegibles)
+        aristas.append((padre, nodo))
+        if rnd.random() < 0.10:
+            otro = rnd.choice(padres_elegibles)
+            if otro != padre:
+                aristas.append((otro, nodo))
+        padres_elegibles += [nodo, padre]
+    formas["grande"] = (aristas, [f"G{i}" for i in range(total)])
+
+    aristas, nodos = [], []
+    for f in range(max(1, round(FAMILIAS_PEQUENAS * escala))):
+        miembros = [f"P{f}_{k}" for k in range(rnd.randint(2, 5))]
+        aristas += [(rnd.choice(miembros[:k]), hija) for k, hija in enumerate(miembros) if k]
+        nodos += miembros
+    formas["pequenas"] = (aristas, nodos)
+    return formas
+
+
+def cargar_formas(cur, formas):
+    """Crea el esquema y carga todas las formas en las mismas tablas (como en producción)."""
+    print("Creando grafos sintéticos...")
+    cur.execute(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE; CREATE SCHEMA {ESQUEMA};")
+    cur.execute(f"""
+        CREATE TABLE {ESQUEMA}.matriculas (
+            id INTEGER PRIMARY KEY,
+            no_matricula_inmobiliaria TEXT,
+            matricula_norm TEXT,
+            estado_folio TEXT,
+            familia_id BIGINT
+        );
+        CREATE TABLE {ESQUEMA}.relacionesmatriculas (
+            matricula_padre_id INTEGER,
+            matricula_hija_id INTEGER,
+            PRIMARY KEY (matricula_padre_id, matricula_hija_id)
+        );
+    """)
+
+    ids = {}
+    uf = UnionFind()
+    aristas_id = []
+    for aristas, nodos in formas.values():
+        for nodo in nodos:
+            ids.setdefault(nodo, len(ids) + 1)
+        for padre, hija in aristas:
+            aristas_id.append((ids[padre], ids[hija]))
+            uf.unir(ids[padre], ids[hija])
+    familia = {}
+    for numero, componente in enumerate(uf.componentes(), start=1):
+        familia.update((id_matricula, numero) for id_matricula in componente)
+
+    # Todas las matrículas sintéticas tienen al menos una relación, así que todas tienen familia
+    filas = "".join(f"{id_m}\t{nodo}\t{nodo}\tACTIVO\t{familia[id_m]}\n" for nodo, id_m in ids.items())
+    cur.copy_expert(f"COPY {ESQUEMA}.matriculas FROM STDIN", io.BytesIO(filas.encode("utf-8")))
+    filas = "".join(f"{p}\t{h}\n" for p, h in set(aristas_id))
+    cur.copy_expert(f"COPY {ESQUEMA}.relacionesmatriculas FROM STDIN", io.BytesIO(filas.encode("utf-8")))
+    cur.execute(f"""
+        CREATE UNIQUE INDEX ON {ESQUEMA}.matriculas (matricula_norm);
+        CREATE INDEX ON {ESQUEMA}.matriculas (familia_id);
+        CREATE INDEX ON {ESQUEMA}.relacionesmatriculas (matricula_hija_id);
+        ANALYZE {ESQUEMA}.matriculas;
+        ANALYZE {ESQUEMA}.relacionesmatriculas;
+    """)
+    print(f"  {len(ids)} matrículas, {len(aristas_id)} relaciones.")
+    return ids
+
+
+# --- Medición -----------------------------------------------------------------
+
+def nodos_del_plan(plan):
+    yield plan
+    for hijo in plan.get("Plans", []):
+        yield from nodos_del_plan(hijo)
+
+
+def filas_leidas(plan):
+    """Filas que los nodos de lectura sacaron de las tablas (incluidas las descartadas por filtros)."""
+    total = 0
+    for nodo in nodos_del_plan(plan):
+        if "Relation Name" in nodo:
+            por_ciclo = (nodo.get("Actual Rows", 0) + nodo.get("Rows Removed by Filter", 0)
+                         + nodo.get("Rows Removed by Index Recheck", 0))
+            total += por_ciclo * nodo.get("Actual Loops", 1)
+    return int(total)
+
+
+def percentil(ordenados, p):
+    if len(ordenados) == 1:
+        return ordenados[0]
+    return statistics.quantiles(ordenados, n=100, method="inclusive")[p - 1]
+
+
+def medir_forma(cur, indice, forma, inicios, estrategias, timeout_ms):
+    resultados = []
+    cur.execute("SET statement_timeout = %s", (timeout_ms,))
+    esperado = {m: {fila[:2] for fila in indice.relaciones_familia(m)} for m in inicios}
+    for estrategia in estrategias:
+        tiempos, distintos, expiro = [], 0, False
+        plan = None
+        sql = ESTRATEGIAS_SQL.get(estrategia, "").format(esquema=ESQUEMA)
+        for inicio_nodo in inicios:
+            t0 = time.perf_counter()
+            if estrategia == "indice_memoria":
+                obtenido = {fila[:2] for fila in indice.relaciones_familia(inicio_nodo)}
+            else:
+                try:
+                    cur.execute(sql, {"start_node": inicio_nodo})
+                    # familia_id devuelve además los estados: se comparan solo las aristas
+                    obtenido = {fila[:2] for fila in cur.fetchall()}
+                except psycopg2.errors.QueryCanceled:
+                    expiro = True
+                    break
+            tiempos.append((time.perf_counter() - t0) * 1000)
+            distintos += obtenido != esperado[inicio_nodo]
+
+        if estrategia != "indice_memoria" and not expiro:
+            try:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, {"start_node": inicios[0]})
+                plan = cur.fetchone()[0][0]["Plan"]
+            except psycopg2.errors.QueryCanceled:
+                # EXPLAIN ANALYZE agrega su propio costo y puede pasarse del límite aunque la consulta no
+                plan = None
+
+        tiempos.sort()
+        resultado = {
+            "forma": forma,
+            "estrategia": estrategia,
+            "consultas": len(tiempos),
+            "expiro": expiro,
+            "p50_ms": round(percentil(tiempos, 50), 3) if tiempos else None,
+            "p95_ms": round(percentil(tiempos, 95), 3) if tiempos else None,
+            "p99_ms": round(percentil(tiempos, 99), 3) if tiempos else None,
+            "filas_leidas": filas_leidas(plan) if plan else None,
+            "bloques": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0) if plan else None,
+            "relaciones_resultado": len(esperado[inicios[0]]),
+            "resultados_distintos": distintos,
+        }
+        resultados.append(resultado)
+        if expiro:
+            print(f"  {forma:<10} {estrategia:<20} ⏱️  superó {timeout_ms} ms")
+        else:
+            filas = "-" if resultado["filas_leidas"] is None else resultado["filas_leidas"]
+            aviso = f"  🚨 {distintos} resultados distintos" if distintos else ""
+            print(f"  {forma:<10} {estrategia:<20} p50={resultado['p50_ms']:>10} ms  "
+                  f"p95={resultado['p95_ms']:>10} ms  p99={resultado['p99_ms']:>10} ms  filas={filas:>9}{aviso}")
+    return resultados
+
+
+def ejecutar(dsn, escala, semilla, repeticiones, timeout_ms, estrategias, salida, conservar):
+    rnd = random.Random(semilla)
+    formas = generar_formas(escala, semilla)
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    resultados = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "escala": escala,
+        "repeticiones": repeticiones,
+        "timeout_ms": timeout_ms,
+        "casos": [],
+    }
+    try:
+        with conn.cursor() as cur:
+            cargar_formas(cur, formas)
+            indice = IndiceGrafo()
+            indice.agregar_relaciones([arista for aristas, _ in formas.values() for arista in aristas])
+
+            print()
+            for forma, (_, nodos) in formas.items():
+                inicios = [rnd.choice(nodos) for _ in range(repeticiones)]
+                resultados["casos"] += medir_forma(cur, indice, forma, inicios, estrategias, timeout_ms)
+
+            if not conservar:
+                cur.execute(f"DROP SCHEMA {ESQUEMA} CASCADE;")
+    finally:
+        conn.close()
+
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Resultados guardados en: {salida}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia de las consultas de linaje sobre grafos sintéticos.")
+    parser.add_argument("--dsn", default=DSN_POR_DEFECTO, help="Conexión a una base PostgreSQL local y desechable.")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplica el tamaño de las formas.")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--repeticiones", type=int, default=REPETICIONES, help="Consultas por forma y estrategia.")
+    parser.add_argument("--timeout-ms", type=int, default=TIMEOUT_MS, help="statement_timeout de cada consulta.")
+    parser.add_argument("--estrategias", nargs="+", choices=ESTRATEGIAS, default=ESTRATEGIAS)
+    parser.add_argument("--conservar", action="store_true", help="No borra el esquema al terminar.")
+    parser.add_argument("--salida", default="benchmark_linaje.json", help="Archivo JSON de resultados.")
+    args = parser.parse_args()
+    ejecutar(args.dsn, args.escala, args.semilla, args.repeticiones, args.timeout_ms,
+             args.estrategias, args.salida, args.conservar)
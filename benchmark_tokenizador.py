@@ -0,0 +1,132 @@
+import argparse
+import io
+import json
+import re
+import statistics
+import time
+
+from tokenizador_sql import ErrorInsert, leer_inserts
+
+# ==============================================================================
+# Benchmark del tokenizador de INSERT (tokenizador_sql.py) contra el camino
+# anterior de conversor.py / depurador.py: dos expresiones regulares por línea
+# y split(','). Mide sobre un archivo con la forma de errores.sql (por defecto
+# el propio errores.sql), repetido en memoria para que el disco no influya.
+#
+# Uso: python benchmark_tokenizador.py --archivo errores.sql --repeticiones 20
+# ==============================================================================
+
+ARCHIVO_POR_DEFECTO = "errores.sql"
+MEDICIONES = 5
+
+
+def camino_conversor(texto):
+    """Réplica del bucle de conversor.convert_sql_to_csv antes del tokenizador."""
+    def clean_value(value):
+        value = value.strip()
+        if value.startswith("'") and value.endswith("'"):
+            return value[1:-1]
+        if value.startswith('"') and value.endswith('"'):
+            return value[1:-1]
+        if value.upper() == 'NULL':
+            return ''
+        return value
+
+    filas = 0
+    descuadres = 0
+    for line in io.StringIO(texto):
+        if not line.strip().upper().startswith('INSERT INTO'):
+            continue
+        match_cols = re.search(r'\((.*?)\)', line)
+        match_vals = re.search(r'VALUES[ ]*\((.*)\);', line, re.IGNORECASE)
+        if not match_cols or not match_vals:
+            continue
+        columns = [clean_value(col) for col in match_cols.group(1).split(',')]
+        values = [clean_value(val) for val in match_vals.group(1).split(',')]
+        descuadres += len(columns) != len(values)
+        filas += 1
+    return filas, descuadres
+
+
+def camino_depurador(texto):
+    """Réplica del bucle de depurador.depurar_sql antes del tokenizador."""
+    filas = 0
+    descuadres = 0
+    for linea in io.StringIO(texto):
+        if re.search(r'INSERT INTO', linea, re.IGNORECASE):
+            match_columnas = re.search(r'\((.*?)\)', linea)
+            match_valores = re.search(r'VALUES[ ]*\((.*)\)', linea, re.IGNORECASE)
+            if match_columnas and match_valores:
+                descuadres += len(match_columnas.group(1).split(',')) != len(match_valores.group(1).split(','))
+                filas += 1
+    return filas, descuadres
+
+
+def camino_tokenizador(datos):
+    filas = 0
+    errores = 0
+    for elemento in leer_inserts(io.BytesIO(datos)):
+        if isinstance(elemento, ErrorInsert):
+            errores += 1
+        else:
+            filas += 1
+    return filas, errores
+
+
+def medir(etiqueta, funcion, entrada, sentencias, megabytes):
+    tiempos = []
+    for _ in range(MEDICIONES):
+        inicio = time.perf_counter()
+        filas, descuadres = funcion(entrada)
+        tiempos.append(time.perf_counter() - inicio)
+    mediana = statistics.median(tiempos)
+    resultado = {
+        "camino": etiqueta,
+        "segundos_mediana": round(mediana, 4),
+        "us_por_sentencia": round(mediana / sentencias * 1e6, 2),
+        "mb_por_segundo": round(megabytes / mediana, 2),
+        "filas": filas,
+        "descuadres_o_errores": descuadres,
+    }
+    print(f"  {etiqueta:<14} {resultado['us_por_sentencia']:>8} µs/sentencia  "
+          f"{resultado['mb_por_segundo']:>7} MB/s  filas={filas}  descuadres/errores={descuadres}")
+    return resultado
+
+
+def ejecutar(archivo, repeticiones, salida):
+    with open(archivo, 'rb') as f:
+        datos = f.read() * repeticiones
+    texto = datos.decode('utf-8')
+    sentencias = len(re.findall(r'INSERT\s+INTO', texto, re.IGNORECASE))
+    megabytes = len(datos) / (1024 * 1024)
+    print(f"Archivo: {archivo} x{repeticiones} = {megabytes:.1f} MB, {sentencias} sentencias INSERT\n")
+
+    casos = [
+        medir("conversor", camino_conversor, texto, sentencias, megabytes),
+        medir("depurador", camino_depurador, texto, sentencias, megabytes),
+        medir("tokenizador", camino_tokenizador, datos, sentencias, megabytes),
+    ]
+    nuevo = casos[-1]["segundos_mediana"]
+    for caso in casos[:-1]:
+        caso["aceleracion_tokenizador"] = round(caso["segundos_mediana"] / nuevo, 2)
+        print(f"\n⚡ Tokenizador {caso['aceleracion_tokenizador']}x más rápido que el camino de {caso['camino']}.py")
+
+    resultados = {
+        "archivo": archivo,
+        "repeticiones": repeticiones,
+        "sentencias": sentencias,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "casos": casos,
+    }
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Resultados guardados en: {salida}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del tokenizador de INSERT contra regex + split.")
+    parser.add_argument("--archivo", default=ARCHIVO_POR_DEFECTO, help="Archivo .sql con INSERT de una línea.")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Veces que se repite el archivo en memoria.")
+    parser.add_argument("--salida", default="benchmark_tokenizador.json", help="Archivo JSON de resultados.")
+    args = parser.parse_args()
+    ejecutar(args.archivo, args.repeticiones, args.salida)
@@ -1,7 +1,16 @@
 import psycopg2
+import argparse
+import io
+import mmap
 import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from tqdm import tqdm  # <-- NUEVO: Importamos la librería para la barra de progreso
 
+from rangos_csv import partir_rangos
+from tokenizador_sql import ErrorInsert, empieza_insert, sentencias_por_linea
+
 # ==============================================================================
 # --- CONFIGURACIÓN (MODIFICA ESTAS VARIABLES) ---
 # ==============================================================================
@@ -16,91 +25,214 @@ DB_NAME = "postgres"
 # 2. RUTA A TU ARCHIVO .SQL
 SQL_FILE_PATH = "/Users/pixel/Documents/PERSONAL/ANALISTA/terrenos/carga.sql"
 
-# 3. RUTA PARA GUARDAR LAS LÍNEAS CON ERRORES
+# 3. RUTA PARA GUARDAR LAS SENTENCIAS CON ERRORES
 ERROR_FILE_PATH = "errores.sql"
 
 # 4. TAMAÑO DEL LOTE (BATCH SIZE)
-# Define cuántas inserciones exitosas se acumularán antes de guardarlas en la BD.
+# Define cuántas sentencias se envían y confirman juntas en la BD.
+# Si un lote falla, se parte en mitades hasta aislar solo las sentencias malas.
 # Un valor entre 500 y 5000 suele funcionar bien.
 BATCH_SIZE = 1000  # <-- NUEVO: Variable de configuración para el tamaño del lote
 
+# 5. MODO DE CARGA
+# "copy": convierte los INSERT a filas y las envía con COPY ... FROM STDIN (mucho más rápido).
+# "insert": envía las sentencias tal cual, BATCH_SIZE sentencias por execute.
+# También se puede elegir al ejecutar: python carga.py --modo insert
+MODO_CARGA = "copy"
+
+# 6. FILAS POR LOTE DE COPY
+# Cada lote se arma en memoria y se envía en un solo COPY, así que acota el uso de RAM.
+COPY_BATCH_FILAS = 20000
+
+# 7. CARGA PARALELA (python carga.py --paralelo)
+# El archivo se reparte en rangos de bytes que terminan antes de una línea que
+# empieza un INSERT y cada proceso los carga con su propia conexión.
+# NUM_WORKERS = "auto" ajusta los procesos activos según el rendimiento observado,
+# entre 1 y MAX_WORKERS. Con un número fijo se usan siempre esos procesos.
+NUM_WORKERS = "auto"
+MAX_WORKERS = 8
+TAMANO_RANGO_MB = 8
+# Cada cuántos segundos se mide el rendimiento para subir o bajar procesos
+VENTANA_AJUSTE_SEGUNDOS = 10
+
 # ==============================================================================
 # --- SCRIPT DE EJECUCIÓN (NO NECESITAS MODIFICAR DE AQUÍ EN ADELANTE) ---
 # ==============================================================================
 
-def execute_sql_optimizado():
+def _valor_copy(valor):
+    """Escapa un valor para el formato de texto de COPY."""
+    if valor is None:
+        return '\\N'
+    valor = str(valor)
+    return (valor.replace('\\', '\\\\').replace('\t', '\\t')
+                 .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class EjecutorLotes:
+    """
+    Envía sentencias INSERT a la base de datos por lotes, en modo "insert"
+    (las sentencias del lote en un solo execute) o "copy" (las filas del lote
+    en un solo COPY ... FROM STDIN). Las sentencias llegan completas desde
+    tokenizador_sql.sentencias_por_linea, aunque ocupen varias líneas.
+
+    Si un lote falla, se revierte y se parte en mitades que se reintentan por
+    separado, hasta aislar las sentencias que realmente fallan. Esas sentencias
+    se registran con la línea donde empiezan y el mensaje de error de
+    PostgreSQL; el resto del lote se confirma normalmente.
+    """
+
+    def __init__(self, conn, modo, registrar_error):
+        self.conn = conn
+        self.modo = modo
+        self.registrar_error = registrar_error
+        self.exitosas = 0
+        self.fallidas = 0
+        self._pendientes = []  # (num_linea, sentencia, filas_copy)
+        self._clave_copy = None
+        self._filas_copy = 0
+
+    # --- Envío de un conjunto de sentencias ---
+
+    def _enviar_insert(self, unidades):
+        with self.conn.cursor() as cur:
+            cur.execute("\n".join(sentencia for _, sentencia, _ in unidades))
+
+    def _enviar_copy(self, unidades):
+        tabla, columnas = self._clave_copy
+        buffer = io.StringIO("".join(filas for _, _, filas in unidades))
+        with self.conn.cursor() as cur:
+            cur.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN", buffer)
+
+    def _enviar_con_biseccion(self, unidades, enviar):
+        pila = [unidades]
+        while pila:
+            grupo = pila.pop()
+            try:
+                enviar(grupo)
+                self.conn.commit()
+                self.exitosas += len(grupo)
+            except psycopg2.Error as e:
+                self.conn.rollback()
+                if len(grupo) == 1:
+                    num_linea, sentencia, _ = grupo[0]
+                    self.fallidas += 1
+                    mensaje = e.diag.message_primary or str(e).strip().splitlines()[0]
+                    self.registrar_error(num_linea, sentencia, mensaje)
+                else:
+                    mitad = len(grupo) // 2
+                    # Se apila primero la segunda mitad para conservar el orden del archivo
+                    pila.append(grupo[mitad:])
+                    pila.append(grupo[:mitad])
+
+    def vaciar(self):
+        if not self._pendientes:
+            return
+        unidades = self._pendientes
+        self._pendientes = []
+        self._filas_copy = 0
+        if self._clave_copy is None:
+            self._enviar_con_biseccion(unidades, self._enviar_insert)
+        else:
+            self._enviar_con_biseccion(unidades, self._enviar_copy)
+            self._clave_copy = None
+
+    # --- Entrada de sentencias ---
+
+    def agregar(self, elemento):
+        """
+        Agrega un elemento de sentencias_por_linea: (num_linea, sentencia, tabla,
+        columnas, filas) o un ErrorInsert, que se envía como SQL tal cual para
+        que sea PostgreSQL quien lo acepte o informe el error.
+        """
+        if isinstance(elemento, ErrorInsert):
+            num_linea, sentencia = elemento.num_linea, elemento.sentencia
+        else:
+            num_linea, sentencia, tabla, columnas, filas = elemento
+            if self.modo == "copy":
+                if self._clave_copy != (tabla, columnas):
+                    self.vaciar()
+                    self._clave_copy = (tabla, columnas)
+                texto = "".join('\t'.join(_valor_copy(valor) for valor in fila) + '\n' for fila in filas)
+                self._pendientes.append((num_linea, sentencia, texto))
+                self._filas_copy += len(filas)
+                if self._filas_copy >= COPY_BATCH_FILAS:
+                    self.vaciar()
+                return
+
+        # No es un INSERT simple: se vacía el lote de COPY y la sentencia va por el camino normal
+        if self._clave_copy is not None:
+            self.vaciar()
+        sentencia = sentencia.rstrip()
+        if not sentencia.endswith(';'):
+            sentencia += ';'
+        self._pendientes.append((num_linea, sentencia, None))
+        if len(self._pendientes) >= BATCH_SIZE:
+            self.vaciar()
+
+
+def parametros_db():
+    return dict(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+
+
+def escribir_error(f_error, num_linea, sentencia, mensaje):
+    f_error.write(f"-- línea {num_linea}: {mensaje}\n")
+    f_error.write(sentencia if sentencia.endswith('\n') else sentencia + '\n')
+
+
+def execute_sql_optimizado(modo=MODO_CARGA):
     """
-    Se conecta a la BD y ejecuta un archivo .sql por lotes con una barra de progreso.
+    Se conecta a la BD y ejecuta los INSERT de un archivo .sql por lotes con
+    una barra de progreso. Lee el archivo en streaming con el tokenizador y
+    mide el progreso en bytes; lo que no es un INSERT (comentarios, SET...) se
+    ignora. Las sentencias que fallan se guardan en ERROR_FILE_PATH precedidas
+    de un comentario con la línea donde empiezan y el error, así el archivo se
+    puede volver a cargar tal cual.
     """
-    print("Iniciando el script optimizado...")
+    print(f"Iniciando el script optimizado (modo {modo})...")
 
     if not os.path.exists(SQL_FILE_PATH):
         print(f"❌ Error: No se encontró el archivo en la ruta: {SQL_FILE_PATH}")
         return
     
-    # --- NUEVO: Contamos el total de líneas para la barra de progreso ---
-    try:
-        print("Calculando el tamaño del archivo...")
-        with open(SQL_FILE_PATH, 'r', encoding='utf-8') as f:
-            total_lines = sum(1 for line in f)
-        print(f"Archivo '{os.path.basename(SQL_FILE_PATH)}' tiene {total_lines} líneas.")
-    except Exception as e:
-        print(f"❌ Error al leer el archivo para contar líneas: {e}")
-        return
-
-    successful_lines = 0
-    failed_lines = 0
-    lines_since_commit = 0
-    
-    with open(ERROR_FILE_PATH, 'w', encoding='utf-8') as f_error:
-        f_error.write("-- Comandos SQL que fallaron durante la carga --\n\n")
+    # El progreso se mide en bytes, así no hace falta leer el archivo dos veces
+    total_bytes = os.path.getsize(SQL_FILE_PATH)
+    print(f"Archivo '{os.path.basename(SQL_FILE_PATH)}' pesa {total_bytes / 1024 / 1024:.1f} MB.")
 
     conn = None
+    ejecutor = None
     try:
         print("Conectando a la base de datos...")
-        conn = psycopg2.connect(
-            dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT
-        )
+        conn = psycopg2.connect(**parametros_db())
         print("✅ Conexión exitosa.")
 
-        with open(SQL_FILE_PATH, 'r', encoding='utf-8') as f_sql:
-            # --- NUEVO: Envolvemos el bucle con tqdm para la barra de progreso ---
-            progress_bar = tqdm(f_sql, total=total_lines, unit=" líneas", desc="Cargando SQL")
-            
-            for line in progress_bar:
-                if not line.strip() or line.strip().startswith('--'):
-                    continue
-                
-                try:
-                    with conn.cursor() as cur:
-                        cur.execute(line)
-                    successful_lines += 1
-                    lines_since_commit += 1
-
-                    # --- NUEVO: Lógica de carga por lotes (batch) ---
-                    # Si alcanzamos el tamaño del lote, hacemos commit.
-                    if lines_since_commit >= BATCH_SIZE:
-                        conn.commit()
-                        lines_since_commit = 0 # Reiniciamos el contador del lote
-
-                except psycopg2.Error as e:
-                    conn.rollback()
-                    failed_lines += 1
-                    with open(ERROR_FILE_PATH, 'a', encoding='utf-8') as f_error:
-                        f_error.write(line)
-
-            # --- NUEVO: Commit final para el último lote ---
-            # Asegurarse de que las últimas líneas que no completaron un lote se guarden.
-            if lines_since_commit > 0:
-                conn.commit()
-                print("\n✅ Confirmando lote final de inserciones.")
+        with open(SQL_FILE_PATH, 'rb') as f_sql, \
+             open(ERROR_FILE_PATH, 'w', encoding='utf-8') as f_error:
+            f_error.write("-- Comandos SQL que fallaron durante la carga --\n\n")
+
+            def registrar_error(num_linea, sentencia, mensaje):
+                escribir_error(f_error, num_linea, sentencia, mensaje)
+
+            ejecutor = EjecutorLotes(conn, modo, registrar_error)
+            progress_bar = tqdm(total=total_bytes, unit="B", unit_scale=True, desc="Cargando SQL")
+
+            for num_sentencia, elemento in enumerate(sentencias_por_linea(f_sql), 1):
+                ejecutor.agregar(elemento)
+                if num_sentencia % BATCH_SIZE == 0:
+                    # El tokenizador lee por bloques: tell() es lo leído hasta ahora
+                    progress_bar.update(f_sql.tell() - progress_bar.n)
+                    progress_bar.set_postfix(exitosas=ejecutor.exitosas, fallidas=ejecutor.fallidas)
+
+            # Asegurarse de que las últimas sentencias que no completaron un lote se guarden.
+            ejecutor.vaciar()
+            progress_bar.update(total_bytes - progress_bar.n)
+            progress_bar.close()
 
         print("\n" + "="*50)
         print("🎉 ¡Proceso completado!")
-        print(f"  -> Líneas exitosas: {successful_lines}")
-        print(f"  -> Líneas fallidas: {failed_lines}")
-        if failed_lines > 0:
-            print(f"  -> Las líneas con errores se guardaron en: {ERROR_FILE_PATH}")
+        print(f"  -> Sentencias exitosas: {ejecutor.exitosas}")
+        print(f"  -> Sentencias fallidas: {ejecutor.fallidas}")
+        if ejecutor.fallidas > 0:
+            print(f"  -> Las sentencias con errores se guardaron en: {ERROR_FILE_PATH}")
         print("="*50)
 
     except Exception as e:
@@ -112,5 +244,157 @@ def execute_sql_optimizado():
             conn.close()
             print("Conexión cerrada.")
 
+# ==============================================================================
+# --- CARGA PARALELA POR RANGOS DE BYTES ---
+# ==============================================================================
+
+# Conexión propia de cada proceso trabajador (se abre en el inicializador del pool)
+_conn_worker = None
+_db_params_worker = None
+_modo_worker = None
+
+
+def _iniciar_worker(db_params, modo):
+    global _conn_worker, _db_params_worker, _modo_worker
+    _db_params_worker = db_params
+    _modo_worker = modo
+    _conn_worker = psycopg2.connect(**db_params)
+
+
+def procesar_rango(ruta, inicio, fin):
+    """
+    Carga las sentencias del rango [inicio, fin) con la conexión del proceso.
+    Devuelve las estadísticas del rango y sus errores con números de línea
+    locales (el proceso principal los convierte a números de línea del archivo).
+    """
+    global _conn_worker
+    if _conn_worker is None or _conn_worker.closed:
+        _conn_worker = psycopg2.connect(**_db_params_worker)
+
+    errores = []
+    ejecutor = EjecutorLotes(
+        _conn_worker, _modo_worker,
+        lambda num_linea, sentencia, mensaje: errores.append((num_linea, sentencia, mensaje))
+    )
+    with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        datos = mm[inicio:fin]
+    for elemento in sentencias_por_linea(io.BytesIO(datos)):
+        ejecutor.agregar(elemento)
+    ejecutor.vaciar()
+    return {
+        'lineas': datos.count(b'\n'),
+        'bytes': fin - inicio,
+        'exitosas': ejecutor.exitosas,
+        'fallidas': ejecutor.fallidas,
+        'errores': errores,
+    }
+
+
+def execute_sql_paralelo(modo=MODO_CARGA, num_workers=NUM_WORKERS):
+    """
+    Carga el archivo .sql con varios procesos, cada uno con su conexión y su
+    EjecutorLotes, repartiendo rangos de bytes del archivo. Con num_workers="auto"
+    la cantidad de rangos en curso se ajusta subiendo o bajando de a un proceso
+    mientras el rendimiento (bytes/s) mejore. Al final escribe un único reporte
+    de errores ordenado por número de línea del archivo original.
+    """
+    print(f"Iniciando la carga paralela (modo {modo})...")
+
+    if not os.path.exists(SQL_FILE_PATH):
+        print(f"❌ Error: No se encontró el archivo en la ruta: {SQL_FILE_PATH}")
+        return
+
+    total_bytes = os.path.getsize(SQL_FILE_PATH)
+    # Solo se corta antes de una línea que empieza un INSERT: cada sentencia queda
+    # entera en un rango y sus errores (también los aislados por bisección en
+    # COPY) se informan con la línea del archivo donde empieza
+    rangos = partir_rangos(SQL_FILE_PATH, TAMANO_RANGO_MB * 1024 * 1024, es_inicio_de_fila=empieza_insert)
+    auto = num_workers == "auto"
+    max_workers = MAX_WORKERS if auto else int(num_workers)
+    concurrencia = min(2, max_workers) if auto else max_workers
+    print(f"Archivo '{os.path.basename(SQL_FILE_PATH)}' pesa {total_bytes / 1024 / 1024:.1f} MB "
+          f"→ {len(rangos)} rangos, hasta {max_workers} procesos.")
+
+    resultados = {}
+    rangos_fallidos = []
+    pendientes = deque(enumerate(rangos))
+    en_curso = {}
+
+    # Estado del ajuste automático (hill climbing sobre el número de procesos activos)
+    direccion = 1
+    rendimiento_anterior = None
+    ventana_inicio = time.monotonic()
+    ventana_bytes = 0
+
+    progress_bar = tqdm(total=total_bytes, unit="B", unit_scale=True, desc="Cargando SQL (paralelo)")
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_iniciar_worker,
+                             initargs=(parametros_db(), modo)) as executor:
+        while pendientes or en_curso:
+            while pendientes and len(en_curso) < concurrencia:
+                indice, (inicio, fin) = pendientes.popleft()
+                futuro = executor.submit(procesar_rango, SQL_FILE_PATH, inicio, fin)
+                en_curso[futuro] = (indice, inicio, fin)
+
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                indice, inicio, fin = en_curso.pop(futuro)
+                try:
+                    resultados[indice] = futuro.result()
+                except Exception as e:
+                    rangos_fallidos.append((indice, inicio, fin, str(e)))
+                progress_bar.update(fin - inicio)
+                ventana_bytes += fin - inicio
+
+            if auto and time.monotonic() - ventana_inicio >= VENTANA_AJUSTE_SEGUNDOS:
+                rendimiento = ventana_bytes / (time.monotonic() - ventana_inicio)
+                if rendimiento_anterior is not None and rendimiento < rendimiento_anterior * 0.95:
+                    direccion = -direccion
+                concurrencia = max(1, min(max_workers, concurrencia + direccion))
+                rendimiento_anterior = rendimiento
+                ventana_inicio = time.monotonic()
+                ventana_bytes = 0
+                progress_bar.set_postfix(procesos=concurrencia, mb_s=f"{rendimiento / 1024 / 1024:.1f}")
+    progress_bar.close()
+
+    # Reporte de errores unificado, con números de línea del archivo original
+    exitosas = fallidas = 0
+    linea_base = 0
+    with open(ERROR_FILE_PATH, 'w', encoding='utf-8') as f_error:
+        f_error.write("-- Comandos SQL que fallaron durante la carga --\n\n")
+        for indice, (inicio, fin) in enumerate(rangos):
+            resultado = resultados.get(indice)
+            if resultado is None:
+                # Sin el conteo del rango no se conoce su desplazamiento en líneas
+                with open(SQL_FILE_PATH, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    linea_base += sum(1 for _ in io.BytesIO(mm[inicio:fin]))
+                continue
+            exitosas += resultado['exitosas']
+            fallidas += resultado['fallidas']
+            for num_linea, sentencia, mensaje in resultado['errores']:
+                escribir_error(f_error, linea_base + num_linea, sentencia, mensaje)
+            linea_base += resultado['lineas']
+        for indice, inicio, fin, mensaje in rangos_fallidos:
+            f_error.write(f"-- rango {indice} (bytes {inicio}-{fin}) no se pudo procesar: {mensaje}\n")
+
+    print("\n" + "="*50)
+    print("🎉 ¡Proceso completado!")
+    print(f"  -> Sentencias exitosas: {exitosas}")
+    print(f"  -> Sentencias fallidas: {fallidas}")
+    if rangos_fallidos:
+        print(f"  -> Rangos que no se pudieron procesar: {len(rangos_fallidos)}")
+    if fallidas > 0 or rangos_fallidos:
+        print(f"  -> Las sentencias con errores se guardaron en: {ERROR_FILE_PATH}")
+    print("="*50)
+
+
 if __name__ == "__main__":
-    execute_sql_optimizado()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Carga un archivo .sql de INSERT en la base de datos.")
+    parser.add_argument("--modo", choices=["copy", "insert"], default=MODO_CARGA)
+    parser.add_argument("--paralelo", action="store_true", help="Usa varios procesos sobre rangos del archivo.")
+    parser.add_argument("--workers", default=str(NUM_WORKERS),
+                        help='Número de procesos para --paralelo, o "auto" para ajustarlo solo.')
+    args = parser.parse_args()
+    if args.paralelo:
+        execute_sql_paralelo(args.modo, args.workers)
+    else:
+        execute_sql_optimizado(args.modo)
@@ -0,0 +1,314 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from claves import normalizar_matricula, separar_matriculas
+from config_db import credenciales_db, identificador_db
+from familias import actualizar_familias, recalcular_familias
+
+# --- CONFIGURACIÓN ---
+NOMBRE_ARCHIVO_ORIGINAL = 'Libro4.csv'
+# Tamaño promedio de los chunks. Los cortes dependen del contenido de las filas
+# (no de su posición), así que insertar o borrar filas solo cambia sus chunks.
+FILAS_POR_CHUNK_PROMEDIO = 1000
+ESTADO_POR_DEFECTO = "No especificado"
+VERSION_MANIFIESTO = 2
+
+# ==============================================================================
+# Carga incremental (delta) de Libro4.csv.
+#
+# Cada fila del CSV tiene un hash de contenido y las filas se agrupan en chunks
+# cuyos límites salen de esos hashes. El manifiesto guarda, por hash de chunk,
+# las matrículas (con su estado) y las relaciones que produjo. En la siguiente
+# corrida solo se interpretan los chunks nuevos o modificados; el resto se toma
+# del manifiesto. Comparando el resultado con el de la carga anterior se
+# obtienen las matrículas nuevas, las que cambiaron de estado, las retiradas y
+# las relaciones nuevas y retiradas, y solo eso se escribe en la base de datos.
+#
+# El manifiesto se guarda junto al CSV, uno por base de datos de destino: cargar
+# el mismo archivo en otra base no reutiliza lo que se sabe de la primera.
+# ==============================================================================
+
+
+def ruta_manifiesto(nombre_archivo, credenciales):
+    """Manifiesto de la última carga exitosa de nombre_archivo en la base de credenciales."""
+    clave_db = hashlib.blake2b(identificador_db(credenciales).encode('utf-8'), digest_size=6).hexdigest()
+    return f"{os.path.abspath(nombre_archivo)}.manifiesto-{clave_db}.json"
+
+
+def _hash_fila(fila):
+    return hashlib.blake2b('\x1f'.join(fila).encode('utf-8'), digest_size=16).digest()
+
+
+def leer_chunks(nombre_archivo):
+    """
+    Lee el CSV y lo parte en chunks definidos por contenido: una fila cierra su
+    chunk cuando su hash es múltiplo de FILAS_POR_CHUNK_PROMEDIO. Devuelve una
+    lista de (hash_chunk, filas) en el orden del archivo.
+    """
+    chunks = []
+    filas = []
+    hash_chunk = hashlib.blake2b(digest_size=16)
+    # utf-8-sig descarta el BOM que deja Excel al inicio del archivo
+    with open(nombre_archivo, mode='r', encoding='utf-8-sig', newline='') as archivo_csv:
+        lector_csv = csv.reader(archivo_csv, delimiter=';')
+        next(lector_csv, None)  # Saltar encabezado
+        for fila in lector_csv:
+            if not fila:
+                continue
+            digest = _hash_fila(fila)
+            filas.append(fila)
+            hash_chunk.update(digest)
+            if int.from_bytes(digest[:4], 'big') % FILAS_POR_CHUNK_PROMEDIO == 0:
+                chunks.append((hash_chunk.hexdigest(), filas))
+                filas = []
+                hash_chunk = hashlib.blake2b(digest_size=16)
+    if filas:
+        chunks.append((hash_chunk.hexdigest(), filas))
+    return chunks
+
+
+def _fijar_estado(matriculas, matricula, estado):
+    # Mismo criterio que chunks.sincronizar_todas_las_matriculas: gana el primer
+    # estado conocido y "No especificado" solo se usa si no hay otro
+    if matricula not in matriculas or matriculas[matricula] == ESTADO_POR_DEFECTO:
+        matriculas[matricula] = estado
+
+
+def hechos_de_chunk(filas):
+    """Matrículas (matrícula -> estado) y relaciones [padre, hija] que aporta un chunk."""
+    matriculas = {}
+    relaciones = set()
+    for fila in filas:
+        fila = fila + [''] * (4 - len(fila))
+        no_matricula_actual = normalizar_matricula(fila[0])
+        if not no_matricula_actual:
+            continue
+        _fijar_estado(matriculas, no_matricula_actual, fila[1].strip() or ESTADO_POR_DEFECTO)
+        for padre in separar_matriculas(fila[2]):
+            _fijar_estado(matriculas, padre, ESTADO_POR_DEFECTO)
+            relaciones.add((padre, no_matricula_actual))
+        # Como en chunks.py y ETL.py, la columna de derivadas es una sola matrícula
+        hija = normalizar_matricula(fila[3])
+        if hija:
+            _fijar_estado(matriculas, hija, ESTADO_POR_DEFECTO)
+            relaciones.add((no_matricula_actual, hija))
+    return {"matriculas": matriculas, "relaciones": sorted(relaciones)}
+
+
+def combinar(hechos_en_orden):
+    """Une los hechos de los chunks en el orden del archivo: (matrícula -> estado, set de relaciones)."""
+    matriculas = {}
+    relaciones = set()
+    for hechos in hechos_en_orden:
+        for matricula, estado in hechos["matriculas"].items():
+            _fijar_estado(matriculas, matricula, estado)
+        relaciones.update(tuple(rel) for rel in hechos["relaciones"])
+    return matriculas, relaciones
+
+
+def cargar_manifiesto(ruta, base_datos):
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    if manifiesto.get("version") != VERSION_MANIFIESTO:
+        print("⚠️ El manifiesto es de otra versión; se hará una carga completa.")
+        return None
+    if manifiesto.get("base_datos") != base_datos:
+        print("⚠️ El manifiesto es de otra base de datos; se hará una carga completa.")
+        return None
+    return manifiesto
+
+
+def guardar_manifiesto(ruta, nombre_archivo, base_datos, orden, hechos_por_chunk):
+    """Escribe el manifiesto de forma atómica (archivo temporal + reemplazo)."""
+    manifiesto = {
+        "version": VERSION_MANIFIESTO,
+        "archivo": os.path.abspath(nombre_archivo),
+        "base_datos": base_datos,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "orden": orden,
+        "chunks": {hash_chunk: hechos_por_chunk[hash_chunk] for hash_chunk in set(orden)},
+    }
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def calcular_delta(anterior, actual):
+    """
+    Compara dos estados (matrícula -> estado, relaciones) y devuelve las
+    matrículas nuevas, las que cambiaron de estado, las retiradas y las
+    relaciones nuevas y retiradas.
+    """
+    mat_ant, rel_ant = anterior
+    mat_act, rel_act = actual
+    return {
+        "matriculas_nuevas": {m: e for m, e in mat_act.items() if m not in mat_ant},
+        "matriculas_cambiadas": {
+            m: e for m, e in mat_act.items()
+            if m in mat_ant and mat_ant[m] != e and e != ESTADO_POR_DEFECTO
+        },
+        "matriculas_retiradas": [m for m in mat_ant if m not in mat_act],
+        "relaciones_nuevas": rel_act - rel_ant,
+        "relaciones_retiradas": rel_ant - rel_act,
+    }
+
+
+def aplicar_delta(db_connection, delta, borrar_retiradas=False):
+    """
+    Escribe solo el delta en la base de datos, en una transacción. No hace
+    commit. Las matrículas retiradas del CSV solo se borran con borrar_retiradas.
+    """
+    cur = db_connection.cursor()
+
+    claves = (set(delta["matriculas_nuevas"]) | set(delta["matriculas_cambiadas"])
+              | set(delta["matriculas_retiradas"])
+              | {m for rel in delta["relaciones_nuevas"] | delta["relaciones_retiradas"] for m in rel})
+    cur.execute(
+        "SELECT matricula_norm, id, estado_folio FROM Matriculas WHERE matricula_norm = ANY(%s)",
+        (list(claves),)
+    )
+    en_db = {fila[0]: (fila[1], str(fila[2])) for fila in cur.fetchall()}
+
+    # 1. Matrículas nuevas y cambios de estado
+    a_insertar = [(m, e) for m, e in delta["matriculas_nuevas"].items() if m not in en_db]
+    a_actualizar = [
+        (e, en_db[m][0])
+        for m, e in list(delta["matriculas_nuevas"].items()) + list(delta["matriculas_cambiadas"].items())
+        if m in en_db and en_db[m][1] != e and e != ESTADO_POR_DEFECTO
+    ]
+    if a_actualizar:
+        psycopg2.extras.execute_batch(cur, "UPDATE Matriculas SET estado_folio = %s WHERE id = %s", a_actualizar)
+    if a_insertar:
+        insertadas = psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO Matriculas (no_matricula_inmobiliaria, estado_folio) VALUES %s RETURNING matricula_norm, id",
+            a_insertar, fetch=True
+        )
+        en_db.update((m, (id_matricula, None)) for m, id_matricula in insertadas)
+
+    def con_ids(relaciones):
+        return [
+            (en_db[padre][0], en_db[hija][0])
+            for padre, hija in relaciones
+            if padre in en_db and hija in en_db
+        ]
+
+    # 2. Relaciones retiradas (las familias que pierden aristas pueden partirse)
+    retiradas = con_ids(delta["relaciones_retiradas"])
+    if retiradas:
+        borradas = psycopg2.extras.execute_values(
+            cur,
+            "DELETE FROM RelacionesMatriculas AS r USING (VALUES %s) AS v(padre_id, hija_id) "
+            "WHERE r.matricula_padre_id = v.padre_id AND r.matricula_hija_id = v.hija_id "
+            "RETURNING r.matricula_padre_id",
+            retiradas, fetch=True
+        )
+        ids_tocados = list({m for rel in retiradas for m in rel})
+        cur.execute("SELECT DISTINCT familia_id FROM Matriculas WHERE id = ANY(%s)", (ids_tocados,))
+        recalcular_familias(cur, [fila[0] for fila in cur.fetchall()])
+        print(f"   - {len(borradas)} relaciones retiradas.")
+
+    # 3. Relaciones nuevas
+    nuevas = con_ids(delta["relaciones_nuevas"])
+    if nuevas:
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO RelacionesMatriculas (matricula_padre_id, matricula_hija_id) VALUES %s ON CONFLICT DO NOTHING",
+            nuevas
+        )
+        actualizar_familias(cur, nuevas)
+        print(f"   - {len(nuevas)} relaciones nuevas.")
+
+    # 4. Matrículas retiradas del CSV que ya no tienen relaciones
+    if delta["matriculas_retiradas"] and not borrar_retiradas:
+        print(f"   - {len(delta['matriculas_retiradas'])} matrículas retiradas del CSV se conservan "
+              f"(--borrar-retiradas para borrarlas).")
+    elif delta["matriculas_retiradas"]:
+        ids_retirados = [en_db[m][0] for m in delta["matriculas_retiradas"] if m in en_db]
+        cur.execute("""
+            DELETE FROM Matriculas m
+            WHERE m.id = ANY(%s)
+              AND NOT EXISTS (SELECT 1 FROM RelacionesMatriculas r
+                              WHERE r.matricula_padre_id = m.id OR r.matricula_hija_id = m.id)
+        """, (ids_retirados,))
+        print(f"   - {cur.rowcount} matrículas retiradas borradas.")
+
+    print(f"   - {len(a_insertar)} matrículas nuevas, {len(a_actualizar)} con estado actualizado.")
+    cur.close()
+
+
+def carga_incremental(nombre_archivo, db_connection, credenciales, completa=False, borrar_retiradas=False):
+    """
+    Aplica a la base de datos solo lo que cambió en el CSV desde la última
+    carga exitosa en esa base (ruta_manifiesto). Con completa=True (o sin
+    manifiesto) compara contra un estado vacío, es decir, sincroniza todo.
+    """
+    print(f"Iniciando carga incremental de '{nombre_archivo}'...")
+    start_time = time.time()
+
+    base_datos = identificador_db(credenciales)
+    ruta = ruta_manifiesto(nombre_archivo, credenciales)
+    manifiesto = None if completa else cargar_manifiesto(ruta, base_datos)
+    chunks_anteriores = manifiesto["chunks"] if manifiesto else {}
+
+    chunks = leer_chunks(nombre_archivo)
+    orden = [hash_chunk for hash_chunk, _ in chunks]
+    hechos_por_chunk = {}
+    interpretados = 0
+    for hash_chunk, filas in chunks:
+        if hash_chunk in chunks_anteriores:
+            hechos_por_chunk[hash_chunk] = chunks_anteriores[hash_chunk]
+        elif hash_chunk not in hechos_por_chunk:
+            hechos_por_chunk[hash_chunk] = hechos_de_chunk(filas)
+            interpretados += 1
+    print(f"   - {len(chunks)} chunks, {interpretados} nuevos o modificados.")
+
+    if manifiesto and interpretados == 0 and orden == manifiesto["orden"]:
+        print("✅ Sin cambios desde la última carga.")
+        return None
+
+    anterior = combinar(chunks_anteriores[h] for h in manifiesto["orden"]) if manifiesto else ({}, set())
+    actual = combinar(hechos_por_chunk[h] for h in orden)
+    delta = calcular_delta(anterior, actual)
+
+    try:
+        aplicar_delta(db_connection, delta, borrar_retiradas)
+        db_connection.commit()
+    except Exception:
+        db_connection.rollback()
+        raise
+    # El manifiesto solo avanza cuando la base de datos ya tiene el delta
+    guardar_manifiesto(ruta, nombre_archivo, base_datos, orden, hechos_por_chunk)
+    print(f"✅ Carga incremental completada en {time.time() - start_time:.2f} segundos.")
+    return delta
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Carga incremental de Libro4.csv usando un manifiesto de hashes.")
+    parser.add_argument("archivo", nargs="?", default=NOMBRE_ARCHIVO_ORIGINAL)
+    parser.add_argument("--completa", action="store_true", help="Ignora el manifiesto y sincroniza todo el archivo.")
+    parser.add_argument("--borrar-retiradas", action="store_true",
+                        help="Borra las matrículas que salieron del CSV y quedaron sin relaciones.")
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        credenciales = credenciales_db()
+        conn = psycopg2.connect(**credenciales)
+        carga_incremental(args.archivo, conn, credenciales,
+                          completa=args.completa, borrar_retiradas=args.borrar_retiradas)
+    except Exception as e:
+        print(f"❌ Ocurrió un error: {e}")
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,181 @@
+import argparse
+import time
+
+import psycopg2
+
+from config_db import credenciales_db
+from familias import actualizar_familias
+
+# --- CONFIGURACIÓN ---
+NOMBRE_ARCHIVO_ORIGINAL = 'Libro4.csv'
+ESTADO_POR_DEFECTO = "No especificado"
+
+# ==============================================================================
+# Carga de Libro4.csv resuelta dentro de la base de datos.
+#
+# En lugar de traer las matrículas existentes al cliente y resolver ids fila
+# por fila (chunks.py + ETL.py), el archivo se envía tal cual con COPY a una
+# tabla UNLOGGED de paso y el resto son sentencias INSERT ... SELECT ... JOIN:
+#
+#   1. COPY del CSV a staging_libro4 (linea conserva el orden del archivo).
+#   2. Pares (padre, hija) con claves normalizadas en staging_libro4_relaciones.
+#   3. Alta y actualización de matrículas en una sola sentencia, con el mismo
+#      criterio de estado_folio que chunks.sincronizar_todas_las_matriculas.
+#   4. Alta de relaciones con JOIN por matricula_norm; las insertadas vuelven
+#      con RETURNING para actualizar las familias.
+#
+# Todo corre en una transacción, así que la carga es todo o nada y funciona
+# igual a través del pooler de Supabase. Requiere normalizar_claves.sql y
+# familias.sql.
+# ==============================================================================
+
+SQL_PREPARAR = """
+CREATE UNLOGGED TABLE IF NOT EXISTS public.staging_libro4 (
+    linea BIGSERIAL,
+    no_matricula_inmobiliaria TEXT,
+    estado_folio TEXT,
+    matriculas_matriz TEXT,
+    matriculas_derivadas TEXT
+);
+CREATE UNLOGGED TABLE IF NOT EXISTS public.staging_libro4_relaciones (
+    padre TEXT,
+    hija TEXT
+);
+TRUNCATE public.staging_libro4, public.staging_libro4_relaciones RESTART IDENTITY;
+"""
+
+# El encabezado (con el BOM de Excel incluido) se salta con HEADER
+SQL_COPY = """
+COPY public.staging_libro4 (no_matricula_inmobiliaria, estado_folio, matriculas_matriz, matriculas_derivadas)
+FROM STDIN WITH (FORMAT csv, DELIMITER ';', HEADER true, ENCODING 'UTF8')
+"""
+
+# Listas separadas por comas, como claves.separar_matriculas
+SQL_RELACIONES_STAGING = """
+INSERT INTO public.staging_libro4_relaciones (padre, hija)
+SELECT DISTINCT padre, hija FROM (
+    SELECT public.normalizar_matricula(p) AS padre, f.matricula AS hija
+    FROM (SELECT public.normalizar_matricula(no_matricula_inmobiliaria) AS matricula, matriculas_matriz
+          FROM public.staging_libro4) f,
+         unnest(string_to_array(f.matriculas_matriz, ',')) AS p
+    WHERE f.matricula IS NOT NULL
+    UNION ALL
+    SELECT f.matricula, public.normalizar_matricula(h)
+    FROM (SELECT public.normalizar_matricula(no_matricula_inmobiliaria) AS matricula, matriculas_derivadas
+          FROM public.staging_libro4) f,
+         unnest(string_to_array(f.matriculas_derivadas, ',')) AS h
+    WHERE f.matricula IS NOT NULL
+) pares
+WHERE padre IS NOT NULL AND hija IS NOT NULL;
+ANALYZE public.staging_libro4;
+ANALYZE public.staging_libro4_relaciones;
+"""
+
+# Gana el primer estado conocido en el orden del archivo; "No especificado"
+# solo queda si la matrícula nunca trae otro (incluidas las que solo aparecen
+# como padre o hija). Solo se actualiza la BD con estados distintos del por defecto.
+SQL_MATRICULAS = """
+WITH menciones AS (
+    SELECT public.normalizar_matricula(no_matricula_inmobiliaria) AS matricula,
+           COALESCE(NULLIF(regexp_replace(estado_folio, '^\\s+|\\s+$', '', 'g'), ''), %(defecto)s) AS estado,
+           linea
+    FROM public.staging_libro4
+    UNION ALL
+    SELECT padre, %(defecto)s, NULL FROM public.staging_libro4_relaciones
+    UNION ALL
+    SELECT hija, %(defecto)s, NULL FROM public.staging_libro4_relaciones
+),
+agregados AS (
+    SELECT matricula,
+           COALESCE((array_agg(estado ORDER BY linea) FILTER (WHERE estado <> %(defecto)s))[1], %(defecto)s) AS estado
+    FROM menciones
+    WHERE matricula IS NOT NULL
+    GROUP BY matricula
+),
+-- El cruce con las existentes se resuelve antes de insertar (un anti-join
+-- contra la tabla que se está llenando la recorrería una vez por fila)
+hechos AS (
+    SELECT a.matricula, a.estado, m.id, m.estado_folio AS estado_db
+    FROM agregados a
+    LEFT JOIN public.matriculas m ON m.matricula_norm = a.matricula
+),
+actualizadas AS (
+    UPDATE public.matriculas m
+    SET estado_folio = h.estado
+    FROM hechos h
+    WHERE m.id = h.id
+      AND h.estado <> %(defecto)s
+      AND h.estado_db IS DISTINCT FROM h.estado
+    RETURNING m.id
+),
+insertadas AS (
+    INSERT INTO public.matriculas (no_matricula_inmobiliaria, estado_folio)
+    SELECT h.matricula, h.estado
+    FROM hechos h
+    WHERE h.id IS NULL
+    RETURNING id
+)
+SELECT (SELECT count(*) FROM insertadas), (SELECT count(*) FROM actualizadas);
+"""
+
+SQL_RELACIONES = """
+INSERT INTO public.relacionesmatriculas (matricula_padre_id, matricula_hija_id)
+SELECT DISTINCT p.id, h.id
+FROM public.staging_libro4_relaciones r
+JOIN public.matriculas p ON p.matricula_norm = r.padre
+JOIN public.matriculas h ON h.matricula_norm = r.hija
+ON CONFLICT DO NOTHING
+RETURNING matricula_padre_id, matricula_hija_id;
+"""
+
+
+def cargar_con_staging(nombre_archivo, db_connection):
+    """
+    Sincroniza matrículas y relaciones de nombre_archivo con COPY + sentencias
+    set-based. Hace commit al final; ante cualquier error revierte todo.
+    """
+    print(f"Iniciando carga con tabla de paso de '{nombre_archivo}'...")
+    start_time = time.time()
+    cur = db_connection.cursor()
+    try:
+        cur.execute(SQL_PREPARAR)
+        with open(nombre_archivo, 'rb') as archivo_csv:
+            cur.copy_expert(SQL_COPY, archivo_csv)
+        print(f"   - {cur.rowcount} filas copiadas a staging_libro4.")
+
+        cur.execute(SQL_RELACIONES_STAGING)
+        cur.execute(SQL_MATRICULAS, {"defecto": ESTADO_POR_DEFECTO})
+        insertadas, actualizadas = cur.fetchone()
+        print(f"   - {insertadas} matrículas nuevas, {actualizadas} con estado actualizado.")
+
+        cur.execute(SQL_RELACIONES)
+        relaciones_nuevas = cur.fetchall()
+        actualizar_familias(cur, relaciones_nuevas)
+        print(f"   - {len(relaciones_nuevas)} relaciones nuevas.")
+
+        # Las tablas de paso quedan vacías; su contenido no sirve fuera de esta carga
+        cur.execute("TRUNCATE public.staging_libro4, public.staging_libro4_relaciones")
+        db_connection.commit()
+    except Exception:
+        db_connection.rollback()
+        raise
+    finally:
+        cur.close()
+    print(f"✅ Carga completada en {time.time() - start_time:.2f} segundos.")
+    return insertadas, actualizadas, len(relaciones_nuevas)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Carga Libro4.csv con COPY a una tabla de paso y sentencias set-based.")
+    parser.add_argument("archivo", nargs="?", default=NOMBRE_ARCHIVO_ORIGINAL)
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(**credenciales_db())
+        cargar_con_staging(args.archivo, conn)
+    except Exception as e:
+        print(f"❌ Ocurrió un error: {e}")
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,29 @@
+import re
+
+# Espacios de cualquier tipo, incluidos el espacio duro y el BOM que trae Excel
+_ESPACIOS = re.compile(r'[\s\u00a0\ufeff]+')
+
+
+def normalizar_matricula(valor):
+    """
+    Devuelve la clave canónica de una matrícula: sin espacios (ni al borde ni
+    internos) y en mayúsculas. Debe coincidir con la función SQL
+    public.normalizar_matricula definida en normalizar_claves.sql, así que
+    devuelve None (NULL en SQL) si el valor está vacío o solo tiene espacios.
+    """
+    if valor is None:
+        return None
+    return _ESPACIOS.sub('', str(valor)).upper() or None
+
+
+def separar_matriculas(texto):
+    """Separa una lista de matrículas por comas ('a, b,c') y devuelve sus claves canónicas no vacías."""
+    if not texto:
+        return []
+    claves = (normalizar_matricula(parte) for parte in str(texto).split(','))
+    return [clave for clave in claves if clave]
+
+
+def normalizar_serie(serie):
+    """Versión vectorizada de normalizar_matricula para una Serie de pandas (NaN queda como '')."""
+    return serie.fillna('').astype(str).str.replace(_ESPACIOS.pattern, '', regex=True).str.upper()
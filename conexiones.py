@@ -0,0 +1,107 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+from instrumentacion import registrar_espera_conexion
+
+# --- CONFIGURACIÓN DEL POOL ---
+POOL_MIN_CONEXIONES = 1
+POOL_MAX_CONEXIONES = 8
+# Tiempo máximo que una petición espera por una conexión libre antes de fallar
+POOL_TIMEOUT_SEGUNDOS = 30
+# Las conexiones que llevan más de este tiempo sin usarse se verifican con un SELECT 1
+POOL_SEGUNDOS_VERIFICACION = 30
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones PostgreSQL acotado y seguro entre hilos.
+
+    Streamlit atiende cada sesión en su propio hilo, así que el pool limita
+    el número de conexiones abiertas con un semáforo (las peticiones esperan
+    en lugar de fallar cuando está lleno), verifica las conexiones que han
+    estado inactivas antes de entregarlas y descarta las que se rompen para
+    reconectar de forma transparente.
+    """
+
+    def __init__(self, db_params, minconn=POOL_MIN_CONEXIONES, maxconn=POOL_MAX_CONEXIONES):
+        self._db_params = dict(db_params)
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **self._db_params)
+        self._cupos = threading.BoundedSemaphore(maxconn)
+        self._ultimo_uso = {}
+        self._lock = threading.Lock()
+
+    def _esta_sana(self, conn):
+        if conn.closed:
+            return False
+        with self._lock:
+            ultimo_uso = self._ultimo_uso.get(id(conn), 0)
+        if time.monotonic() - ultimo_uso < POOL_SEGUNDOS_VERIFICACION:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _descartar(self, conn):
+        with self._lock:
+            self._ultimo_uso.pop(id(conn), None)
+        try:
+            self._pool.putconn(conn, close=True)
+        except pg_pool.PoolError:
+            pass
+
+    def _obtener(self):
+        # Un intento extra por si la primera conexión del pool estaba muerta
+        for _ in range(2):
+            conn = self._pool.getconn()
+            if self._esta_sana(conn):
+                return conn
+            self._descartar(conn)
+        return self._pool.getconn()
+
+    @contextmanager
+    def conexion(self):
+        """
+        Entrega una conexión del pool y la devuelve al terminar. La transacción
+        se confirma si el bloque termina bien y se revierte si lanza una excepción.
+        """
+        inicio_espera = time.perf_counter()
+        if not self._cupos.acquire(timeout=POOL_TIMEOUT_SEGUNDOS):
+            raise pg_pool.PoolError("No hay conexiones libres en el pool.")
+        conn = None
+        try:
+            conn = self._obtener()
+            # Espera por un cupo más la verificación o reconexión, para el panel de depuración
+            registrar_espera_conexion(time.perf_counter() - inicio_espera)
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # La conexión quedó en mal estado: se cierra para que la próxima petición reconecte
+            if conn is not None:
+                self._descartar(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                if conn.closed:
+                    self._descartar(conn)
+                else:
+                    with self._lock:
+                        self._ultimo_uso[id(conn)] = time.monotonic()
+                    self._pool.putconn(conn)
+            self._cupos.release()
+
+    def cerrar(self):
+        self._pool.closeall()
@@ -0,0 +1,68 @@
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: solo variables de entorno
+    tomllib = None
+
+from psycopg2.extensions import parse_dsn
+
+# ==============================================================================
+# Credenciales de la base de datos para los scripts de línea de comandos.
+#
+# app.py las lee de st.secrets["db_credentials"]; los scripts usan el mismo
+# bloque de .streamlit/secrets.toml, de modo que la contraseña vive en un solo
+# archivo (fuera del repositorio) y no copiada en cada script. Las variables de
+# entorno tienen prioridad sobre el archivo:
+#
+#   DATABASE_URL                    DSN o URL completa; reemplaza todo lo demás
+#   PGHOST, PGPORT, PGDATABASE,     cada una reemplaza el valor del archivo
+#   PGUSER, PGPASSWORD
+#
+# Sin contraseña en ninguna de las dos fuentes, libpq la busca en ~/.pgpass.
+# ==============================================================================
+
+ARCHIVO_SECRETOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+CREDENCIALES_POR_DEFECTO = {
+    "host": "aws-0-sa-east-1.pooler.supabase.com",
+    "dbname": "postgres",
+    "user": "postgres.kbcwpzwhnlscogiglthk",
+    "port": "6543",
+}
+
+VARIABLES_ENTORNO = {
+    "host": "PGHOST",
+    "port": "PGPORT",
+    "dbname": "PGDATABASE",
+    "user": "PGUSER",
+    "password": "PGPASSWORD",
+}
+
+
+def _credenciales_secretos(ruta=ARCHIVO_SECRETOS):
+    """Bloque [db_credentials] de secrets.toml, o {} si no hay archivo."""
+    if tomllib is None or not os.path.exists(ruta):
+        return {}
+    with open(ruta, "rb") as f:
+        return {clave: str(valor) for clave, valor in tomllib.load(f).get("db_credentials", {}).items()}
+
+
+def credenciales_db():
+    """Parámetros para psycopg2.connect(**credenciales_db())."""
+    if os.environ.get("DATABASE_URL"):
+        return {"dsn": os.environ["DATABASE_URL"]}
+    credenciales = dict(CREDENCIALES_POR_DEFECTO)
+    credenciales.update(_credenciales_secretos())
+    for clave, variable in VARIABLES_ENTORNO.items():
+        if os.environ.get(variable):
+            credenciales[clave] = os.environ[variable]
+    return credenciales
+
+
+def identificador_db(credenciales):
+    """'usuario@host:puerto/base' de unas credenciales, sin la contraseña."""
+    if "dsn" in credenciales:
+        credenciales = parse_dsn(credenciales["dsn"])
+    return (f"{credenciales.get('user', '')}@{credenciales.get('host', '')}:"
+            f"{credenciales.get('port', '5432')}/{credenciales.get('dbname', '')}")
@@ -1,7 +1,9 @@
-import re
+import csv
 import os
 from tqdm import tqdm
 
+from tokenizador_sql import ErrorInsert, leer_inserts
+
 # ==============================================================================
 # --- CONFIGURACIÓN (MODIFICA ESTAS VARIABLES) ---
 # ==============================================================================
@@ -16,23 +18,17 @@ CSV_OUTPUT_PATH = "/Users/pixel/Documents/PERSONAL/ANALISTA/terrenos/carga_conve
 # --- SCRIPT DE CONVERSIÓN (NO NECESITAS MODIFICAR DE AQUÍ EN ADELANTE) ---
 # ==============================================================================
 
-def clean_value(value):
-    """Limpia un valor individual, quitando espacios y comillas/apóstrofes."""
-    value = value.strip()
-    # Quita apóstrofes al inicio/final: 'texto' -> texto
-    if value.startswith("'") and value.endswith("'"):
-        return value[1:-1]
-    # Quita comillas al inicio/final: "texto" -> texto
-    if value.startswith('"') and value.endswith('"'):
-        return value[1:-1]
-    # Maneja el valor NULL de SQL
-    if value.upper() == 'NULL':
-        return '' # CSV lo interpreta como nulo si el campo está vacío
-    return value
+def valor_csv(valor):
+    """Convierte un valor tipado del tokenizador a texto CSV (NULL queda como campo vacío)."""
+    if valor is None:
+        return ''
+    return str(valor)
 
 def convert_sql_to_csv():
     """
     Lee un archivo .sql con sentencias INSERT y lo convierte a un archivo .csv.
+    Los valores con comas, comillas o saltos de línea quedan entre comillas
+    según las reglas de CSV, así que la cantidad de columnas se conserva.
     """
     print("Iniciando la conversión de .sql a .csv...")
 
@@ -40,54 +36,35 @@ def convert_sql_to_csv():
         print(f"❌ Error: No se encontró el archivo de entrada: {SQL_INPUT_PATH}")
         return
 
-    try:
-        # Contamos las líneas para la barra de progreso
-        with open(SQL_INPUT_PATH, 'r', encoding='utf-8') as f:
-            total_lines = sum(1 for line in f)
-    except Exception as e:
-        print(f"❌ Error al leer el archivo de entrada: {e}")
-        return
-
-    header_written = False
-    lines_converted = 0
-
-    # Abrimos el archivo de entrada para leer y el de salida para escribir
-    with open(SQL_INPUT_PATH, 'r', encoding='utf-8') as f_sql, \
-         open(CSV_OUTPUT_PATH, 'w', encoding='utf-8') as f_csv:
-        
-        progress_bar = tqdm(f_sql, total=total_lines, unit=" líneas", desc="Convirtiendo")
+    header = None
+    rows_converted = 0
+    statements_skipped = 0
 
-        for line in progress_bar:
-            if not line.strip().upper().startswith('INSERT INTO'):
-                continue
-            
-            # Extraemos las columnas y los valores con expresiones regulares
-            match_cols = re.search(r'\((.*?)\)', line)
-            match_vals = re.search(r'VALUES[ ]*\((.*)\);', line, re.IGNORECASE)
+    # La barra avanza por bytes leídos; el tokenizador lee el archivo por bloques
+    with open(SQL_INPUT_PATH, 'rb') as f_bin, \
+         open(CSV_OUTPUT_PATH, 'w', encoding='utf-8', newline='') as f_csv:
 
-            if not match_cols or not match_vals:
-                continue
+        writer = csv.writer(f_csv)
+        with tqdm.wrapattr(f_bin, "read", total=os.path.getsize(SQL_INPUT_PATH), desc="Convirtiendo") as f_sql:
+            for elemento in leer_inserts(f_sql):
+                if isinstance(elemento, ErrorInsert):
+                    statements_skipped += 1
+                    continue
 
-            # --- Procesar el encabezado (solo una vez) ---
-            if not header_written:
-                column_str = match_cols.group(1)
-                # Limpiamos y dividimos los nombres de las columnas
-                columns = [clean_value(col) for col in column_str.split(',')]
-                # Escribimos el encabezado en el archivo CSV
-                f_csv.write(','.join(columns) + '\n')
-                header_written = True
+                # --- Procesar el encabezado (solo una vez) ---
+                if header is None:
+                    header = [col.strip('"') for col in elemento.columnas]
+                    writer.writerow(header)
 
-            # --- Procesar los valores de la fila ---
-            values_str = match_vals.group(1)
-            # Limpiamos y dividimos los valores
-            values = [clean_value(val) for val in values_str.split(',')]
-            # Escribimos la fila de datos en el archivo CSV
-            f_csv.write(','.join(values) + '\n')
-            lines_converted += 1
+                # --- Procesar los valores de la fila ---
+                writer.writerow([valor_csv(valor) for valor in elemento.valores])
+                rows_converted += 1
 
     print("\n" + "="*50)
     print("🎉 ¡Conversión completada!")
-    print(f"  -> Se convirtieron {lines_converted} sentencias INSERT.")
+    print(f"  -> Se convirtieron {rows_converted} filas de sentencias INSERT.")
+    if statements_skipped:
+        print(f"  -> ⚠️ Se omitieron {statements_skipped} sentencias que no se pudieron interpretar (revisa con depurador.py).")
     print(f"  -> Archivo de salida guardado en: {CSV_OUTPUT_PATH}")
     print("="*50)
 
@@ -1,66 +1,318 @@
-import re
+import argparse
+import csv
+import io
+import json
+import mmap
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from rangos_csv import partir_rangos
+from tokenizador_sql import ErrorInsert, empieza_insert, leer_inserts
+
+# ==============================================================================
+# --- CONFIGURACIÓN ---
+# ==============================================================================
+
+# Procesos que validan rangos del archivo en paralelo (None = todos los núcleos)
+NUM_WORKERS = None
+TAMANO_RANGO_MB = 16
+
+# Columna de clave primaria cuyos duplicados se reportan (None para no revisar)
+COLUMNA_PK = "id"
+
+# Tipo esperado de cada columna: "entero", "numerico", "fecha" o "geometria".
+# Las columnas que no aparecen aquí no se revisan. Los valores vienen como
+# texto en el .sql, así que se revisa que el texto se pueda convertir.
+TIPOS_COLUMNAS = {
+    "id": "entero",
+    "objectid": "entero",
+    "numero_sub": "numerico",
+    "area_terre": "numerico",
+    "shape_leng": "numerico",
+    "shape_area": "numerico",
+    "terrarfi": "numerico",
+    "terrarju": "numerico",
+    "poly_area": "numerico",
+    "perimeter": "numerico",
+    "comienzo_v": "fecha",
+    "fecha_log": "fecha",
+    "area_ter_1": "numerico",
+    "area_const": "numerico",
+    "avaluo": "numerico",
+    "objectid_1": "entero",
+    "geom": "geometria",
+}
+
+# Cuántos errores se muestran en pantalla (el reporte los tiene todos)
+ERRORES_EN_PANTALLA = 20
+
+# ==============================================================================
+# --- VALIDACIONES ---
+# ==============================================================================
+
+_RE_ENTERO = re.compile(r'\s*[-+]?\d+\s*')
+_RE_NUMERICO = re.compile(r'\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*')
+_RE_FECHA = re.compile(r'\s*\d{4}[-/]\d{1,2}[-/]\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?\s*')
 
-def depurar_sql(ruta_archivo):
+_RE_GEOMETRIA = re.compile(
+    r'(?:SRID=\d+;)?\s*'
+    r'(POINT|LINESTRING|POLYGON|MULTIPOINT|MULTILINESTRING|MULTIPOLYGON|GEOMETRYCOLLECTION)'
+    r'\s*(?:ZM|Z|M)?\s*(.*)',
+    re.IGNORECASE | re.DOTALL
+)
+_RE_GRUPO_INTERNO = re.compile(r'\(([^()]*)\)')
+_RE_WKB_HEX = re.compile(r'(?:[0-9A-Fa-f]{2})+')
+_NUMERO = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_re_listas_puntos = {}
+
+
+def _re_lista_puntos(dimension):
+    """Expresión para una lista de puntos separados por comas, todos con 'dimension' coordenadas."""
+    patron = _re_listas_puntos.get(dimension)
+    if patron is None:
+        punto = r'\s*' + r'\s+'.join([_NUMERO] * dimension) + r'\s*'
+        patron = _re_listas_puntos[dimension] = re.compile(punto + '(?:,' + punto + ')*')
+    return patron
+
+
+def validar_geometria(texto):
     """
-    Analiza un archivo .sql para encontrar errores de conteo en las
-    instrucciones INSERT.
+    Revisa que el texto sea WKT/EWKT bien formado (o WKB en hexadecimal) y
+    devuelve None si está bien o un mensaje con el problema. Comprueba tipo,
+    paréntesis, coordenadas numéricas de la misma dimensión y, en polígonos,
+    que cada anillo tenga al menos 4 puntos y esté cerrado.
+    """
+    texto = texto.strip()
+    if _RE_WKB_HEX.fullmatch(texto):
+        return None
+    match = _RE_GEOMETRIA.fullmatch(texto)
+    if not match:
+        return "no es WKT/EWKT reconocible"
+    tipo, cuerpo = match.group(1).upper(), match.group(2)
+    if cuerpo.upper() == 'EMPTY':
+        return None
+    if not (cuerpo.startswith('(') and cuerpo.endswith(')')):
+        return f"{tipo} sin lista de coordenadas entre paréntesis"
+    if cuerpo.count('(') != cuerpo.count(')'):
+        return "paréntesis desbalanceados"
+    if tipo == 'GEOMETRYCOLLECTION':
+        return None
+
+    # Los grupos más internos son las listas de puntos (anillos en los polígonos)
+    listas = _RE_GRUPO_INTERNO.findall(cuerpo)
+    resto = _RE_GRUPO_INTERNO.sub('', cuerpo)
+    while '(' in resto:
+        sin_grupos = _RE_GRUPO_INTERNO.sub('', resto)
+        if sin_grupos == resto:
+            return "paréntesis desbalanceados"
+        resto = sin_grupos
+    if resto.strip(', \t\r\n'):
+        return f"texto fuera de las coordenadas: {resto.strip()[:40]!r}"
+
+    primer_punto = listas[0].split(',', 1)[0].split()
+    dimension = len(primer_punto)
+    if dimension < 2:
+        return f"{tipo} con un punto de {dimension} coordenadas"
+    patron = _re_lista_puntos(dimension)
+    for lista in listas:
+        if not patron.fullmatch(lista):
+            return "coordenadas no numéricas o con distinta dimensión"
+        if tipo.endswith('POLYGON'):
+            cantidad = lista.count(',') + 1
+            if cantidad < 4:
+                return f"anillo con {cantidad} puntos (mínimo 4)"
+            primero = lista[:lista.index(',')].split()
+            ultimo = lista[lista.rindex(',') + 1:].split()
+            if [float(c) for c in primero] != [float(c) for c in ultimo]:
+                return "anillo sin cerrar (el primer y el último punto difieren)"
+    return None
+
+
+def validar_valor(tipo, valor):
+    """Devuelve None si el valor sirve para el tipo esperado o un mensaje con el problema."""
+    if valor is None or isinstance(valor, bool):
+        return None
+    if not isinstance(valor, str):
+        # El tokenizador ya entregó un número sin comillas
+        if tipo == "entero" and not isinstance(valor, int) and valor != valor.to_integral_value():
+            return f"se esperaba un entero y llegó {valor}"
+        return None if tipo in ("entero", "numerico") else f"se esperaba {tipo} y llegó el número {valor}"
+    if tipo == "entero":
+        return None if _RE_ENTERO.fullmatch(valor) else f"no es un entero: {valor[:40]!r}"
+    if tipo == "numerico":
+        return None if _RE_NUMERICO.fullmatch(valor) else f"no es numérico: {valor[:40]!r}"
+    if tipo == "fecha":
+        return None if _RE_FECHA.fullmatch(valor) else f"no es una fecha: {valor[:40]!r}"
+    if tipo == "geometria":
+        return validar_geometria(valor)
+    return None
+
+
+_cache_esquemas = {}
+
+
+def _esquema(columnas):
+    """Para una lista de columnas del INSERT: (posición de la PK, [(posición, nombre, tipo)])."""
+    esquema = _cache_esquemas.get(columnas)
+    if esquema is None:
+        nombres = [col.strip('"') for col in columnas]
+        pos_pk = nombres.index(COLUMNA_PK) if COLUMNA_PK in nombres else None
+        revisar = [(i, nombre, TIPOS_COLUMNAS[nombre]) for i, nombre in enumerate(nombres) if nombre in TIPOS_COLUMNAS]
+        esquema = _cache_esquemas[columnas] = (pos_pk, revisar)
+    return esquema
+
+
+# ==============================================================================
+# --- RANGOS DEL ARCHIVO Y PROCESOS ---
+# ==============================================================================
+
+def validar_rango(ruta, inicio, fin):
+    """
+    Valida los INSERT del rango [inicio, fin) del archivo. Devuelve las líneas
+    del rango, los problemas con número de línea local, las claves primarias
+    vistas (clave -> primera línea local) para cruzarlas con los otros rangos
+    y las filas cuya clave ya estaba en el mismo rango.
+    """
+    with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        datos = mm[inicio:fin]
+    problemas = []
+    claves = {}
+    duplicadas = []
+    sentencias = filas = 0
+    ultima_sentencia = None
+    for elemento in leer_inserts(io.BytesIO(datos)):
+        if isinstance(elemento, ErrorInsert):
+            sentencias += 1
+            tipo = "conteo" if "columnas declaradas" in elemento.mensaje else "sintaxis"
+            problemas.append((elemento.num_linea, tipo, None, elemento.mensaje))
+            continue
+        filas += 1
+        if elemento.sentencia is not ultima_sentencia:
+            sentencias += 1
+            ultima_sentencia = elemento.sentencia
+        pos_pk, revisar = _esquema(elemento.columnas)
+        valores = elemento.valores
+        for i, nombre, tipo in revisar:
+            mensaje = validar_valor(tipo, valores[i])
+            if mensaje:
+                problemas.append((elemento.num_linea, "geometria" if tipo == "geometria" else "tipo", nombre, mensaje))
+        if pos_pk is not None:
+            clave = (elemento.tabla, str(valores[pos_pk]).strip())
+            if clave in claves:
+                duplicadas.append((elemento.num_linea, clave))
+            else:
+                claves[clave] = elemento.num_linea
+    return {
+        'lineas': datos.count(b'\n'),
+        'sentencias': sentencias,
+        'filas': filas,
+        'problemas': problemas,
+        'claves': claves,
+        'duplicadas': duplicadas,
+    }
+
+
+def escribir_reporte(ruta_reporte, ruta_archivo, resumen, problemas):
+    """Guarda el reporte en JSON o, si la ruta termina en .csv, en CSV (una fila por problema)."""
+    if ruta_reporte.lower().endswith('.csv'):
+        with open(ruta_reporte, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["linea", "tipo", "columna", "mensaje"])
+            writer.writerows(problemas)
+    else:
+        with open(ruta_reporte, 'w', encoding='utf-8') as f:
+            json.dump({
+                "archivo": ruta_archivo,
+                "resumen": resumen,
+                "problemas": [
+                    {"linea": linea, "tipo": tipo, "columna": columna, "mensaje": mensaje}
+                    for linea, tipo, columna, mensaje in problemas
+                ],
+            }, f, indent=2, ensure_ascii=False)
+
+
+def depurar_sql(ruta_archivo, ruta_reporte=None, num_workers=NUM_WORKERS):
+    """
+    Analiza un archivo .sql para encontrar errores en las instrucciones INSERT:
+    conteo de valores distinto al de columnas, sintaxis que no se puede
+    interpretar, valores que no encajan con TIPOS_COLUMNAS, claves primarias
+    repetidas y geometrías inválidas. Reparte el archivo en rangos entre
+    varios procesos y, si se indica ruta_reporte, guarda todos los problemas
+    con su número de línea en JSON o CSV.
     """
     # Verificamos si el archivo existe antes de continuar
     if not os.path.exists(ruta_archivo):
         print(f"❌ Error: El archivo '{ruta_archivo}' no fue encontrado.")
-        return
+        return None
 
     print(f"✅ Iniciando la revisión del archivo: {ruta_archivo}\n")
-    
-    errores_encontrados = 0
-    
-    # Abrimos y leemos el archivo línea por línea
-    with open(ruta_archivo, 'r', encoding='utf-8') as archivo:
-        # Usamos enumerate para tener el número de línea actual (empezando en 1)
-        for num_linea, linea in enumerate(archivo, 1):
-            
-            # Buscamos solo las líneas que contienen un INSERT INTO
-            # La 'i' en re.IGNORECASE hace que no distinga mayúsculas/minúsculas
-            if re.search(r'INSERT INTO', linea, re.IGNORECASE):
-                
-                # 1. Extraer las columnas
-                # Buscamos el texto entre el primer par de paréntesis (...)
-                match_columnas = re.search(r'\((.*?)\)', linea)
-                
-                # 2. Extraer los valores
-                # Buscamos el texto en el paréntesis que sigue a VALUES (...)
-                match_valores = re.search(r'VALUES[ ]*\((.*)\)', linea, re.IGNORECASE)
-
-                if match_columnas and match_valores:
-                    # Obtenemos el string dentro de los paréntesis
-                    columnas_str = match_columnas.group(1)
-                    valores_str = match_valores.group(1)
-
-                    # Contamos los elementos dividiendo por la coma
-                    # Esto asume que no hay comas dentro de los valores de texto
-                    lista_columnas = columnas_str.split(',')
-                    lista_valores = valores_str.split(',')
-
-                    num_columnas = len(lista_columnas)
-                    num_valores = len(lista_valores)
-
-                    # 3. Comparar y reportar si hay un error
-                    if num_columnas != num_valores:
-                        print(f"🚨 ¡Error encontrado en la línea {num_linea}!")
-                        print(f"   -> Columnas declaradas: {num_columnas}")
-                        print(f"   -> Valores proporcionados: {num_valores}")
-                        print("-" * 20)
-                        errores_encontrados += 1
-
-    if errores_encontrados == 0:
-        print("🎉 ¡Excelente! No se encontraron errores de conteo en las instrucciones INSERT.")
+
+    rangos = partir_rangos(ruta_archivo, TAMANO_RANGO_MB * 1024 * 1024, es_inicio_de_fila=empieza_insert)
+    resultados = {}
+    progress_bar = tqdm(total=os.path.getsize(ruta_archivo), unit="B", unit_scale=True, desc="Revisando")
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futuros = {
+            executor.submit(validar_rango, ruta_archivo, inicio, fin): (indice, inicio, fin)
+            for indice, (inicio, fin) in enumerate(rangos)
+        }
+        for futuro in as_completed(futuros):
+            indice, inicio, fin = futuros[futuro]
+            resultados[indice] = futuro.result()
+            progress_bar.update(fin - inicio)
+    progress_bar.close()
+
+    # Se unen los rangos en orden: líneas globales y claves primarias repetidas entre rangos
+    problemas = []
+    claves_vistas = {}
+    linea_base = 0
+    sentencias = filas = 0
+    for indice in range(len(rangos)):
+        resultado = resultados[indice]
+        sentencias += resultado['sentencias']
+        filas += resultado['filas']
+        for linea, tipo, columna, mensaje in resultado['problemas']:
+            problemas.append((linea_base + linea, tipo, columna, mensaje))
+        for clave, linea in resultado['claves'].items():
+            if clave in claves_vistas:
+                resultado['duplicadas'].append((linea, clave))
+            else:
+                claves_vistas[clave] = linea_base + linea
+        for linea, clave in resultado['duplicadas']:
+            problemas.append((linea_base + linea, "pk_duplicada", COLUMNA_PK,
+                              f"{COLUMNA_PK}={clave[1]} ya aparece en la línea {claves_vistas[clave]}"))
+        linea_base += resultado['lineas']
+    problemas.sort(key=lambda problema: problema[0])
+
+    por_tipo = {}
+    for _, tipo, _, _ in problemas:
+        por_tipo[tipo] = por_tipo.get(tipo, 0) + 1
+    resumen = {"sentencias": sentencias, "filas": filas, "problemas": len(problemas), "por_tipo": por_tipo}
+
+    for linea, tipo, columna, mensaje in problemas[:ERRORES_EN_PANTALLA]:
+        print(f"🚨 ¡Error encontrado en la línea {linea}! ({tipo}{f', columna {columna}' if columna else ''})")
+        print(f"   -> {mensaje}")
+        print("-" * 20)
+    if len(problemas) > ERRORES_EN_PANTALLA:
+        print(f"... y {len(problemas) - ERRORES_EN_PANTALLA} más.")
+
+    if not problemas:
+        print(f"🎉 ¡Excelente! No se encontraron errores en {sentencias} instrucciones INSERT ({filas} filas).")
     else:
-        print(f"\nRevisión completada. Se encontraron un total de {errores_encontrados} errores.")
+        detalle = ", ".join(f"{tipo}: {cantidad}" for tipo, cantidad in sorted(por_tipo.items()))
+        print(f"\nRevisión completada. Se encontraron un total de {len(problemas)} errores ({detalle}).")
+    if ruta_reporte:
+        escribir_reporte(ruta_reporte, ruta_archivo, resumen, problemas)
+        print(f"📄 Reporte guardado en: {ruta_reporte}")
+    return resumen
 
 
 # --- Ejecución del script ---
 if __name__ == "__main__":
-    # Pedimos al usuario que ingrese la ruta del archivo a revisar
-    ruta_del_sql = input("Por favor, introduce la ruta completa de tu archivo .sql y presiona Enter: ")
-    depurar_sql(ruta_del_sql)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Valida en paralelo los INSERT de un archivo .sql.")
+    parser.add_argument("archivo", help="Ruta del archivo .sql a revisar.")
+    parser.add_argument("--reporte", help="Archivo de reporte (.json o .csv) con todos los problemas encontrados.")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="Número de procesos (por defecto, todos los núcleos).")
+    args = parser.parse_args()
+    depurar_sql(args.archivo, args.reporte, args.workers)
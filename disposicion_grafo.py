@@ -0,0 +1,192 @@
+from bisect import bisect_right
+
+# ==============================================================================
+# Disposición por capas (estilo Sugiyama) del grafo de linaje, calculada en
+# el servidor para que el navegador solo dibuje nodos en posiciones fijas.
+#
+#   1. Ciclos: se invierten las aristas de retroceso de un DFS en orden fijo.
+#   2. Capas: camino más largo desde las fuentes (como sortMethod "directed"
+#      de vis.js), así que cada hija queda debajo de todas sus matrices.
+#   3. Las aristas que saltan varias capas se parten con nodos ficticios.
+#   4. Cruces: barridos de baricentro hacia abajo y hacia arriba; se conserva
+#      el orden con menos cruces.
+#   5. Coordenadas x: cada nodo se acerca al promedio de sus vecinos sin
+#      romper el orden ni la separación mínima.
+#
+# Todo es determinista: los empates se resuelven por el orden de los nodos,
+# así que la misma familia produce siempre el mismo dibujo.
+# ==============================================================================
+
+SEPARACION_NIVELES = 150
+SEPARACION_NODOS = 200
+ITERACIONES_CRUCES = 8
+ITERACIONES_COORDENADAS = 4
+
+
+def _aristas_aciclicas(nodos, sucesores):
+    """Aristas del grafo con las de retroceso invertidas (y sin lazos)."""
+    estado = {}  # 1 = en la pila del DFS, 2 = terminado
+    aristas = []
+    for inicio in nodos:
+        if inicio in estado:
+            continue
+        estado[inicio] = 1
+        pila = [(inicio, iter(sucesores[inicio]))]
+        while pila:
+            nodo, pendientes = pila[-1]
+            siguiente = next(pendientes, None)
+            if siguiente is None:
+                estado[nodo] = 2
+                pila.pop()
+            elif siguiente == nodo:
+                continue
+            elif estado.get(siguiente) == 1:
+                aristas.append((siguiente, nodo))
+            else:
+                aristas.append((nodo, siguiente))
+                if siguiente not in estado:
+                    estado[siguiente] = 1
+                    pila.append((siguiente, iter(sucesores[siguiente])))
+    return list(dict.fromkeys(aristas))
+
+
+def _capas(nodos, aristas):
+    """Capa de cada nodo por camino más largo desde las fuentes (orden de Kahn estable)."""
+    entrantes = {n: 0 for n in nodos}
+    salientes = {n: [] for n in nodos}
+    for u, v in aristas:
+        entrantes[v] += 1
+        salientes[u].append(v)
+    capa = {n: 0 for n in nodos}
+    cola = [n for n in nodos if entrantes[n] == 0]
+    i = 0
+    while i < len(cola):
+        u = cola[i]
+        i += 1
+        for v in salientes[u]:
+            capa[v] = max(capa[v], capa[u] + 1)
+            entrantes[v] -= 1
+            if entrantes[v] == 0:
+                cola.append(v)
+    return capa
+
+
+def _cruces_entre(capa_superior, capa_inferior, abajo, posicion):
+    """Cruces entre dos capas contiguas: inversiones de las aristas ordenadas por su extremo superior."""
+    extremos = []
+    for u in capa_superior:
+        extremos.extend(sorted(posicion[v] for v in abajo[u]))
+    cruces = 0
+    vistos = []
+    for x in reversed(extremos):
+        # Aristas ya vistas (más a la derecha arriba) que terminan a la izquierda de esta
+        cruces += bisect_right(vistos, x - 1)
+        vistos.insert(bisect_right(vistos, x), x)
+    return cruces
+
+
+def _total_cruces(capas, abajo, posicion):
+    return sum(_cruces_entre(capas[i], capas[i + 1], abajo, posicion) for i in range(len(capas) - 1))
+
+
+def _barrido(capas, vecinos, indices, posicion):
+    for i in indices:
+        def baricentro(nodo):
+            cercanos = vecinos[nodo]
+            if not cercanos:
+                return posicion[nodo]
+            return sum(posicion[v] for v in cercanos) / len(cercanos)
+        capas[i].sort(key=lambda nodo: (baricentro(nodo), posicion[nodo]))
+        for j, nodo in enumerate(capas[i]):
+            posicion[nodo] = j
+
+
+def _ajustar_x(capa, deseadas, separacion):
+    """Posiciones lo más cerca posible de las deseadas, en el mismo orden y con separación mínima."""
+    n = len(capa)
+    izquierda = [0.0] * n
+    derecha = [0.0] * n
+    for i in range(n):
+        izquierda[i] = deseadas[i] if i == 0 else max(deseadas[i], izquierda[i - 1] + separacion)
+    for i in reversed(range(n)):
+        derecha[i] = deseadas[i] if i == n - 1 else min(deseadas[i], derecha[i + 1] - separacion)
+    return [(a + b) / 2 for a, b in zip(izquierda, derecha)]
+
+
+def disposicion_por_capas(g, separacion_niveles=SEPARACION_NIVELES, separacion_nodos=SEPARACION_NODOS):
+    """
+    Devuelve {nodo: (x, y)} para un networkx.DiGraph, con las matrices arriba
+    y las derivadas abajo. Los nodos se ordenan (o, si no son comparables,
+    por su texto) para que el resultado no dependa del orden de inserción.
+    """
+    try:
+        nodos = sorted(g.nodes())
+    except TypeError:
+        nodos = sorted(g.nodes(), key=lambda n: (str(n), repr(n)))
+    if not nodos:
+        return {}
+    orden_nodo = {n: i for i, n in enumerate(nodos)}
+    sucesores = {n: sorted(g.successors(n), key=orden_nodo.get) for n in nodos}
+    aristas = _aristas_aciclicas(nodos, sucesores)
+    capa = _capas(nodos, aristas)
+
+    # Grafo por capas con nodos ficticios en las aristas largas
+    num_capas = max(capa.values()) + 1
+    capas = [[] for _ in range(num_capas)]
+    arriba = {}
+    abajo = {}
+    capa_de = {}
+    for n in nodos:
+        capas[capa[n]].append(n)
+        arriba[n], abajo[n], capa_de[n] = [], [], capa[n]
+    for u, v in aristas:
+        anterior = u
+        for c in range(capa[u] + 1, capa[v]):
+            ficticio = ('__ficticio__', orden_nodo[u], orden_nodo[v], c)
+            capas[c].append(ficticio)
+            arriba[ficticio], abajo[ficticio], capa_de[ficticio] = [], [], c
+            abajo[anterior].append(ficticio)
+            arriba[ficticio].append(anterior)
+            anterior = ficticio
+        abajo[anterior].append(v)
+        arriba[v].append(anterior)
+
+    # Orden inicial: el de los nodos dentro de cada capa, luego barridos de baricentro
+    posicion = {}
+    for c in capas:
+        for j, nodo in enumerate(c):
+            posicion[nodo] = j
+    _barrido(capas, arriba, range(1, num_capas), posicion)
+    mejor = [list(c) for c in capas]
+    menos_cruces = _total_cruces(capas, abajo, posicion)
+    for _ in range(ITERACIONES_CRUCES):
+        if menos_cruces == 0:
+            break
+        _barrido(capas, abajo, range(num_capas - 2, -1, -1), posicion)
+        _barrido(capas, arriba, range(1, num_capas), posicion)
+        cruces = _total_cruces(capas, abajo, posicion)
+        if cruces >= menos_cruces:
+            break
+        menos_cruces = cruces
+        mejor = [list(c) for c in capas]
+    capas = mejor
+
+    # Coordenadas x: se parte del orden y se acerca cada nodo a sus vecinos
+    x = {}
+    for c in capas:
+        for j, nodo in enumerate(c):
+            x[nodo] = j * separacion_nodos
+    for iteracion in range(ITERACIONES_COORDENADAS):
+        hacia_abajo = iteracion % 2 == 0
+        indices = range(1, num_capas) if hacia_abajo else range(num_capas - 2, -1, -1)
+        vecinos = arriba if hacia_abajo else abajo
+        for i in indices:
+            deseadas = [
+                sum(x[v] for v in vecinos[nodo]) / len(vecinos[nodo]) if vecinos[nodo] else x[nodo]
+                for nodo in capas[i]
+            ]
+            for nodo, valor in zip(capas[i], _ajustar_x(capas[i], deseadas, separacion_nodos)):
+                x[nodo] = valor
+
+    minimo = min(x[n] for n in nodos)
+    return {n: (round(x[n] - minimo), capa_de[n] * separacion_niveles) for n in nodos}
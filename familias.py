@@ -0,0 +1,204 @@
+import psycopg2
+import psycopg2.extras
+import time
+
+from config_db import credenciales_db
+
+# Clave del advisory lock que serializa el mantenimiento de familias entre cargas concurrentes
+LOCK_FAMILIAS = 7310421
+
+# Relaciones de la familia de una matrícula leídas por familia_id. La usan
+# app.py (con esquema "public") y benchmark_linaje.py, que mide esta misma consulta.
+SQL_RELACIONES_FAMILIA = """
+    WITH familia AS (
+        SELECT id, matricula_norm, estado_folio
+        FROM {esquema}.matriculas
+        WHERE familia_id = (
+            SELECT familia_id FROM {esquema}.matriculas
+            WHERE matricula_norm = %(start_node)s
+            LIMIT 1
+        )
+    )
+    SELECT
+        padre.matricula_norm AS padre,
+        hija.matricula_norm AS hija,
+        padre.estado_folio AS padre_estado,
+        hija.estado_folio AS hija_estado
+    FROM familia padre
+    JOIN {esquema}.relacionesmatriculas rel ON rel.matricula_padre_id = padre.id
+    JOIN familia hija ON rel.matricula_hija_id = hija.id
+"""
+
+
+def _reservar_familias(cursor, cantidad):
+    """Pide cantidad ids nuevos a familias_seq en una sola consulta."""
+    if cantidad <= 0:
+        return []
+    cursor.execute("SELECT nextval('public.familias_seq') FROM generate_series(1, %s)", (cantidad,))
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+class UnionFind:
+    """Union-find con compresión de caminos y unión por tamaño sobre claves arbitrarias."""
+
+    def __init__(self):
+        self.padre = {}
+        self.tamano = {}
+
+    def encontrar(self, x):
+        if x not in self.padre:
+            self.padre[x] = x
+            self.tamano[x] = 1
+            return x
+        raiz = x
+        while self.padre[raiz] != raiz:
+            raiz = self.padre[raiz]
+        while self.padre[x] != raiz:
+            self.padre[x], x = raiz, self.padre[x]
+        return raiz
+
+    def unir(self, a, b):
+        ra, rb = self.encontrar(a), self.encontrar(b)
+        if ra == rb:
+            return ra
+        if self.tamano[ra] < self.tamano[rb]:
+            ra, rb = rb, ra
+        self.padre[rb] = ra
+        self.tamano[ra] += self.tamano[rb]
+        return ra
+
+    def componentes(self):
+        grupos = {}
+        for x in self.padre:
+            grupos.setdefault(self.encontrar(x), []).append(x)
+        return list(grupos.values())
+
+
+def actualizar_familias(cursor, relaciones_con_id):
+    """
+    Mantiene Matriculas.familia_id (componente débilmente conexa) a partir de un
+    lote de relaciones (padre_id, hija_id) recién insertadas.
+
+    Solo toca las familias involucradas en el lote: las matrículas nuevas se
+    suman a la familia existente de su componente, los componentes sin familia
+    reciben un id nuevo y, cuando el lote une dos o más familias, todas pasan
+    a un id nuevo. No hay recálculo global.
+    No hace commit; se ejecuta dentro de la transacción del proceso de carga.
+    """
+    relaciones_con_id = list(relaciones_con_id)
+    if not relaciones_con_id:
+        return 0
+
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_FAMILIAS,))
+
+    ids_lote = list({m for rel in relaciones_con_id for m in rel})
+    cursor.execute("SELECT id, familia_id FROM public.matriculas WHERE id = ANY(%s)", (ids_lote,))
+    familia_actual = dict(cursor.fetchall())
+
+    # Las familias existentes entran al union-find como un solo elemento ('F', id)
+    uf = UnionFind()
+    def elemento(id_matricula):
+        familia = familia_actual.get(id_matricula)
+        return ('F', familia) if familia is not None else ('M', id_matricula)
+
+    for padre_id, hija_id in relaciones_con_id:
+        uf.unir(elemento(padre_id), elemento(hija_id))
+
+    # Cada componente que no cae en exactamente una familia existente necesita un id nuevo
+    componentes = uf.componentes()
+    necesitan_id = sum(1 for c in componentes if sum(tipo == 'F' for tipo, _ in c) != 1)
+    ids_nuevos = iter(_reservar_familias(cursor, necesitan_id))
+
+    asignaciones = []   # (familia_id, id_matricula) para matrículas sin familia
+    fusiones = []       # (familia_nueva, [familias_viejas])
+    for componente in componentes:
+        familias = [valor for tipo, valor in componente if tipo == 'F']
+        sueltas = [valor for tipo, valor in componente if tipo == 'M']
+        if len(familias) == 1:
+            destino = familias[0]
+        else:
+            destino = next(ids_nuevos)
+            if familias:
+                fusiones.append((destino, familias))
+        asignaciones.extend((destino, id_matricula) for id_matricula in sueltas)
+
+    for destino, familias in fusiones:
+        cursor.execute(
+            "UPDATE public.matriculas SET familia_id = %s WHERE familia_id = ANY(%s)",
+            (destino, familias)
+        )
+    if asignaciones:
+        psycopg2.extras.execute_values(
+            cursor,
+            "UPDATE public.matriculas AS m SET familia_id = v.familia_id "
+            "FROM (VALUES %s) AS v(familia_id, id) WHERE m.id = v.id",
+            asignaciones, page_size=1000
+        )
+    return len(asignaciones) + len(fusiones)
+
+
+def recalcular_familias(cursor, familia_ids):
+    """
+    Recalcula las familias indicadas después de borrar relaciones: una familia
+    que quedó partida en varios componentes recibe un id nuevo por componente
+    y las matrículas que quedaron sin relaciones vuelven a familia_id NULL.
+    No hace commit; se ejecuta dentro de la transacción del proceso de carga.
+    """
+    familia_ids = [f for f in set(familia_ids) if f is not None]
+    if not familia_ids:
+        return 0
+
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_FAMILIAS,))
+    cursor.execute("SELECT id FROM public.matriculas WHERE familia_id = ANY(%s)", (familia_ids,))
+    ids_familias = [fila[0] for fila in cursor.fetchall()]
+    cursor.execute(
+        "SELECT matricula_padre_id, matricula_hija_id FROM public.relacionesmatriculas "
+        "WHERE matricula_padre_id = ANY(%s) OR matricula_hija_id = ANY(%s)",
+        (ids_familias, ids_familias)
+    )
+    relaciones = cursor.fetchall()
+
+    uf = UnionFind()
+    for padre_id, hija_id in relaciones:
+        uf.unir(padre_id, hija_id)
+
+    cursor.execute("UPDATE public.matriculas SET familia_id = NULL WHERE familia_id = ANY(%s)", (familia_ids,))
+    componentes = uf.componentes()
+    asignaciones = []
+    for destino, componente in zip(_reservar_familias(cursor, len(componentes)), componentes):
+        asignaciones.extend((destino, id_matricula) for id_matricula in componente)
+    if asignaciones:
+        psycopg2.extras.execute_values(
+            cursor,
+            "UPDATE public.matriculas AS m SET familia_id = v.familia_id "
+            "FROM (VALUES %s) AS v(familia_id, id) WHERE m.id = v.id",
+            asignaciones, page_size=1000
+        )
+    return len(componentes)
+
+
+def recalcular_todas_las_familias(db_connection):
+    """Asigna familia_id a todas las matrículas desde cero (carga inicial de la columna)."""
+    print("Recalculando todas las familias...")
+    start_time = time.time()
+    with db_connection.cursor() as cur:
+        cur.execute("UPDATE public.matriculas SET familia_id = NULL WHERE familia_id IS NOT NULL")
+        cur.execute("SELECT matricula_padre_id, matricula_hija_id FROM public.relacionesmatriculas")
+        relaciones = cur.fetchall()
+        actualizar_familias(cur, relaciones)
+        cur.execute("SELECT count(DISTINCT familia_id) FROM public.matriculas")
+        total_familias = cur.fetchone()[0]
+    db_connection.commit()
+    print(f"✅ {total_familias} familias asignadas en {time.time() - start_time:.2f} segundos.")
+
+
+if __name__ == '__main__':
+    conn = None
+    try:
+        conn = psycopg2.connect(**credenciales_db())
+        recalcular_todas_las_familias(conn)
+    except Exception as e:
+        print(f"❌ Ocurrió un error: {e}")
+    finally:
+        if conn:
+            conn.close()
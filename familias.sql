@@ -0,0 +1,8 @@
+-- Familia (componente débilmente conexa del grafo de linaje) de cada matrícula.
+-- La mantienen los procesos de carga con familias.actualizar_familias;
+-- para poblarla la primera vez ejecuta: python familias.py
+ALTER TABLE public.matriculas ADD COLUMN IF NOT EXISTS familia_id BIGINT;
+
+CREATE SEQUENCE IF NOT EXISTS public.familias_seq;
+
+CREATE INDEX IF NOT EXISTS idx_matriculas_familia_id ON public.matriculas (familia_id);
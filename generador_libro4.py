@@ -0,0 +1,119 @@
+import argparse
+import csv
+import random
+
+# ==============================================================================
+# Generador de datos sintéticos con la forma de Libro4.csv, para benchmarks.
+#
+# Con --escala 1 produce un archivo del tamaño de Libro4.csv (unas 27.000
+# filas y 21.000 matrículas principales) con las mismas proporciones:
+#   - una fila por matrícula derivada, así que una matrícula con varias
+#     derivadas se repite en varias filas con la misma lista de matrices;
+#   - listas de matrices casi siempre de una matrícula y a veces largas;
+#   - matrices con fan-out de cola larga (unas pocas tienen cientos de hijas)
+#     y derivadas compartidas por más de una principal (fan-in);
+#   - matrices que a su vez son principales (cadenas de varias generaciones);
+#   - algunas filas repetidas tal cual y un 3,5% de folios CERRADO.
+# La salida es determinista para una misma semilla.
+#
+# Uso: python generador_libro4.py --escala 4 --salida sintetico.csv
+# ==============================================================================
+
+FILAS_BASE = 20851           # matrículas principales distintas en Libro4.csv
+PROB_SIN_MATRIZ = 0.07
+PROB_CERRADO = 0.035
+PROB_CON_DERIVADAS = 0.21
+PROB_DERIVADA_COMPARTIDA = 0.015
+PROB_FILA_REPETIDA = 0.002
+# Fracción de matrices que también son principales del archivo
+PROB_MATRIZ_PRINCIPAL = 0.5
+# Matrices distintas por cada principal (3569 / 20851 en Libro4.csv)
+MATRICES_POR_PRINCIPAL = 0.17
+# Largo de la lista de matrices: (largo, peso) según Libro4.csv
+LARGOS_MATRIZ = [(1, 24991), (2, 1199), (3, 139), (4, 132), (5, 269), (8, 24), (10, 52), (13, 33), (21, 2), (45, 1)]
+# Cola larga de las derivadas por principal (veces que se repite la fila)
+MAX_DERIVADAS = 60
+
+ENCABEZADO = ['no_matricula_inmobiliaria', 'estado_folio', 'matriculas_matriz', 'matriculas_derivadas']
+
+
+def _pesos_cola_larga(n, rnd, alfa=1.2):
+    """Pesos de Pareto: unas pocas matrices concentran la mayoría de las hijas."""
+    return [rnd.paretovariate(alfa) for _ in range(n)]
+
+
+def generar_filas(escala=1.0, semilla=7):
+    """Devuelve la lista de filas [matrícula, estado, matrices, derivada] sin encabezado."""
+    rnd = random.Random(semilla)
+    num_principales = max(1, round(FILAS_BASE * escala))
+
+    principales = rnd.sample(range(1000000, 1000000 + num_principales * 20), num_principales)
+    principales.sort()
+    principales = [str(m) for m in principales]
+
+    # Matrices: la mitad son principales (más antiguas) y el resto solo aparece como matriz
+    num_matrices = max(1, round(num_principales * MATRICES_POR_PRINCIPAL))
+    matrices = []
+    for _ in range(num_matrices):
+        if rnd.random() < PROB_MATRIZ_PRINCIPAL:
+            matrices.append(rnd.choice(principales))
+        else:
+            matrices.append(str(rnd.randrange(1000, 999999)))
+    pesos_matrices = _pesos_cola_larga(len(matrices), rnd)
+    largos, pesos_largos = zip(*LARGOS_MATRIZ)
+
+    siguiente_derivada = 20000000
+    derivadas_emitidas = []
+    filas = []
+    for matricula in principales:
+        estado = 'CERRADO' if rnd.random() < PROB_CERRADO else 'ACTIVO'
+        if rnd.random() < PROB_SIN_MATRIZ:
+            lista_matrices = ''
+        else:
+            largo = rnd.choices(largos, weights=pesos_largos)[0]
+            elegidas = dict.fromkeys(rnd.choices(matrices, weights=pesos_matrices, k=largo))
+            elegidas.pop(matricula, None)
+            lista_matrices = ', '.join(elegidas)
+
+        num_derivadas = 0
+        if rnd.random() < PROB_CON_DERIVADAS:
+            num_derivadas = min(MAX_DERIVADAS, int(rnd.paretovariate(1.5)))
+        if num_derivadas == 0:
+            filas.append([matricula, estado, lista_matrices, ''])
+            continue
+        for _ in range(num_derivadas):
+            if derivadas_emitidas and rnd.random() < PROB_DERIVADA_COMPARTIDA:
+                derivada = rnd.choice(derivadas_emitidas)
+            else:
+                derivada = str(siguiente_derivada)
+                siguiente_derivada += rnd.randint(1, 3)
+                derivadas_emitidas.append(derivada)
+            filas.append([matricula, estado, lista_matrices, derivada])
+
+    # Filas duplicadas tal cual, junto a la original como en el archivo real
+    con_repetidas = []
+    for fila in filas:
+        con_repetidas.append(fila)
+        if rnd.random() < PROB_FILA_REPETIDA:
+            con_repetidas.append(list(fila))
+    return con_repetidas
+
+
+def escribir_csv(ruta, filas):
+    # utf-8-sig: el archivo real viene de Excel con BOM
+    with open(ruta, 'w', encoding='utf-8-sig', newline='') as f:
+        escritor = csv.writer(f, delimiter=';', lineterminator='\n')
+        escritor.writerow(ENCABEZADO)
+        escritor.writerows(filas)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos con la forma de Libro4.csv.")
+    parser.add_argument("--escala", type=float, default=1.0, help="1.0 = tamaño de Libro4.csv")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--salida", default="Libro4_sintetico.csv")
+    args = parser.parse_args()
+
+    filas = generar_filas(args.escala, args.semilla)
+    escribir_csv(args.salida, filas)
+    print(f"✅ {len(filas)} filas escritas en '{args.salida}'.")
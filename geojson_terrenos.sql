@@ -0,0 +1,11 @@
+-- GeoJSON en EPSG:4326 de cada terreno, calculado una sola vez al cargar.
+-- Las consultas de la app leen esta columna en lugar de repetir
+-- ST_Transform + ST_AsGeoJSON en cada tarjeta o mapa. Al ser una columna
+-- generada, PostgreSQL la recalcula sola en cada INSERT/COPY/UPDATE de geom,
+-- así que carga.py no necesita cambios. Las coordenadas se guardan con 7
+-- decimales (~1 cm), que además acorta el texto.
+-- Agregarla reescribe la tabla una vez; las versiones para invalidar la
+-- caché de la app salen de version_terrenos.sql.
+ALTER TABLE public.terrenos
+    ADD COLUMN IF NOT EXISTS geojson_wgs84 TEXT
+    GENERATED ALWAYS AS (ST_AsGeoJSON(ST_Transform(geom, 4326), 7)) STORED;
@@ -0,0 +1,297 @@
+import threading
+import time
+
+import numpy as np
+
+from claves import normalizar_matricula
+
+# Cuántas relaciones nuevas se acumulan fuera del CSR antes de reconstruirlo
+UMBRAL_COMPACTACION = 5000
+
+# Secuencias de version_grafo.sql; pg_sequences no falla si aún no se ejecutó
+SQL_VERSION_GRAFO = """
+    SELECT sequencename, COALESCE(last_value, 0)
+    FROM pg_sequences
+    WHERE schemaname = 'public' AND sequencename IN ('version_grafo_seq', 'version_grafo_cambios_seq')
+"""
+
+
+def leer_version_grafo(cur):
+    """
+    Devuelve (versión, cambios) de version_grafo.sql: la versión avanza con
+    cualquier escritura en matrículas o relaciones y cambios solo con UPDATE,
+    DELETE o TRUNCATE. None si las secuencias no existen.
+    """
+    cur.execute(SQL_VERSION_GRAFO)
+    valores = dict(cur.fetchall())
+    if len(valores) < 2:
+        return None
+    return valores['version_grafo_seq'], valores['version_grafo_cambios_seq']
+
+
+def _construir_csr(origenes, destinos, num_nodos):
+    """Construye los arreglos (indptr, indices) de un CSR a partir de una lista de aristas."""
+    orden = np.argsort(origenes, kind='stable')
+    indices = destinos[orden].astype(np.int32)
+    conteos = np.bincount(origenes, minlength=num_nodos)
+    indptr = np.zeros(num_nodos + 1, dtype=np.int64)
+    np.cumsum(conteos, out=indptr[1:])
+    return indptr, indices
+
+
+def _vecinos(indptr, indices, frontera):
+    """Devuelve, de forma vectorizada, todos los vecinos CSR de los nodos de la frontera."""
+    inicios = indptr[frontera]
+    longitudes = indptr[frontera + 1] - inicios
+    total = int(longitudes.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int32)
+    desplazamientos = np.repeat(inicios - np.cumsum(longitudes) + longitudes, longitudes)
+    return indices[desplazamientos + np.arange(total)]
+
+
+class _Instantanea:
+    """Estado inmutable del índice; las consultas siempre leen una instantánea completa."""
+
+    def __init__(self, origenes, destinos, num_nodos, indice_por_matricula, matriculas, estados):
+        self.origenes = origenes
+        self.destinos = destinos
+        self.num_nodos = num_nodos
+        # Las listas solo crecen mientras no se reconstruya el índice, así que
+        # una instantánea vieja sigue siendo coherente con sus propios nodos
+        self.indice_por_matricula = indice_por_matricula
+        self.matriculas = matriculas
+        self.estados = estados
+        self.indptr_hijas, self.hijas = _construir_csr(origenes, destinos, num_nodos)
+        self.indptr_padres, self.padres = _construir_csr(destinos, origenes, num_nodos)
+
+
+class IndiceGrafo:
+    """
+    Índice en memoria del grafo de linaje entre matrículas.
+
+    Cada matrícula se codifica como un entero denso y las relaciones se guardan
+    como dos CSR (padre -> hijas y hija -> padres) en arreglos NumPy, de modo
+    que las consultas de familia, ancestros y descendientes son recorridos BFS
+    vectorizados que no tocan la base de datos.
+
+    Las relaciones nuevas se acumulan en un buffer de aristas que se incorpora
+    al CSR al superar UMBRAL_COMPACTACION o, a más tardar, en la siguiente consulta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reiniciar()
+        self._cambios_db = None
+        self.version_db = None
+        self.total_relaciones_db = 0
+        self.ultimo_refresco = 0.0
+
+    def _reiniciar(self):
+        """Vacía matrículas y relaciones para volver a cargarlas desde cero."""
+        self._indice_por_matricula = {}
+        self._matriculas = []
+        self._estados = []
+        self._id_db = []
+        self._indice_por_id_db = {}
+        self.max_id_matricula = 0
+        self._reiniciar_aristas()
+
+    def _reiniciar_aristas(self):
+        self._aristas_conocidas = set()
+        self._pendientes = []
+        vacio = np.empty(0, dtype=np.int32)
+        self._instantanea = _Instantanea(vacio, vacio, 0, self._indice_por_matricula, self._matriculas, self._estados)
+
+    # --- CARGA Y ACTUALIZACIÓN ---
+
+    @classmethod
+    def desde_db(cls, conn):
+        """Carga Matriculas y RelacionesMatriculas completas en un índice nuevo."""
+        indice = cls()
+        indice.refrescar(conn, completo=True)
+        return indice
+
+    def _registrar_matricula(self, id_db, matricula, estado):
+        matricula = normalizar_matricula(matricula)
+        indice = self._indice_por_matricula.get(matricula)
+        if indice is None:
+            indice = len(self._matriculas)
+            self._indice_por_matricula[matricula] = indice
+            self._matriculas.append(matricula)
+            self._estados.append(estado)
+            self._id_db.append(id_db)
+        else:
+            self._estados[indice] = estado
+        if id_db is not None:
+            self._indice_por_id_db[id_db] = indice
+            self.max_id_matricula = max(self.max_id_matricula, id_db)
+        return indice
+
+    def refrescar(self, conn, completo=False):
+        """
+        Sincroniza el índice con la base de datos.
+
+        Con version_grafo.sql aplicado, si la versión no cambió no se descarga
+        nada; si solo hubo altas, se descargan las matrículas con id mayor al
+        último conocido y las relaciones que las involucran; si hubo
+        modificaciones o bajas (estados, relaciones o matrículas borradas), el
+        índice se reconstruye completo. Sin las secuencias, el refresco es
+        incremental y las relaciones se recargan desde cero cuando el total no
+        cuadra (bajas, o una relación nueva entre matrículas viejas); los
+        cambios de estado y las matrículas borradas solo se ven al recargar.
+        """
+        with conn.cursor() as cur:
+            # La versión se lee antes que los datos: lo que se escriba mientras
+            # tanto la vuelve a mover y se recoge en el próximo refresco
+            version = leer_version_grafo(cur)
+            if not completo and version is not None and self._cambios_db is not None:
+                if version[0] == self.version_db:
+                    self.ultimo_refresco = time.monotonic()
+                    return
+                completo = version[1] != self._cambios_db
+            elif version is not None:
+                completo = completo or self._cambios_db is None
+
+            max_id_anterior = 0 if completo else self.max_id_matricula
+            cur.execute(
+                "SELECT id, no_matricula_inmobiliaria, estado_folio FROM public.matriculas WHERE id > %s",
+                (max_id_anterior,)
+            )
+            nuevas_matriculas = cur.fetchall()
+            cur.execute("SELECT count(*) FROM public.relacionesmatriculas")
+            total_relaciones = cur.fetchone()[0]
+
+            relaciones = []
+            recargar_relaciones = completo
+            if not completo and total_relaciones != self.total_relaciones_db:
+                cur.execute(
+                    "SELECT matricula_padre_id, matricula_hija_id FROM public.relacionesmatriculas "
+                    "WHERE matricula_padre_id > %(max_id)s OR matricula_hija_id > %(max_id)s",
+                    {'max_id': max_id_anterior}
+                )
+                relaciones = cur.fetchall()
+                recargar_relaciones = self.total_relaciones_db + len(relaciones) != total_relaciones
+            if recargar_relaciones:
+                cur.execute("SELECT matricula_padre_id, matricula_hija_id FROM public.relacionesmatriculas")
+                relaciones = cur.fetchall()
+
+        with self._lock:
+            if completo:
+                self._reiniciar()
+            elif recargar_relaciones:
+                # Hubo bajas: las relaciones se reemplazan, no se suman a las conocidas
+                self._reiniciar_aristas()
+            for id_db, matricula, estado in nuevas_matriculas:
+                self._registrar_matricula(id_db, matricula, estado)
+            self._agregar_aristas_por_id_db(relaciones)
+            self.total_relaciones_db = total_relaciones
+            if version is not None:
+                self.version_db, self._cambios_db = version
+            self.ultimo_refresco = time.monotonic()
+            self._compactar(forzar=recargar_relaciones)
+
+    def _agregar_aristas_por_id_db(self, relaciones):
+        for id_padre, id_hija in relaciones:
+            padre = self._indice_por_id_db.get(id_padre)
+            hija = self._indice_por_id_db.get(id_hija)
+            if padre is None or hija is None or (padre, hija) in self._aristas_conocidas:
+                continue
+            self._aristas_conocidas.add((padre, hija))
+            self._pendientes.append((padre, hija))
+
+    def agregar_relaciones(self, relaciones, estados=None):
+        """
+        Incorpora relaciones (padre, hija) expresadas con números de matrícula,
+        por ejemplo justo después de que un proceso de carga las inserta.
+        """
+        estados = estados or {}
+        with self._lock:
+            for padre, hija in relaciones:
+                indices = []
+                for matricula in (padre, hija):
+                    indice = self._indice_por_matricula.get(normalizar_matricula(matricula))
+                    if indice is None:
+                        indice = self._registrar_matricula(None, matricula, estados.get(matricula, 'No especificado'))
+                    indices.append(indice)
+                arista = tuple(indices)
+                if arista not in self._aristas_conocidas:
+                    self._aristas_conocidas.add(arista)
+                    self._pendientes.append(arista)
+            self._compactar()
+
+    def _compactar(self, forzar=False):
+        num_nodos = len(self._matriculas)
+        actual = self._instantanea
+        if not forzar and len(self._pendientes) < UMBRAL_COMPACTACION and actual.num_nodos == num_nodos:
+            return
+        if self._pendientes:
+            nuevas = np.array(self._pendientes, dtype=np.int32)
+            origenes = np.concatenate([actual.origenes, nuevas[:, 0]])
+            destinos = np.concatenate([actual.destinos, nuevas[:, 1]])
+        else:
+            origenes, destinos = actual.origenes, actual.destinos
+        self._pendientes = []
+        self._instantanea = _Instantanea(
+            origenes, destinos, num_nodos, self._indice_por_matricula, self._matriculas, self._estados
+        )
+
+    # --- CONSULTAS ---
+
+    def _vista(self):
+        with self._lock:
+            if self._pendientes or self._instantanea.num_nodos != len(self._matriculas):
+                self._compactar(forzar=True)
+            return self._instantanea
+
+    def _recorrer(self, matricula, hacia_hijas, hacia_padres):
+        vista = self._vista()
+        indice = vista.indice_por_matricula.get(normalizar_matricula(matricula))
+        # Una matrícula registrada después de tomar la instantánea todavía no tiene nodo en ella
+        if indice is None or indice >= vista.num_nodos:
+            return None, None, np.empty(0, dtype=np.int32)
+        visitados = np.zeros(vista.num_nodos, dtype=bool)
+        visitados[indice] = True
+        frontera = np.array([indice], dtype=np.int32)
+        while frontera.size:
+            partes = []
+            if hacia_hijas:
+                partes.append(_vecinos(vista.indptr_hijas, vista.hijas, frontera))
+            if hacia_padres:
+                partes.append(_vecinos(vista.indptr_padres, vista.padres, frontera))
+            candidatos = np.unique(np.concatenate(partes))
+            frontera = candidatos[~visitados[candidatos]]
+            visitados[frontera] = True
+        return vista, indice, np.flatnonzero(visitados)
+
+    def familia(self, matricula):
+        """Componente débilmente conexa (la familia completa) de una matrícula."""
+        vista, _, nodos = self._recorrer(matricula, True, True)
+        return {vista.matriculas[i] for i in nodos}
+
+    def ancestros(self, matricula):
+        vista, indice, nodos = self._recorrer(matricula, False, True)
+        return {vista.matriculas[i] for i in nodos if i != indice}
+
+    def descendientes(self, matricula):
+        vista, indice, nodos = self._recorrer(matricula, True, False)
+        return {vista.matriculas[i] for i in nodos if i != indice}
+
+    def relaciones_familia(self, matricula):
+        """
+        Relaciones de la familia de una matrícula con las mismas columnas que
+        la consulta recursiva de la app: padre, hija, padre_estado, hija_estado.
+        """
+        vista, _, nodos = self._recorrer(matricula, True, True)
+        filas = []
+        if vista is None:
+            return filas
+        for padre in nodos:
+            for hija in vista.hijas[vista.indptr_hijas[padre]:vista.indptr_hijas[padre + 1]]:
+                filas.append((
+                    vista.matriculas[padre],
+                    vista.matriculas[hija],
+                    vista.estados[padre],
+                    vista.estados[hija],
+                ))
+        return filas
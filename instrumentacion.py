@@ -0,0 +1,161 @@
+import contextvars
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+# ==============================================================================
+# Instrumentación liviana de la app: tiempos de cada consulta a la BD y de
+# cada paso de render, agrupados por rerun de Streamlit.
+#
+# Cada rerun abre un registro con iniciar_rerun() y lo cierra con
+# cerrar_rerun(). Entre medio, cada paso se envuelve en medir(nombre), que
+# anota duración, filas, espera por la conexión del pool y el error si lo
+# hubo. Cada medición y el resumen del rerun salen como una línea JSON por el
+# logger "catastro.instrumentacion"; el resumen cuenta las consultas del rerun
+# y avisa cuando pasan del umbral, que es la señal típica de un N+1.
+#
+# El registro vive en un ContextVar: Streamlit corre cada sesión en su propio
+# hilo, así que los reruns simultáneos no se mezclan.
+# ==============================================================================
+
+# Más consultas que esto en un solo rerun se reportan como posible N+1
+UMBRAL_CONSULTAS_POR_RERUN = 15
+# Una misma consulta repetida más veces que esto en un rerun también
+UMBRAL_REPETICIONES_CONSULTA = 3
+# Escribir cada medición (y no solo el resumen del rerun) en el log
+LOG_POR_MEDICION = True
+
+logger = logging.getLogger("catastro.instrumentacion")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_registro_actual = contextvars.ContextVar("registro_rerun", default=None)
+
+
+class Medicion:
+    """Un paso medido. filas se puede completar dentro del bloque medir()."""
+
+    __slots__ = ("tipo", "nombre", "inicio", "ms", "filas", "espera_conexion_ms", "error")
+
+    def __init__(self, tipo, nombre):
+        self.tipo = tipo
+        self.nombre = nombre
+        self.inicio = time.perf_counter()
+        self.ms = None
+        self.filas = None
+        self.espera_conexion_ms = 0.0
+        self.error = None
+
+    def como_dict(self):
+        return {
+            "tipo": self.tipo,
+            "nombre": self.nombre,
+            "ms": round(self.ms, 2) if self.ms is not None else None,
+            "filas": self.filas,
+            "espera_conexion_ms": round(self.espera_conexion_ms, 2),
+            "error": self.error,
+        }
+
+
+class RegistroRerun:
+    def __init__(self, sesion=None):
+        self.rerun_id = uuid.uuid4().hex[:12]
+        self.sesion = sesion
+        self.inicio = time.perf_counter()
+        self.mediciones = []
+        self._abiertas = []
+
+    def resumen(self):
+        """Desglose del rerun: totales por tipo y por nombre, y alertas de N+1."""
+        consultas = [m for m in self.mediciones if m.tipo == "consulta"]
+        por_nombre = {}
+        for m in self.mediciones:
+            grupo = por_nombre.setdefault(m.nombre, {"tipo": m.tipo, "veces": 0, "ms": 0.0, "filas": 0})
+            grupo["veces"] += 1
+            grupo["ms"] = round(grupo["ms"] + (m.ms or 0.0), 2)
+            grupo["filas"] += m.filas or 0
+        repetidas = sorted(
+            nombre for nombre, grupo in por_nombre.items()
+            if grupo["tipo"] == "consulta" and grupo["veces"] > UMBRAL_REPETICIONES_CONSULTA
+        )
+        return {
+            "rerun": self.rerun_id,
+            "sesion": self.sesion,
+            "ms_total": round((time.perf_counter() - self.inicio) * 1000, 2),
+            "consultas": len(consultas),
+            "ms_consultas": round(sum(m.ms or 0.0 for m in consultas), 2),
+            "ms_espera_conexion": round(sum(m.espera_conexion_ms for m in consultas), 2),
+            "ms_render": round(sum(m.ms or 0.0 for m in self.mediciones if m.tipo == "render"), 2),
+            "por_nombre": por_nombre,
+            "posible_n_mas_1": len(consultas) > UMBRAL_CONSULTAS_POR_RERUN or bool(repetidas),
+            "consultas_repetidas": repetidas,
+            "mediciones": [m.como_dict() for m in self.mediciones],
+        }
+
+
+def _log(evento, datos):
+    logger.info(json.dumps({"evento": evento, **datos}, ensure_ascii=False, default=str))
+
+
+def iniciar_rerun(sesion=None):
+    """Abre el registro del rerun actual (reemplaza al anterior si no se cerró)."""
+    registro = RegistroRerun(sesion)
+    _registro_actual.set(registro)
+    return registro
+
+
+def registro_actual():
+    return _registro_actual.get()
+
+
+def cerrar_rerun():
+    """Cierra el registro del rerun, escribe su resumen en el log y lo devuelve (None si no había)."""
+    registro = _registro_actual.get()
+    if registro is None:
+        return None
+    _registro_actual.set(None)
+    resumen = registro.resumen()
+    # Con LOG_POR_MEDICION cada paso ya salió en su propia línea
+    datos = {k: v for k, v in resumen.items() if k != "mediciones"} if LOG_POR_MEDICION else resumen
+    if resumen["posible_n_mas_1"]:
+        logger.warning(json.dumps({"evento": "alerta_n_mas_1", **datos}, ensure_ascii=False, default=str))
+    else:
+        _log("rerun", datos)
+    return resumen
+
+
+@contextmanager
+def medir(nombre, tipo="consulta"):
+    """
+    Mide el bloque y lo anota en el rerun actual. Fuera de un rerun (scripts,
+    benchmarks) solo mide y no registra nada.
+    """
+    medicion = Medicion(tipo, nombre)
+    registro = _registro_actual.get()
+    if registro is not None:
+        registro._abiertas.append(medicion)
+    try:
+        yield medicion
+    except Exception as e:
+        medicion.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        medicion.ms = (time.perf_counter() - medicion.inicio) * 1000
+        if registro is not None:
+            registro._abiertas.remove(medicion)
+            registro.mediciones.append(medicion)
+            if LOG_POR_MEDICION:
+                _log("medicion", {"rerun": registro.rerun_id, "sesion": registro.sesion, **medicion.como_dict()})
+
+
+def registrar_espera_conexion(segundos):
+    """La llama el pool: suma la espera por una conexión a la medición abierta más interna."""
+    registro = _registro_actual.get()
+    if registro is not None and registro._abiertas:
+        registro._abiertas[-1].espera_conexion_ms += segundos * 1000
@@ -0,0 +1,103 @@
+import hashlib
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# ==============================================================================
+# Mapa matrícula -> id de solo lectura en memoria compartida.
+#
+# El proceso principal lo construye una vez y los procesos trabajadores se
+# conectan por nombre sin copiar nada, así que la memoria no crece con la
+# cantidad de procesos. Todo vive en un solo bloque de memoria compartida:
+#
+#   hashes  uint64[n]   hash de 64 bits de cada clave, ordenados
+#   ids     int64[n]    id de la matrícula en la misma posición
+#   offsets int64[n+1]  inicio de cada clave dentro de claves
+#   claves  bytes       claves en UTF-8, concatenadas en el mismo orden
+#
+# La búsqueda es binaria sobre los hashes y se confirma comparando la clave,
+# así que un choque de hashes no puede devolver un id equivocado.
+# ==============================================================================
+
+
+def hash_clave(clave):
+    return int.from_bytes(hashlib.blake2b(clave.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class MapaCompartido:
+    """Mapa str -> int en memoria compartida. Se crea con construir() y se abre con conectar()."""
+
+    def __init__(self, shm, n, tamano_claves, propietario):
+        self._shm = shm
+        self._propietario = propietario
+        self.n = n
+        buf = shm.buf
+        inicio = 0
+        self.hashes = np.ndarray((n,), dtype=np.uint64, buffer=buf, offset=inicio)
+        inicio += 8 * n
+        self.ids = np.ndarray((n,), dtype=np.int64, buffer=buf, offset=inicio)
+        inicio += 8 * n
+        self.offsets = np.ndarray((n + 1,), dtype=np.int64, buffer=buf, offset=inicio)
+        inicio += 8 * (n + 1)
+        self.claves = buf[inicio:inicio + tamano_claves]
+        self._tamano_claves = tamano_claves
+
+    @classmethod
+    def construir(cls, pares):
+        """Crea el bloque compartido a partir de pares (clave, id). Lo llama el proceso principal."""
+        pares = [(clave, id_) for clave, id_ in pares if clave]
+        codificadas = [clave.encode('utf-8') for clave, _ in pares]
+        hashes = np.fromiter((hash_clave(clave) for clave, _ in pares), dtype=np.uint64, count=len(pares))
+        orden = np.argsort(hashes, kind='stable')
+        n = len(pares)
+        claves_ordenadas = [codificadas[i] for i in orden]
+        longitudes = np.fromiter((len(c) for c in claves_ordenadas), dtype=np.int64, count=n)
+        tamano_claves = int(longitudes.sum())
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, 8 * (3 * n + 1) + tamano_claves))
+        mapa = cls(shm, n, tamano_claves, propietario=True)
+        mapa.hashes[:] = hashes[orden]
+        mapa.ids[:] = np.fromiter((pares[i][1] for i in orden), dtype=np.int64, count=n)
+        mapa.offsets[0] = 0
+        np.cumsum(longitudes, out=mapa.offsets[1:])
+        mapa.claves[:] = b''.join(claves_ordenadas)
+        return mapa
+
+    def descriptor(self):
+        """Lo necesario para conectarse desde otro proceso (se pasa al inicializador del Pool)."""
+        return (self._shm.name, self.n, self._tamano_claves)
+
+    @classmethod
+    def conectar(cls, descriptor):
+        """Se conecta a un mapa creado por otro proceso. Costo constante: no copia datos."""
+        nombre, n, tamano_claves = descriptor
+        # Los procesos del Pool comparten el resource_tracker del principal, que
+        # es quien borra el bloque con cerrar()
+        shm = shared_memory.SharedMemory(name=nombre)
+        return cls(shm, n, tamano_claves, propietario=False)
+
+    def get(self, clave, default=None):
+        if not clave or self.n == 0:
+            return default
+        h = hash_clave(clave)
+        i = int(np.searchsorted(self.hashes, np.uint64(h)))
+        codificada = clave.encode('utf-8')
+        while i < self.n and int(self.hashes[i]) == h:
+            if self.claves[self.offsets[i]:self.offsets[i + 1]] == codificada:
+                return int(self.ids[i])
+            i += 1
+        return default
+
+    def __contains__(self, clave):
+        return self.get(clave) is not None
+
+    def __len__(self):
+        return self.n
+
+    def cerrar(self):
+        """Suelta las vistas y el bloque; el proceso que lo creó además lo borra."""
+        del self.hashes, self.ids, self.offsets
+        self.claves.release()
+        self._shm.close()
+        if self._propietario:
+            self._shm.unlink()
@@ -0,0 +1,193 @@
+from collections import Counter, deque
+
+# ==============================================================================
+# Nivel de detalle para familias grandes.
+#
+# Trabaja sobre el payload compacto del grafo (ver _payload_grafo en app.py)
+# y devuelve otro payload con el mismo formato, listo para el componente
+# grafo_vis, en el que los subárboles lejanos se reemplazan por nodos grupo.
+#
+# El árbol de referencia es un BFS no dirigido desde la matrícula buscada:
+# se muestran los nodos más cercanos hasta el presupuesto y los subárboles
+# ocultos que cuelgan de un mismo nodo visible (su ancla) se juntan en un
+# grupo con el total de matrículas, el desglose por estado del folio y
+# cuántas están en la base catastral. Expandir un grupo muestra otro
+# presupuesto de nodos bajo su ancla, sin volver a consultar la familia: todo
+# sale del payload completo que ya está en memoria. Como hay a lo sumo un
+# grupo por nodo visible, ninguna vista pasa de tope nodos contando grupos.
+# ==============================================================================
+
+# Nodos visibles al abrir una familia y al expandir cada grupo
+PRESUPUESTO_NODOS = 150
+PRESUPUESTO_EXPANSION = 100
+# Tope duro de nodos (matrículas + grupos) que se envían al navegador
+TOPE_NODOS = 800
+
+
+def _arbol_bfs(payload):
+    """Padre de cada nodo en el árbol BFS no dirigido y orden de visita (bosque si la familia no es conexa)."""
+    num_nodos = len(payload['nodos'])
+    vecinos = [[] for _ in range(num_nodos)]
+    aristas = payload['aristas']
+    for k in range(0, len(aristas), 2):
+        padre, hija = aristas[k], aristas[k + 1]
+        vecinos[padre].append(hija)
+        vecinos[hija].append(padre)
+
+    raiz = payload['buscada'] if payload['buscada'] >= 0 else 0
+    arbol_padre = [None] * num_nodos
+    visitado = [False] * num_nodos
+    orden = []
+    for inicio in [raiz] + list(range(num_nodos)):
+        if visitado[inicio]:
+            continue
+        visitado[inicio] = True
+        cola = deque([inicio])
+        while cola:
+            nodo = cola.popleft()
+            orden.append(nodo)
+            for vecino in vecinos[nodo]:
+                if not visitado[vecino]:
+                    visitado[vecino] = True
+                    arbol_padre[vecino] = nodo
+                    cola.append(vecino)
+    return arbol_padre, orden
+
+
+def _hijos_arbol(arbol_padre, orden):
+    hijos = [[] for _ in arbol_padre]
+    for nodo in orden:
+        if arbol_padre[nodo] is not None:
+            hijos[arbol_padre[nodo]].append(nodo)
+    return hijos
+
+
+def _primeros_ocultos(inicios, hijos, cantidad):
+    """Los primeros `cantidad` nodos en orden BFS de los subárboles que empiezan en inicios."""
+    elegidos = []
+    cola = deque(inicios)
+    while cola and len(elegidos) < cantidad:
+        nodo = cola.popleft()
+        elegidos.append(nodo)
+        cola.extend(hijos[nodo])
+    return elegidos
+
+
+def vista_grafo(payload, expandidos=(), presupuesto=PRESUPUESTO_NODOS,
+                presupuesto_expansion=PRESUPUESTO_EXPANSION, tope=TOPE_NODOS):
+    """
+    Payload reducido de la familia. expandidos son las anclas de los grupos
+    que el usuario abrió, en el orden en que los abrió; un ancla repetida se
+    expande una vez por cada aparición. El ancla '' es el grupo de nodos sin
+    camino a la matrícula buscada. Además de los campos del payload completo,
+    devuelve:
+      grupos         {posición del nodo grupo: {ancla, total, estados, catastro}}
+      total_familia  matrículas de la familia completa
+      visibles       matrículas que se muestran (sin contar grupos)
+      recortado      True si el tope impidió mostrar lo pedido
+    """
+    nodos = payload['nodos']
+    num_nodos = len(nodos)
+    base = {
+        'total_familia': num_nodos,
+        'visibles': num_nodos,
+        'recortado': False,
+        'grupos': {},
+    }
+    if num_nodos <= presupuesto:
+        return {**payload, **base}
+
+    arbol_padre, orden = _arbol_bfs(payload)
+    hijos = _hijos_arbol(arbol_padre, orden)
+    # Cada grupo ocupa un nodo más, así que se reserva espacio para ellos dentro del tope
+    tope_matriculas = max(1, tope // 2)
+    recortado = False
+
+    visible = set(orden[:min(presupuesto, tope_matriculas)])
+    posicion = {matricula: i for i, matricula in enumerate(nodos)}
+    raices_sueltas = [n for n in orden if arbol_padre[n] is None and n != orden[0]]
+    pendientes = [posicion.get(m, -1) if m else -1 for m in expandidos if not m or m in posicion]
+    # Un ancla puede volverse visible al expandir otra, así que se itera hasta que no cambie nada
+    cambio = True
+    while cambio and pendientes:
+        cambio = False
+        for i, ancla in enumerate(pendientes):
+            if ancla != -1 and ancla not in visible:
+                continue
+            del pendientes[i]
+            cambio = True
+            disponibles = tope_matriculas - len(visible)
+            inicios = raices_sueltas if ancla == -1 else hijos[ancla]
+            inicios = [n for n in inicios if n not in visible]
+            if disponibles <= 0:
+                recortado = recortado or bool(inicios)
+                break
+            nuevos = _primeros_ocultos(inicios, hijos, min(presupuesto_expansion, disponibles))
+            if disponibles < presupuesto_expansion and len(nuevos) == disponibles:
+                recortado = True
+            visible.update(nuevos)
+            break
+
+    # Ancla de cada nodo oculto: el primer antecesor visible en el árbol (-1 si no tiene)
+    ancla_de = {}
+    for nodo in orden:
+        if nodo in visible:
+            continue
+        padre = arbol_padre[nodo]
+        if padre is None:
+            ancla_de[nodo] = -1
+        else:
+            ancla_de[nodo] = padre if padre in visible else ancla_de[padre]
+
+    resumen_grupos = {}
+    for nodo, ancla in ancla_de.items():
+        resumen = resumen_grupos.setdefault(ancla, {'total': 0, 'estados': Counter(), 'catastro': 0})
+        resumen['total'] += 1
+        resumen['estados'][payload['estados'][payload['estado'][nodo]]] += 1
+        resumen['catastro'] += payload['catastro'][nodo]
+
+    # Matrículas visibles en el orden original y luego los grupos, del más grande al más chico
+    visibles_ordenados = sorted(visible)
+    anclas = sorted(resumen_grupos, key=lambda a: (-resumen_grupos[a]['total'], a))
+    nueva_posicion = {nodo: i for i, nodo in enumerate(visibles_ordenados)}
+    posicion_grupo = {ancla: len(visibles_ordenados) + i for i, ancla in enumerate(anclas)}
+
+    def destino(nodo):
+        return nueva_posicion[nodo] if nodo in visible else posicion_grupo[ancla_de[nodo]]
+
+    aristas = []
+    vistas = set()
+    original = payload['aristas']
+    for k in range(0, len(original), 2):
+        arista = (destino(original[k]), destino(original[k + 1]))
+        if arista[0] != arista[1] and arista not in vistas:
+            vistas.add(arista)
+            aristas.extend(arista)
+
+    estados = list(payload['estados'])
+    posicion_estado = {estado: i for i, estado in enumerate(estados)}
+    grupos = {}
+    for ancla in anclas:
+        resumen = resumen_grupos[ancla]
+        grupos[posicion_grupo[ancla]] = {
+            'ancla': nodos[ancla] if ancla != -1 else '',
+            'total': resumen['total'],
+            'estados': dict(resumen['estados'].most_common()),
+            'catastro': resumen['catastro'],
+        }
+    if 'Grupo' not in posicion_estado:
+        posicion_estado['Grupo'] = len(estados)
+        estados.append('Grupo')
+
+    return {
+        'nodos': [nodos[n] for n in visibles_ordenados] + [f"+{resumen_grupos[a]['total']}" for a in anclas],
+        'estados': estados,
+        'estado': [payload['estado'][n] for n in visibles_ordenados] + [posicion_estado['Grupo']] * len(anclas),
+        'catastro': [payload['catastro'][n] for n in visibles_ordenados] + [0] * len(anclas),
+        'aristas': aristas,
+        'buscada': nueva_posicion.get(payload['buscada'], -1),
+        'total_familia': num_nodos,
+        'visibles': len(visibles_ordenados),
+        'recortado': recortado,
+        'grupos': grupos,
+    }
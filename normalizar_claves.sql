@@ -0,0 +1,40 @@
+-- Claves normalizadas de matrícula, indexables con un btree normal.
+-- Reemplaza los TRIM("Matricula") / TRIM(no_matricula_inmobiliaria) de las consultas,
+-- que impedían usar índices. La regla es la misma que claves.normalizar_matricula.
+
+CREATE OR REPLACE FUNCTION public.normalizar_matricula(valor TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT NULLIF(upper(regexp_replace(valor, '[\s\u00a0\ufeff]+', '', 'g')), '')
+$$;
+
+-- Las filas existentes no se reescriben: no_matricula_inmobiliaria conserva el
+-- valor tal como se cargó y las consultas usan las columnas generadas.
+--
+-- El índice de matriculas es UNIQUE: dos filas con la misma clave normalizada
+-- (por ejemplo '50N-123 ' y '50N-123') harían ambiguas las búsquedas por
+-- matricula_norm. Si su CREATE falla, estas son las variantes a unificar a mano:
+--
+--   SELECT public.normalizar_matricula(no_matricula_inmobiliaria) AS matricula_norm,
+--          array_agg(no_matricula_inmobiliaria) AS variantes
+--   FROM public.matriculas
+--   GROUP BY 1
+--   HAVING count(*) > 1;
+
+-- 1. Columnas generadas con la clave canónica (se rellenan solas, también en cargas futuras)
+ALTER TABLE public.matriculas
+    ADD COLUMN IF NOT EXISTS matricula_norm TEXT
+    GENERATED ALWAYS AS (public.normalizar_matricula(no_matricula_inmobiliaria)) STORED;
+
+ALTER TABLE public.informacioncatastral
+    ADD COLUMN IF NOT EXISTS matricula_norm TEXT
+    GENERATED ALWAYS AS (public.normalizar_matricula("Matricula")) STORED;
+
+-- 2. Índices (el btree no único de versiones anteriores de este script se reemplaza)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_matriculas_matricula_norm ON public.matriculas (matricula_norm);
+DROP INDEX IF EXISTS public.idx_matriculas_matricula_norm;
+CREATE INDEX IF NOT EXISTS idx_informacioncatastral_matricula_norm ON public.informacioncatastral (matricula_norm);
+
+ANALYZE public.matriculas;
+ANALYZE public.informacioncatastral;
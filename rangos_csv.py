@@ -0,0 +1,82 @@
+import csv
+import io
+import mmap
+import os
+
+# ==============================================================================
+# Planificación del trabajo por rangos de bytes de un CSV, sin archivos
+# intermedios. El proceso principal reparte (inicio, fin) del archivo original
+# y cada proceso lee solo su rango desde el archivo mapeado en memoria.
+#
+# Los rangos terminan siempre justo después de un salto de línea, así que
+# ninguna fila queda partida. Supone, como Libro4.csv, que no hay saltos de
+# línea dentro de los campos. partir_rangos es el mismo corte para cualquier
+# archivo de líneas: carga.py y depurador.py lo usan con los .sql de INSERT.
+# ==============================================================================
+
+BOM_UTF8 = b'\xef\xbb\xbf'
+
+
+def leer_encabezado(ruta, delimitador=';', encoding='utf-8'):
+    """Devuelve (columnas, byte donde empiezan los datos). Descarta el BOM que deja Excel."""
+    with open(ruta, 'rb') as f:
+        primera = f.readline()
+    inicio_datos = len(primera)
+    if primera.startswith(BOM_UTF8):
+        primera = primera[len(BOM_UTF8):]
+    texto = primera.decode(encoding).rstrip('\r\n')
+    columnas = next(csv.reader([texto], delimiter=delimitador), [])
+    return [col.strip() for col in columnas], inicio_datos
+
+
+def partir_rangos(ruta, tamano_rango, inicio_datos=0, es_inicio_de_fila=None):
+    """
+    Parte el archivo desde inicio_datos en rangos (inicio, fin) de unos
+    tamano_rango bytes que terminan justo después de un salto de línea. Si se
+    da es_inicio_de_fila(mm, posicion), solo se corta antes de las líneas en
+    las que devuelve True (por ejemplo, para no partir una sentencia de varias líneas).
+    """
+    total = os.path.getsize(ruta)
+    if total <= inicio_datos:
+        return []
+    rangos = []
+    with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        inicio = inicio_datos
+        while inicio < total:
+            fin = min(inicio + tamano_rango, total)
+            while fin < total:
+                salto = mm.find(b'\n', fin - 1)
+                if salto == -1:
+                    fin = total
+                elif es_inicio_de_fila is None or es_inicio_de_fila(mm, salto + 1):
+                    fin = salto + 1
+                    break
+                else:
+                    fin = salto + 2
+            fin = min(fin, total)
+            rangos.append((inicio, fin))
+            inicio = fin
+    return rangos
+
+
+def planificar_rangos(ruta, num_rangos, delimitador=';', encoding='utf-8'):
+    """
+    Parte las filas de datos del CSV (sin el encabezado) en hasta num_rangos
+    rangos (inicio, fin) de tamaño parecido. Devuelve (columnas, rangos).
+    """
+    columnas, inicio_datos = leer_encabezado(ruta, delimitador, encoding)
+    total = os.path.getsize(ruta)
+    tamano_rango = max(1, -(-(total - inicio_datos) // max(1, num_rangos)))
+    return columnas, partir_rangos(ruta, tamano_rango, inicio_datos)
+
+
+def leer_bytes(ruta, inicio, fin):
+    with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[inicio:fin]
+
+
+def leer_filas(ruta, inicio, fin, delimitador=';', encoding='utf-8'):
+    """Filas (listas de campos) del rango [inicio, fin), como las daría csv.reader."""
+    texto = leer_bytes(ruta, inicio, fin).decode(encoding)
+    return csv.reader(io.StringIO(texto, newline=''), delimiter=delimitador)
+
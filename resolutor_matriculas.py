@@ -0,0 +1,81 @@
+import psycopg2.extras
+
+from claves import normalizar_matricula
+
+ESTADO_POR_DEFECTO = "No especificado"
+
+# Matrículas por sentencia al resolver un lote
+TAMANO_LOTE = 1000
+
+
+class ResolutorMatriculas:
+    """
+    Obtener-o-crear de matrículas por lotes, con caché en el proceso.
+
+    pedir() solo anota la clave; resolver() resuelve todas las pendientes con
+    una sentencia por lote (las existentes se leen y las que faltan se
+    insertan con ON CONFLICT DO NOTHING ... RETURNING). Los ids resueltos
+    quedan en caché, así que una matrícula que se repite en muchas filas
+    cuesta una sola ida a la base de datos.
+
+    Como en el obtener_o_crear_matricula_id original, el estado solo se usa al
+    crear la matrícula y vale el de la primera vez que se pidió.
+    """
+
+    SQL_RESOLVER = """
+        WITH v(clave, estado) AS (VALUES %s),
+        existentes AS (
+            SELECT m.matricula_norm, m.id FROM Matriculas m JOIN v ON m.matricula_norm = v.clave
+        ),
+        nuevas AS (
+            INSERT INTO Matriculas (no_matricula_inmobiliaria, estado_folio)
+            SELECT v.clave, v.estado FROM v
+            WHERE NOT EXISTS (SELECT 1 FROM existentes e WHERE e.matricula_norm = v.clave)
+            ON CONFLICT DO NOTHING
+            RETURNING matricula_norm, id
+        )
+        SELECT matricula_norm, id FROM existentes
+        UNION ALL
+        SELECT matricula_norm, id FROM nuevas
+    """
+
+    def __init__(self, cursor, tamano_lote=TAMANO_LOTE):
+        self.cursor = cursor
+        self.tamano_lote = tamano_lote
+        self.cache = {}
+        self.pendientes = {}
+        self.idas_bd = 0
+
+    def pedir(self, no_matricula, estado_folio=""):
+        """Anota la matrícula para el próximo resolver() y devuelve su clave canónica (None si está vacía)."""
+        clave = normalizar_matricula(no_matricula)
+        if clave and clave not in self.cache and clave not in self.pendientes:
+            self.pendientes[clave] = estado_folio if estado_folio else ESTADO_POR_DEFECTO
+        return clave
+
+    def resolver(self):
+        """Resuelve todas las claves pendientes y las deja en caché."""
+        if not self.pendientes:
+            return
+        pendientes = list(self.pendientes.items())
+        for i in range(0, len(pendientes), self.tamano_lote):
+            filas = psycopg2.extras.execute_values(
+                self.cursor, self.SQL_RESOLVER, pendientes[i:i + self.tamano_lote],
+                page_size=self.tamano_lote, fetch=True
+            )
+            self.idas_bd += 1
+            self.cache.update(filas)
+
+        # Claves que otra carga insertó entre la lectura y el INSERT (ON CONFLICT las saltó)
+        faltantes = [clave for clave in self.pendientes if clave not in self.cache]
+        if faltantes:
+            self.cursor.execute(
+                "SELECT matricula_norm, id FROM Matriculas WHERE matricula_norm = ANY(%s)", (faltantes,)
+            )
+            self.idas_bd += 1
+            self.cache.update(self.cursor.fetchall())
+        self.pendientes.clear()
+
+    def get(self, clave):
+        """Id de una clave ya resuelta (None si está vacía o no se ha resuelto)."""
+        return self.cache.get(clave)
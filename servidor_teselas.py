@@ -0,0 +1,241 @@
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from conexiones import PoolConexiones
+
+# ==============================================================================
+# Servidor local de teselas vectoriales (Mapbox Vector Tiles) de public.terrenos.
+#
+# Cada tesela /teselas/{z}/{x}/{y}.pbf se arma en PostGIS con ST_AsMVT, con
+# las geometrías simplificadas según el zoom, y se guarda en disco bajo
+# DIRECTORIO_CACHE/<versión>/z/x/y.pbf. La versión es el last_value de
+# public.version_terrenos_seq (ver version_terrenos.sql), que avanza con cada
+# carga o cambio de terrenos: al cambiar, las teselas se piden de nuevo y el
+# directorio de la versión anterior se borra.
+#
+# No depende de ningún servicio externo: basta una base PostGIS (local o la
+# de siempre) con version_terrenos.sql aplicado. Los mapas de app.py consumen
+# las teselas como una capa vectorial de Leaflet.VectorGrid, en la URL pública
+# configurada en st.secrets["teselas_terrenos"]["url"] o TESELAS_TERRENOS_URL.
+#
+# Uso: python servidor_teselas.py --dsn "host=localhost dbname=catastro user=postgres"
+# Prueba de la consulta contra la base: ... --probar 16/19278/31891 (zona de Cota)
+# ==============================================================================
+
+# --- CONFIGURACIÓN ---
+DB_CREDS = {
+    "host": "localhost",
+    "dbname": "postgres",
+    "user": "postgres",
+    "password": "",
+    "port": "5432",
+}
+PUERTO = 8081
+DIRECTORIO_CACHE = "cache_teselas"
+
+# SRID en que están guardadas las geometrías (MAGNA-SIRGAS origen nacional)
+SRID_TERRENOS = 9377
+NOMBRE_CAPA = "terrenos"
+
+# Por debajo de ZOOM_MINIMO se devuelve una tesela vacía: serían miles de predios por tesela
+ZOOM_MINIMO = 12
+ZOOM_MAXIMO = 22
+# Tolerancia de simplificación en píxeles de pantalla; desde ZOOM_SIN_SIMPLIFICAR va la geometría completa
+PIXELES_TOLERANCIA = 1.0
+ZOOM_SIN_SIMPLIFICAR = 18
+EXTENSION_MVT = 4096
+MARGEN_MVT = 64
+
+# Cada cuánto se consulta la versión de terrenos (también es el max-age de las respuestas)
+SEGUNDOS_VERIFICAR_VERSION = 10
+
+CIRCUNFERENCIA_WEB_MERCATOR = 40075016.685578488
+
+SQL_VERSION = "SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM public.version_terrenos_seq"
+
+SQL_TESELA = f"""
+    WITH caja AS (
+        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS caja
+    ),
+    filas AS (
+        SELECT
+            t.codigo,
+            t.vereda_cod,
+            ST_AsMVTGeom(
+                CASE WHEN %(tolerancia)s > 0
+                     THEN ST_SimplifyPreserveTopology(ST_Transform(t.geom, 3857), %(tolerancia)s)
+                     ELSE ST_Transform(t.geom, 3857)
+                END,
+                caja.caja, {EXTENSION_MVT}, {MARGEN_MVT}, true
+            ) AS geom
+        FROM public.terrenos t, caja
+        -- Filtro por índice en el SRID de la tabla, con el margen de la tesela
+        WHERE t.geom && ST_Transform(ST_Expand(caja.caja, %(margen)s), {SRID_TERRENOS})
+    )
+    SELECT ST_AsMVT(filas, '{NOMBRE_CAPA}', {EXTENSION_MVT}, 'geom')
+    FROM filas
+    WHERE geom IS NOT NULL;
+"""
+
+RUTA_TESELA = re.compile(r"^/teselas/(\d+)/(\d+)/(\d+)\.pbf$")
+
+
+def tolerancia_zoom(z):
+    """Metros (EPSG:3857) que mide PIXELES_TOLERANCIA píxeles de una tesela de 256 en el zoom z."""
+    if z >= ZOOM_SIN_SIMPLIFICAR:
+        return 0.0
+    return CIRCUNFERENCIA_WEB_MERCATOR / (256 * 2 ** z) * PIXELES_TOLERANCIA
+
+
+class CacheTeselas:
+    """Teselas en disco por versión de los datos: <directorio>/<versión>/z/x/y.pbf."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, version, z, x, y):
+        return os.path.join(self.directorio, str(version), str(z), str(x), f"{y}.pbf")
+
+    def leer(self, version, z, x, y):
+        try:
+            with open(self._ruta(version, z, x, y), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def guardar(self, version, z, x, y, datos):
+        ruta = self._ruta(version, z, x, y)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: otro hilo nunca lee una tesela a medio escribir
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+
+    def purgar_excepto(self, version):
+        """Borra las teselas de las versiones anteriores."""
+        for nombre in os.listdir(self.directorio):
+            if nombre != str(version):
+                shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+
+
+class ServicioTeselas:
+    def __init__(self, db_params, directorio_cache=DIRECTORIO_CACHE):
+        self.pool = PoolConexiones(db_params)
+        self.cache = CacheTeselas(directorio_cache)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_leida = 0.0
+
+    def version(self):
+        """Versión vigente de terrenos, consultada a lo sumo cada SEGUNDOS_VERIFICAR_VERSION."""
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._version_leida < SEGUNDOS_VERIFICAR_VERSION:
+                return self._version
+            with self.pool.conexion() as conn, conn.cursor() as cur:
+                cur.execute(SQL_VERSION)
+                version = cur.fetchone()[0]
+            if version != self._version:
+                print(f"🔄 Versión de terrenos: {version}; se descartan las teselas anteriores.")
+                self.cache.purgar_excepto(version)
+                self._version = version
+            self._version_leida = time.monotonic()
+            return version
+
+    def tesela(self, z, x, y):
+        """Devuelve (versión, bytes MVT, si salió de la caché)."""
+        version = self.version()
+        if z < ZOOM_MINIMO:
+            return version, b"", True
+        datos = self.cache.leer(version, z, x, y)
+        if datos is not None:
+            return version, datos, True
+
+        margen = CIRCUNFERENCIA_WEB_MERCATOR / 2 ** z * MARGEN_MVT / EXTENSION_MVT
+        with self.pool.conexion() as conn, conn.cursor() as cur:
+            cur.execute(SQL_TESELA, {"z": z, "x": x, "y": y, "tolerancia": tolerancia_zoom(z), "margen": margen})
+            fila = cur.fetchone()
+        datos = bytes(fila[0]) if fila and fila[0] is not None else b""
+        # La tesela se guarda bajo la versión leída antes de la consulta, y solo si
+        # sigue vigente: si cambió mientras tanto, su directorio ya se purgó
+        with self._lock:
+            if version == self._version:
+                self.cache.guardar(version, z, x, y, datos)
+        return version, datos, False
+
+
+def crear_manejador(servicio):
+    class ManejadorTeselas(BaseHTTPRequestHandler):
+        def _responder(self, codigo, cuerpo=b"", encabezados=None):
+            self.send_response(codigo)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            for nombre, valor in (encabezados or {}).items():
+                self.send_header(nombre, valor)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            if self.path == "/version":
+                self._responder(200, str(servicio.version()).encode(), {"Content-Type": "text/plain"})
+                return
+            coincidencia = RUTA_TESELA.match(self.path.split("?", 1)[0])
+            if not coincidencia:
+                self._responder(404)
+                return
+            z, x, y = (int(v) for v in coincidencia.groups())
+            if z > ZOOM_MAXIMO or x >= 2 ** z or y >= 2 ** z:
+                self._responder(404)
+                return
+            try:
+                version, datos, de_cache = servicio.tesela(z, x, y)
+            except Exception as e:
+                print(f"❌ Error en la tesela {z}/{x}/{y}: {e}")
+                self._responder(500)
+                return
+
+            etiqueta = f'"{version}-{z}-{x}-{y}"'
+            if self.headers.get("If-None-Match") == etiqueta:
+                self._responder(304, encabezados={"ETag": etiqueta})
+                return
+            self._responder(200, datos, {
+                "Content-Type": "application/vnd.mapbox-vector-tile",
+                "Cache-Control": f"max-age={SEGUNDOS_VERIFICAR_VERSION}",
+                "ETag": etiqueta,
+                "X-Cache": "HIT" if de_cache else "MISS",
+            })
+
+    return ManejadorTeselas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de teselas vectoriales de public.terrenos.")
+    parser.add_argument("--dsn", default=os.environ.get("TESELAS_DSN"),
+                        help="DSN de la base PostGIS (o variable TESELAS_DSN); por defecto DB_CREDS.")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--cache", default=DIRECTORIO_CACHE, help="Directorio de la caché de teselas.")
+    parser.add_argument("--probar", metavar="Z/X/Y",
+                        help="Arma una sola tesela contra la base, muestra su tamaño y termina.")
+    args = parser.parse_args()
+
+    servicio = ServicioTeselas({"dsn": args.dsn} if args.dsn else DB_CREDS, args.cache)
+    if args.probar:
+        z, x, y = (int(v) for v in args.probar.split("/"))
+        inicio = time.perf_counter()
+        version, datos, de_cache = servicio.tesela(z, x, y)
+        print(f"✅ Tesela {z}/{x}/{y} (versión {version}): {len(datos)} bytes en "
+              f"{(time.perf_counter() - inicio) * 1000:.1f} ms{' (de la caché)' if de_cache else ''}.")
+        raise SystemExit(0)
+    servidor = ThreadingHTTPServer(("0.0.0.0", args.puerto), crear_manejador(servicio))
+    print(f"✅ Teselas de terrenos en http://localhost:{args.puerto}/teselas/{{z}}/{{x}}/{{y}}.pbf (caché en '{args.cache}')")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Servidor detenido.")
@@ -0,0 +1,60 @@
+import io
+from decimal import Decimal
+
+from tokenizador_sql import ErrorInsert, FilaInsert, leer_inserts, tokenizar_valores
+
+# Bloques chicos además del normal, para que los límites caigan dentro de textos y comentarios
+TAMANOS_BLOQUE = (1024 * 1024, 7, 3)
+
+
+def _leer(texto, tamano_bloque):
+    return list(leer_inserts(io.BytesIO(texto.encode('utf-8')), tamano_bloque))
+
+
+def test_texto_con_insert_into_no_parte_la_fila():
+    texto = '''insert into "s"."t" ("a","b") values ('note: insert into foo', 2.5);\n'''
+    for tamano in TAMANOS_BLOQUE:
+        elementos = _leer(texto, tamano)
+        assert [type(e) for e in elementos] == [FilaInsert]
+        assert elementos[0].valores[0] == 'note: insert into foo'
+        assert str(elementos[0].valores[1]) == '2.5'
+
+
+def test_insert_comentado_se_ignora():
+    texto = (
+        "-- INSERT INTO t (a, b) VALUES ('x', 1);\n"
+        "INSERT INTO t (a, b) VALUES ('y', 2);\n"
+        "/* INSERT INTO t (a, b) VALUES ('z', 3);\n"
+        "   INSERT INTO t (a, b) VALUES ('w', 4); */\n"
+    )
+    for tamano in TAMANOS_BLOQUE:
+        elementos = _leer(texto, tamano)
+        assert [(e.num_linea, e.valores) for e in elementos] == [(2, ('y', 2))]
+
+
+def test_comentario_con_comilla_no_abre_un_texto():
+    texto = (
+        "-- no es un texto: ' \n"
+        "INSERT INTO t (a) VALUES ('uno');\n"
+        "INSERT INTO t (a) VALUES ('dos');\n"
+    )
+    for tamano in TAMANOS_BLOQUE:
+        assert [e.valores for e in _leer(texto, tamano)] == [('uno',), ('dos',)]
+
+
+def test_comilla_sin_cerrar_no_se_come_las_sentencias_siguientes():
+    texto = (
+        "INSERT INTO t (a) VALUES ('roto);\n"
+        "INSERT INTO t (a) VALUES ('bien');\n"
+    )
+    for tamano in TAMANOS_BLOQUE:
+        elementos = _leer(texto, tamano)
+        assert isinstance(elementos[0], ErrorInsert)
+        assert elementos[0].num_linea == 1
+        assert [(e.num_linea, e.valores) for e in elementos[1:]] == [(2, ('bien',))]
+
+
+def test_filas_de_textos_y_null_con_varias_formas():
+    assert tokenizar_valores("('a', NULL), (NULL,'b'), ('c'), (NULL), ('x''y', 1.5)") == [
+        ('a', None), (None, 'b'), ('c',), (None,), ("x'y", Decimal('1.5')),
+    ]
@@ -0,0 +1,38 @@
+import io
+import os
+
+import pandas as pd
+
+from benchmark_extraccion import extraccion_iterrows, extraccion_vectorizada
+
+# Casos de Libro4: matrices con espacios y comas de más, matrículas vacías,
+# una matriz que luego aparece como principal, estados con espacios y filas repetidas
+LIBRO4 = (
+    "﻿no_matricula_inmobiliaria;estado_folio;matriculas_matriz;matriculas_derivadas\n"
+    "1001539;ACTIVO;676148;\n"
+    "1008990;ACTIVO;29552, 1008972;\n"
+    "1037472; CERRADO ;103474, 795879,, 795880 ;1037473\n"
+    "1037472;ACTIVO;103474;1037474\n"
+    " ;ACTIVO;999;888\n"
+    "29552;CERRADO;;1008990\n"
+    "50N 123;ACTIVO;50n123;\n"
+    "1040000;;;\n"
+    "1001539;ACTIVO;676148;\n"
+)
+
+
+def _leer(texto):
+    return pd.read_csv(io.StringIO(texto), sep=';', dtype=str).fillna('')
+
+
+def test_extraccion_vectorizada_igual_a_iterrows():
+    df = _leer(LIBRO4)
+    assert extraccion_vectorizada(df) == extraccion_iterrows(df)
+
+
+def test_extraccion_vectorizada_igual_a_iterrows_por_chunks_de_libro4():
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Libro4.csv')
+    df = pd.read_csv(ruta, sep=';', dtype=str, nrows=6000).fillna('')
+    for inicio in range(0, len(df), 1500):
+        chunk = df.iloc[inicio:inicio + 1500]
+        assert extraccion_vectorizada(chunk) == extraccion_iterrows(chunk)
@@ -0,0 +1,438 @@
+import re
+from collections import namedtuple
+from decimal import Decimal
+from itertools import islice
+from operator import itemgetter
+
+# ==============================================================================
+# Tokenizador en streaming de sentencias INSERT.
+#
+# Lee un flujo de bytes por bloques y devuelve una FilaInsert por cada tupla
+# de cada INSERT INTO tabla (columnas) VALUES (...), (...); del archivo.
+# Respeta comas, paréntesis, punto y coma y saltos de línea dentro de textos
+# entre comillas (incluidas las comillas escapadas como ''), reconoce NULL,
+# TRUE/FALSE y números, y admite listas VALUES de varias filas y sentencias
+# que ocupan varias líneas.
+#
+# Es una máquina de estados de dos niveles: el nivel de sentencia busca el
+# próximo INSERT completo en el búfer (una sentencia cortada al final del
+# bloque se completa con el siguiente) y el nivel de valores separa los
+# textos entre comillas del "esqueleto" de la lista VALUES y recorre solo
+# ese esqueleto, que es corto. Las pasadas sobre textos largos (geometrías
+# WKT, por ejemplo) son siempre split/regex en C, nunca caracter a caracter.
+#
+# Los límites de sentencia solo se buscan fuera de textos entre comillas,
+# identificadores entre comillas dobles y comentarios (-- y /* */): un
+# INSERT comentado se ignora y un texto que contiene "insert into" no parte
+# la fila. La única excepción es un INSERT al comienzo de una línea dentro
+# de un texto que no se cerró: se toma como la sentencia siguiente, para que
+# una comilla de más no se coma el resto del archivo.
+# ==============================================================================
+
+TAMANO_BLOQUE = 1024 * 1024
+
+FilaInsert = namedtuple('FilaInsert', ['num_linea', 'tabla', 'columnas', 'valores', 'sentencia'])
+FilaInsert.__doc__ = """
+Una fila de un INSERT. valores es una tupla con str (textos), None (NULL),
+bool, int o Decimal (números, sin perder dígitos). sentencia es el texto
+completo del INSERT del que sale la fila y num_linea la línea donde empieza.
+"""
+
+ErrorInsert = namedtuple('ErrorInsert', ['num_linea', 'sentencia', 'mensaje'])
+ErrorInsert.__doc__ = "Un INSERT que no se pudo interpretar (por ejemplo, usa funciones o le faltan valores)."
+
+_IDENTIFICADOR = r'(?:"(?:[^"]|"")+"|[A-Za-z_][\w$]*)'
+
+# Nivel de sentencia: cabecera INSERT INTO tabla (cols) VALUES; el cuerpo termina
+# en el primer ';' que queda fuera de comillas (ver _fin_sentencia)
+_RE_CABECERA = re.compile(
+    r"INSERT\s+INTO\s+(" + _IDENTIFICADOR + r"(?:\s*\.\s*" + _IDENTIFICADOR + r")?)"
+    r"\s*\(([^)]*)\)\s*VALUES\s*",
+    re.IGNORECASE
+)
+# Versiones en bytes para leer_inserts. Solo se aplican con match o sobre tramos
+# cortos (entre sentencias y en el camino lento): en el camino rápido ninguna
+# expresión regular recorre los textos largos, así que re.IGNORECASE no pesa
+_IDENTIFICADOR_B = rb'(?:"(?:[^"]|"")+"|[A-Z_\x80-\xff][\w$\x80-\xff]*)'
+_RE_CABECERA_B = re.compile(
+    rb"INSERT\s+INTO\s+(" + _IDENTIFICADOR_B + rb"(?:\s*\.\s*" + _IDENTIFICADOR_B + rb")?)"
+    rb"\s*\(([^)]*)\)\s*VALUES\s*",
+    re.IGNORECASE
+)
+# Lo que hay que mirar al buscar el próximo INSERT, entre sentencias o dentro de una
+_RE_ENTRE_SENTENCIAS_B = re.compile(rb'INSERT\s+INTO\b|[\'"]|--|/\*', re.IGNORECASE)
+_RE_DENTRO_SENTENCIA_B = re.compile(rb'INSERT\s+INTO\b|[;\'"]|--|/\*', re.IGNORECASE)
+_RE_INSERT_INICIO_LINEA_B = re.compile(rb'\n[ \t]*(INSERT\s+INTO\b)', re.IGNORECASE)
+_RE_INSERT_B = re.compile(rb'INSERT\s+INTO\b', re.IGNORECASE)
+_RE_BLANCOS_B = re.compile(rb'\s*')
+# Cierre de cada tramo en el que no se buscan sentencias
+_CIERRES = {b"'": b"'", b'"': b'"', b'--': b'\n', b'/*': b'*/'}
+
+# Nivel de valores
+_RE_NUMERO = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+_RE_ENTRE_FILAS = re.compile(r'\)\s*,\s*\(')
+_PALABRAS = {'NULL': None, 'TRUE': True, 'FALSE': False}
+# Marca que ocupa el lugar de cada texto entre comillas en el esqueleto de VALUES
+_HUECO = '\x00'
+_CAMPOS_SIMPLES = frozenset([_HUECO, 'NULL'])
+
+
+class ErrorTokenizador(ValueError):
+    pass
+
+
+def _numero(texto):
+    if '.' in texto or 'e' in texto or 'E' in texto:
+        return Decimal(texto)
+    return int(texto)
+
+
+_cache_columnas = {}
+
+
+def _columnas(texto, encoding='utf-8'):
+    columnas = _cache_columnas.get(texto)
+    if columnas is None:
+        lista = texto.decode(encoding) if isinstance(texto, bytes) else texto
+        columnas = tuple(col.strip() for col in lista.split(','))
+        if len(_cache_columnas) < 256:
+            _cache_columnas[texto] = columnas
+    return columnas
+
+
+def _fin_sentencia(texto, desde):
+    """
+    Posición del primer ';' de texto[desde:] que no está dentro de un texto
+    entre comillas, o -1 si no hay. Un ';' está fuera de comillas cuando antes
+    de él hay una cantidad par de comillas (las escapadas '' suman dos).
+    """
+    punto_y_coma, comilla = (b';', b"'") if isinstance(texto, bytes) else (';', "'")
+    comillas = 0
+    pos = desde
+    while True:
+        fin = texto.find(punto_y_coma, pos)
+        if fin == -1:
+            return -1
+        comillas += texto.count(comilla, pos, fin)
+        if comillas % 2 == 0:
+            return fin
+        pos = fin + 1
+
+
+def _proximo_limite(pendiente, desde, patron):
+    """
+    Primer INSERT INTO (o ';', según el patrón) de pendiente[desde:] fuera de
+    textos, identificadores entre comillas y comentarios. Devuelve
+    (b'INSERT', posición), (b';', posición) o (None, reanudar) si el búfer se
+    acaba antes. reanudar es el comienzo del tramo que quedó abierto o, si no
+    quedó ninguno, una cola corta por si "INSERT INTO" quedó partido en el final.
+    """
+    pos = desde
+    while True:
+        encontrado = patron.search(pendiente, pos)
+        if encontrado is None:
+            return None, max(pos, len(pendiente) - 16)
+        token = encontrado.group()
+        cierre = _CIERRES.get(token)
+        if cierre is None:
+            return (b';' if token == b';' else b'INSERT'), encontrado.start()
+        fin = pendiente.find(cierre, encontrado.end())
+        if token == b"'":
+            # Un INSERT al comienzo de una línea dentro del texto: la comilla no se cerró
+            corte = _RE_INSERT_INICIO_LINEA_B.search(
+                pendiente, encontrado.end(), len(pendiente) if fin == -1 else fin
+            )
+            if corte is not None:
+                return b'INSERT', corte.start(1)
+        if fin == -1:
+            return None, encontrado.start()
+        pos = fin + len(cierre)
+
+
+def _esqueleto_dudoso(esqueleto):
+    """
+    True si fuera de los textos de un VALUES hay comentarios, comillas dobles
+    o un INSERT: entonces el primer ';' puede no cerrar la sentencia y hay que
+    recorrerla con _proximo_limite. Se usa `in` y no una regex: con alternativas
+    e IGNORECASE el motor de re es unas diez veces más lento en este tramo.
+    """
+    return '--' in esqueleto or '/*' in esqueleto or '"' in esqueleto or 'INSERT' in esqueleto.upper()
+
+
+def _separar_textos(cuerpo):
+    """
+    Separa los textos entre comillas del resto del cuerpo de VALUES. Devuelve
+    (esqueleto, textos): el esqueleto es el cuerpo con cada texto reemplazado
+    por _HUECO, de modo que las comas y paréntesis que quedan son estructurales.
+    """
+    partes = cuerpo.split("'")
+    if len(partes) % 2 == 0:
+        raise ErrorTokenizador("comilla sin cerrar en VALUES")
+    return _unir_partes(partes, cuerpo)
+
+
+def _unir_partes(partes, cuerpo):
+    """_separar_textos a partir de cuerpo.split("'"), que ya tiene una cantidad impar de partes."""
+    if "''" not in cuerpo:
+        return _HUECO.join(partes[0::2]), partes[1::2]
+    # Hay comillas escapadas ('') o textos vacíos: un tramo "fuera" vacío entre
+    # dos tramos "dentro" solo puede venir de una comilla escapada
+    esqueleto = [partes[0]]
+    textos = []
+    i = 1
+    while i < len(partes):
+        texto = partes[i]
+        while i + 2 < len(partes) and partes[i + 1] == '':
+            texto += "'" + partes[i + 2]
+            i += 2
+        textos.append(texto)
+        esqueleto.append(partes[i + 1])
+        i += 2
+    return _HUECO.join(esqueleto), textos
+
+
+def _literal(campo, siguiente_texto):
+    if campo == _HUECO:
+        return siguiente_texto()
+    clave = campo.upper()
+    if clave in _PALABRAS:
+        return _PALABRAS[clave]
+    if _RE_NUMERO.fullmatch(campo):
+        return _numero(campo)
+    if not campo:
+        raise ErrorTokenizador("valor vacío en VALUES")
+    raise ErrorTokenizador(f"expresión no soportada en VALUES: {campo.replace(_HUECO, '...')[:40]}")
+
+
+_cache_formas = {}
+
+
+def _forma_simple(fila_esqueleto):
+    """
+    Para una fila de solo textos y NULL devuelve (cantidad de textos, función
+    que arma la tupla a partir de esos textos más un None al final); None si
+    la fila tiene otros literales.
+    """
+    campos = [campo.strip() for campo in fila_esqueleto.split(',')]
+    if not _CAMPOS_SIMPLES.issuperset(campos):
+        return None
+    huecos = campos.count(_HUECO)
+    posiciones = []
+    siguiente = 0
+    for campo in campos:
+        if campo == _HUECO:
+            posiciones.append(siguiente)
+            siguiente += 1
+        else:
+            posiciones.append(huecos)  # el None agregado al final
+    tomar = itemgetter(*posiciones)
+    return huecos, tomar if len(posiciones) > 1 else lambda valores: (tomar(valores),)
+
+
+def _filas_esqueleto(esqueleto):
+    esqueleto = esqueleto.strip()
+    if not (esqueleto.startswith('(') and esqueleto.endswith(')')):
+        raise ErrorTokenizador("VALUES debe ser una lista de filas entre paréntesis")
+    return _RE_ENTRE_FILAS.split(esqueleto[1:-1])
+
+
+def _filas(esqueleto, textos):
+    """
+    Filas tipadas a partir de (esqueleto, textos) de _separar_textos. Los
+    archivos de carga repiten unas pocas formas de VALUES de solo textos y
+    NULL: cada una se analiza una vez y queda en _cache_formas con las
+    funciones que arman sus tuplas en C.
+    """
+    formas = _cache_formas.get(esqueleto)
+    if formas is None:
+        formas = [_forma_simple(fila) for fila in _filas_esqueleto(esqueleto)]
+        if None in formas:
+            formas = ()
+        elif len(_cache_formas) < 256:
+            _cache_formas[esqueleto] = formas
+    if len(formas) == 1:
+        huecos, armar = formas[0]
+        textos.append(None)
+        return [armar(textos)]
+    if formas:
+        pendientes = iter(textos)
+        filas = []
+        for huecos, armar in formas:
+            valores = list(islice(pendientes, huecos))
+            valores.append(None)
+            filas.append(armar(valores))
+        return filas
+
+    siguiente_texto = iter(textos).__next__
+    filas = []
+    for fila_esqueleto in _filas_esqueleto(esqueleto):
+        campos = [campo.strip() for campo in fila_esqueleto.split(',')]
+        filas.append(tuple([_literal(campo, siguiente_texto) for campo in campos]))
+    return filas
+
+
+def tokenizar_valores(cuerpo):
+    """
+    Convierte el cuerpo de un VALUES ('a', 1, NULL), (...) en una lista de
+    tuplas tipadas. Lanza ErrorTokenizador si encuentra algo que no es un literal.
+    """
+    esqueleto, textos = _separar_textos(cuerpo)
+    return _filas(esqueleto, textos)
+
+
+def parsear_sentencia(sentencia):
+    """
+    Interpreta un único INSERT y devuelve (tabla, columnas, filas), o None si
+    el texto no es un INSERT con lista de columnas y VALUES literales.
+    """
+    sentencia = sentencia.strip()
+    match = _RE_CABECERA.match(sentencia)
+    if not match:
+        return None
+    fin = _fin_sentencia(sentencia, match.end())
+    if fin == -1 or sentencia[fin + 1:].strip():
+        return None
+    try:
+        filas = tokenizar_valores(sentencia[match.end():fin])
+    except ErrorTokenizador:
+        return None
+    columnas = _columnas(match.group(2))
+    if not filas or any(len(fila) != len(columnas) for fila in filas):
+        return None
+    return match.group(1), columnas, filas
+
+
+def leer_inserts(flujo, tamano_bloque=TAMANO_BLOQUE, encoding='utf-8'):
+    """
+    Recorre un flujo binario (archivo abierto en 'rb', mmap, BytesIO...) y
+    produce FilaInsert por cada fila y ErrorInsert por cada INSERT que no se
+    pudo interpretar. Lo que no es un INSERT (comentarios, SET, CREATE...) se ignora.
+    La codificación debe ser compatible con ASCII (utf-8, latin-1, cp1252): los
+    límites de sentencia se buscan en bytes y solo se decodifica cada sentencia.
+    """
+    pendiente = b''
+    linea_base = 1  # número de línea de pendiente[0]
+    # (bytes, tabla, columnas, texto) de la última cabecera: los INSERT de un
+    # volcado repiten la misma, que se compara con startswith en vez de la regex
+    cabecera = None
+    while True:
+        bloque = flujo.read(tamano_bloque)
+        fin_archivo = not bloque
+        pendiente += bloque
+
+        pos = 0
+        contado_hasta = 0
+        linea = linea_base
+        incompleta = False
+        while True:
+            # Lo normal es que la sentencia siguiente empiece, tras unos saltos de
+            # línea, con la misma cabecera; si no, se busca fuera de comentarios
+            ini = _RE_BLANCOS_B.match(pendiente, pos).end()
+            if not (cabecera and pendiente.startswith(cabecera[0], ini)):
+                limite, ini = _proximo_limite(pendiente, pos, _RE_ENTRE_SENTENCIAS_B)
+                if limite is None:
+                    reanudar = ini
+                    break
+            linea += pendiente.count(b'\n', contado_hasta, ini)
+            contado_hasta = ini
+
+            if cabecera is None or not pendiente.startswith(cabecera[0], ini):
+                match = _RE_CABECERA_B.match(pendiente, ini)
+                cabecera = match and (
+                    pendiente[ini:match.end()],
+                    match.group(1).decode(encoding),
+                    _columnas(match.group(2), encoding),
+                    pendiente[ini:match.end()].decode(encoding),
+                )
+
+            # Camino rápido: la sentencia termina en el primer ';' precedido por una
+            # cantidad par de comillas (los ';' de textos como 'SRID=9377;...' se
+            # saltan), si fuera de los textos no hay comentarios, comillas dobles
+            # ni otro INSERT. Los recuentos y búsquedas son de bytes, en C
+            esqueleto = None
+            if cabecera:
+                desde = ini + len(cabecera[0])
+                fin = pendiente.find(b';', desde)
+                while fin != -1 and pendiente.count(b"'", desde, fin) % 2:
+                    fin = pendiente.find(b';', fin + 1)
+                if fin != -1:
+                    sentencia = pendiente[ini:fin + 1].decode(encoding)
+                    cuerpo = sentencia[len(cabecera[3]):-1]
+                    esqueleto, textos = _unir_partes(cuerpo.split("'"), cuerpo)
+                    if _esqueleto_dudoso(esqueleto):
+                        esqueleto = None
+            else:
+                desde = ini + len(b'INSERT')
+
+            if esqueleto is None:
+                limite, fin = _proximo_limite(pendiente, desde, _RE_DENTRO_SENTENCIA_B)
+                if limite is None and not fin_archivo:
+                    # Sentencia cortada por el final del bloque: se completa con el siguiente
+                    incompleta = True
+                    pos = ini
+                    break
+                if limite != b';' or not cabecera:
+                    # Sin ';' (se come el INSERT siguiente o llega al final) o sin cabecera válida
+                    fin_sentencia = fin if limite == b'INSERT' else len(pendiente) if limite is None else fin + 1
+                    sentencia = pendiente[ini:fin_sentencia].decode(encoding).rstrip()
+                    yield ErrorInsert(linea, sentencia, "INSERT incompleto o mal formado")
+                    pos = fin_sentencia
+                    continue
+                sentencia = pendiente[ini:fin + 1].decode(encoding)
+                cuerpo = sentencia[len(cabecera[3]):-1]
+
+            _, tabla, columnas, _ = cabecera
+            try:
+                if esqueleto is None:
+                    esqueleto, textos = _separar_textos(cuerpo)
+                filas = _filas(esqueleto, textos)
+                for fila in filas:
+                    if len(fila) != len(columnas):
+                        raise ErrorTokenizador(f"{len(columnas)} columnas declaradas y {len(fila)} valores")
+            except ErrorTokenizador as e:
+                yield ErrorInsert(linea, sentencia, str(e))
+            else:
+                for fila in filas:
+                    yield FilaInsert(linea, tabla, columnas, fila, sentencia)
+            pos = fin + 1
+
+        if fin_archivo:
+            return
+        # Se descarta lo ya procesado; sin sentencia pendiente se guarda desde
+        # donde _proximo_limite debe reanudar la búsqueda
+        corte = pos if incompleta else reanudar
+        linea_base = linea + pendiente.count(b'\n', contado_hasta, corte)
+        pendiente = pendiente[corte:]
+
+
+def empieza_insert(datos, posicion):
+    """
+    True si la línea que empieza en datos[posicion] (bytes o mmap) abre un
+    INSERT. Para rangos_csv.partir_rangos: cortando solo antes de esas líneas,
+    una sentencia de varias líneas no se reparte entre dos rangos.
+    """
+    return _RE_INSERT_B.match(datos[posicion:posicion + 64].lstrip()) is not None
+
+
+def sentencias_por_linea(flujo, tamano_bloque=TAMANO_BLOQUE, encoding='utf-8'):
+    """
+    Agrupa las filas de leer_inserts por sentencia: produce (num_linea,
+    sentencia, tabla, columnas, filas) por cada INSERT válido y ErrorInsert
+    por cada uno que no se pudo interpretar.
+    """
+    actual = None
+    for elemento in leer_inserts(flujo, tamano_bloque, encoding):
+        if isinstance(elemento, ErrorInsert):
+            if actual:
+                yield actual
+                actual = None
+            yield elemento
+            continue
+        if actual and actual[0] == elemento.num_linea and actual[1] is elemento.sentencia:
+            actual[4].append(elemento.valores)
+            continue
+        if actual:
+            yield actual
+        actual = (elemento.num_linea, elemento.sentencia, elemento.tabla, elemento.columnas, [elemento.valores])
+    if actual:
+        yield actual
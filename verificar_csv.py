@@ -1,10 +1,13 @@
 import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_batch
+import io
 import multiprocessing
-import glob
 import time
 import os
+from familias import actualizar_familias
+from claves import normalizar_serie
+from rangos_csv import leer_bytes, planificar_rangos
 
 # --- TUS CREDENCIALES DE BASE DE DATOS ---
 DB_CREDS = {
@@ -15,74 +18,97 @@ DB_CREDS = {
     "port": "6543"
 }
 
-def procesar_chunk_para_recolectar(ruta_archivo_csv):
+# --- CONFIGURACIÓN ---
+ARCHIVO_CSV = 'Libro4.csv'
+# Cada proceso recibe varios rangos de bytes del archivo para repartir mejor la carga
+RANGOS_POR_PROCESO = 4
+
+def extraer_matriculas_y_relaciones(df):
+    """
+    Extrae de un DataFrame con las columnas de Libro4 las matrículas con su
+    estado y las relaciones padre -> hija, en forma de columnas (sin recorrer
+    fila por fila). Devuelve (matriculas, relaciones):
+      - matriculas: DataFrame [matricula, estado]. Una matrícula que aparece
+        como principal toma el estado de su última fila; una que solo aparece
+        como matriz o derivada queda 'ACTIVO' (valor por defecto).
+      - relaciones: DataFrame [padre, hija] sin duplicados.
+    """
+    actual = normalizar_serie(df['no_matricula_inmobiliaria'])
+    validas = actual != ''
+    actual = actual[validas]
+
+    principales = pd.DataFrame({
+        'matricula': actual,
+        'estado': df.loc[validas, 'estado_folio'].fillna('').astype(str).str.strip(),
+    }).drop_duplicates('matricula', keep='last')
+
+    def vecinos(columna):
+        # 'a, b,c' -> una fila por matrícula, conservando el índice de la fila de origen
+        partes = df.loc[validas, columna].fillna('').astype(str).str.split(',').explode()
+        partes = normalizar_serie(partes)
+        return partes[partes != '']
+
+    padres = vecinos('matriculas_matriz')
+    hijas = vecinos('matriculas_derivadas')
+    relaciones = pd.concat([
+        pd.DataFrame({'padre': padres.values, 'hija': actual.loc[padres.index].values}),
+        pd.DataFrame({'padre': actual.loc[hijas.index].values, 'hija': hijas.values}),
+    ], ignore_index=True).drop_duplicates(ignore_index=True)
+
+    referenciadas = pd.unique(pd.concat([padres, hijas], ignore_index=True))
+    solo_referenciadas = referenciadas[~pd.Series(referenciadas).isin(principales['matricula']).values]
+    matriculas = pd.concat([
+        principales,
+        pd.DataFrame({'matricula': solo_referenciadas, 'estado': 'ACTIVO'}),  # Valor por defecto
+    ], ignore_index=True)
+    return matriculas, relaciones
+
+
+def procesar_chunk_para_recolectar(ruta_archivo_csv, inicio, fin, columnas):
     """
-    Fase 1 (Paralela): Lee un CSV y devuelve las matrículas y relaciones encontradas.
-    NO se conecta a la base de datos.
+    Fase 1 (Paralela): Lee el rango de bytes [inicio, fin) del CSV y devuelve
+    las matrículas y relaciones encontradas. NO se conecta a la base de datos.
     """
     try:
-        df = pd.read_csv(ruta_archivo_csv, sep=';', dtype=str).fillna('')
-        
-        relaciones_potenciales = set()
-        matriculas_con_estado = {} # Usamos un diccionario para guardar matrícula -> estado
-
-        for index, row in df.iterrows():
-            matricula_actual = row['no_matricula_inmobiliaria'].strip()
-            if not matricula_actual:
-                continue
-
-            matriculas_con_estado[matricula_actual] = row['estado_folio'].strip()
-
-            matriculas_matriz_str = row['matriculas_matriz']
-            if matriculas_matriz_str:
-                padres = [p.strip() for p in matriculas_matriz_str.split(',') if p.strip()]
-                for padre in padres:
-                    # Guardamos el padre sin estado específico, se le asignará uno por defecto si no es principal
-                    if padre not in matriculas_con_estado:
-                        matriculas_con_estado[padre] = 'ACTIVO' # Valor por defecto
-                    relaciones_potenciales.add((padre, matricula_actual))
-
-            matriculas_derivadas_str = row['matriculas_derivadas']
-            if matriculas_derivadas_str:
-                hijas = [h.strip() for h in matriculas_derivadas_str.split(',') if h.strip()]
-                for hija in hijas:
-                    # Guardamos la hija sin estado específico
-                    if hija not in matriculas_con_estado:
-                        matriculas_con_estado[hija] = 'ACTIVO' # Valor por defecto
-                    relaciones_potenciales.add((matricula_actual, hija))
-
-        return (matriculas_con_estado, relaciones_potenciales)
+        df = pd.read_csv(io.BytesIO(leer_bytes(ruta_archivo_csv, inicio, fin)), sep=';',
+                         header=None, names=columnas, dtype=str).fillna('')
+        return extraer_matriculas_y_relaciones(df)
     except Exception as e:
-        print(f"Error leyendo {os.path.basename(ruta_archivo_csv)}: {e}")
-        return ({}, set())
+        print(f"Error leyendo {os.path.basename(ruta_archivo_csv)} (bytes {inicio}-{fin}): {e}")
+        return (pd.DataFrame(columns=['matricula', 'estado']), pd.DataFrame(columns=['padre', 'hija']))
 
 
 if __name__ == '__main__':
-    directorio_chunks = 'chunks_para_procesar'
-    archivos_csv = glob.glob(f'{directorio_chunks}/*.csv')
+    num_procesos = os.cpu_count()
+    # Los procesos leen rangos del archivo original: no hay chunks en disco que puedan quedar viejos
+    columnas, rangos = [], []
+    if os.path.exists(ARCHIVO_CSV):
+        columnas, rangos = planificar_rangos(ARCHIVO_CSV, num_procesos * RANGOS_POR_PROCESO)
 
-    if not archivos_csv:
-        print("🔴 No se encontraron archivos .csv en la carpeta 'chunks'.")
+    if not rangos:
+        print(f"🔴 No se encontraron filas para procesar en '{ARCHIVO_CSV}'.")
     else:
-        num_procesos = min(os.cpu_count(), len(archivos_csv))
-        print(f"🚀 Fase 1: Recolectando datos en paralelo con {num_procesos} procesos...")
+        print(f"🚀 Fase 1: Recolectando datos en paralelo con {num_procesos} procesos ({len(rangos)} rangos)...")
         
         inicio = time.time()
         with multiprocessing.Pool(processes=num_procesos) as pool:
-            resultados = pool.map(procesar_chunk_para_recolectar, archivos_csv)
+            resultados = pool.starmap(
+                procesar_chunk_para_recolectar,
+                [(ARCHIVO_CSV, inicio_rango, fin_rango, columnas) for inicio_rango, fin_rango in rangos]
+            )
         
         # --- Fase 2: Agregando todos los resultados en un solo lugar ---
-        master_matriculas = {}
-        master_relaciones = set()
-        for matriculas_con_estado, relaciones in resultados:
-            master_matriculas.update(matriculas_con_estado)
-            master_relaciones.update(relaciones)
+        # Los rangos se unen en el orden del archivo: el último que menciona una matrícula define su estado
+        master_matriculas = pd.concat([m for m, _ in resultados], ignore_index=True) \
+            .drop_duplicates('matricula', keep='last')
+        master_relaciones = pd.concat([r for _, r in resultados], ignore_index=True) \
+            .drop_duplicates(ignore_index=True)
             
         print(f"✅ Recolección completada en {time.time() - inicio:.2f} segundos.")
         print(f"   - Se encontraron {len(master_matriculas)} matrículas únicas en total.")
         print(f"   - Se encontraron {len(master_relaciones)} relaciones únicas en total.")
 
-        if not master_matriculas:
+        if master_matriculas.empty:
             print("No se encontraron matrículas para procesar. Finalizando.")
         else:
             # --- Fase 3: Escribiendo en la base de datos de forma secuencial ---
@@ -92,32 +118,33 @@ if __name__ == '__main__':
                     with conn.cursor() as cur:
                         # Paso A: Insertar todas las matrículas únicas
                         print("   - Insertando matrículas...")
-                        matriculas_a_insertar = list(master_matriculas.items())
+                        matriculas_a_insertar = list(zip(master_matriculas['matricula'], master_matriculas['estado']))
                         execute_batch(
                             cur,
-                            "INSERT INTO public.matriculas (no_matricula_inmobiliaria, estado_folio) VALUES (%s, %s) ON CONFLICT (no_matricula_inmobiliaria) DO NOTHING",
+                            "INSERT INTO public.matriculas (no_matricula_inmobiliaria, estado_folio) VALUES (%s, %s) ON CONFLICT DO NOTHING",
                             matriculas_a_insertar
                         )
                         print(f"     ... {cur.rowcount} matrículas nuevas insertadas/verificadas.")
 
-                        if master_relaciones:
+                        if not master_relaciones.empty:
                             # Paso B: Obtener los IDs de TODAS las matrículas necesarias
                             print("   - Obteniendo IDs para crear relaciones...")
-                            todas_las_matriculas_para_relacion = {m for rel in master_relaciones for m in rel}
+                            todas_las_matriculas_para_relacion = pd.unique(
+                                pd.concat([master_relaciones['padre'], master_relaciones['hija']])
+                            )
                             cur.execute(
-                                "SELECT no_matricula_inmobiliaria, id FROM public.matriculas WHERE no_matricula_inmobiliaria = ANY(%s)",
-                                (list(todas_las_matriculas_para_relacion),)
+                                "SELECT matricula_norm, id FROM public.matriculas WHERE matricula_norm = ANY(%s)",
+                                (todas_las_matriculas_para_relacion.tolist(),)
                             )
-                            id_map = dict(cur.fetchall())
+                            id_map = pd.Series(dict(cur.fetchall()), dtype='Int64')
 
                             # Paso C: Insertar todas las relaciones
                             print("   - Insertando relaciones...")
-                            relaciones_con_id = []
-                            for padre, hija in master_relaciones:
-                                padre_id = id_map.get(padre)
-                                hija_id = id_map.get(hija)
-                                if padre_id and hija_id:
-                                    relaciones_con_id.append((padre_id, hija_id))
+                            ids = pd.DataFrame({
+                                'padre_id': master_relaciones['padre'].map(id_map),
+                                'hija_id': master_relaciones['hija'].map(id_map),
+                            }).dropna()
+                            relaciones_con_id = list(zip(ids['padre_id'].astype(int).tolist(), ids['hija_id'].astype(int).tolist()))
                             
                             execute_batch(
                                 cur,
@@ -125,6 +152,10 @@ if __name__ == '__main__':
                                 relaciones_con_id
                             )
                             print(f"     ... {cur.rowcount} relaciones nuevas insertadas/verificadas.")
+
+                            # Paso D: Mantener la familia (componente conexa) de las matrículas tocadas
+                            print("   - Actualizando familias...")
+                            actualizar_familias(cur, relaciones_con_id)
                         
                         conn.commit()
                 print("✅ Escritura en la base de datos completada.")
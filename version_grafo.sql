@@ -0,0 +1,40 @@
+-- Versión de los datos del grafo de linaje (public.matriculas y
+-- public.relacionesmatriculas), para invalidar el índice en memoria y los
+-- grafos memorizados de app.py.
+--
+--   version_grafo_seq          avanza con cualquier sentencia que modifique el
+--                              grafo; su last_value es la versión de los datos.
+--   version_grafo_cambios_seq  avanza solo con UPDATE, DELETE y TRUNCATE. Si no
+--                              se movió desde el último refresco, todo lo nuevo
+--                              fueron altas y el índice se pone al día en forma
+--                              incremental; si se movió, se reconstruye completo.
+--
+-- En matriculas solo cuentan los UPDATE de las columnas que usa el grafo: los
+-- de familia_id (familias.actualizar_familias, en cada lote de relaciones) no
+-- obligan a reconstruir el índice. Se usan secuencias y no una fila de control
+-- porque nextval no toma bloqueos (como en version_terrenos.sql).
+CREATE SEQUENCE IF NOT EXISTS public.version_grafo_seq;
+CREATE SEQUENCE IF NOT EXISTS public.version_grafo_cambios_seq;
+
+CREATE OR REPLACE FUNCTION public.avanzar_version_grafo()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM nextval('public.version_grafo_seq');
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM nextval('public.version_grafo_cambios_seq');
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_version_grafo ON public.matriculas;
+CREATE TRIGGER trg_version_grafo
+    AFTER INSERT OR UPDATE OF no_matricula_inmobiliaria, estado_folio OR DELETE OR TRUNCATE ON public.matriculas
+    FOR EACH STATEMENT EXECUTE FUNCTION public.avanzar_version_grafo();
+
+DROP TRIGGER IF EXISTS trg_version_grafo ON public.relacionesmatriculas;
+CREATE TRIGGER trg_version_grafo
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.relacionesmatriculas
+    FOR EACH STATEMENT EXECUTE FUNCTION public.avanzar_version_grafo();
@@ -0,0 +1,26 @@
+-- Versión de los datos de public.terrenos, para invalidar las cachés que se
+-- derivan de sus geometrías (teselas vectoriales de servidor_teselas.py y
+-- terrenos en memoria de app.py).
+-- Cualquier sentencia que modifique la tabla (INSERT, COPY, UPDATE, DELETE o
+-- TRUNCATE, como en una recarga con carga.py) avanza la secuencia; la versión
+-- vigente es su last_value. Se usa una secuencia y no una fila de control
+-- porque nextval no toma bloqueos: las cargas en paralelo no se esperan entre sí.
+CREATE SEQUENCE IF NOT EXISTS public.version_terrenos_seq;
+
+CREATE OR REPLACE FUNCTION public.avanzar_version_terrenos()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM nextval('public.version_terrenos_seq');
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_version_terrenos ON public.terrenos;
+CREATE TRIGGER trg_version_terrenos
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.terrenos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.avanzar_version_terrenos();
+
+-- Las teselas filtran por caja con geom && ...: sin este índice cada tesela recorre la tabla
+CREATE INDEX IF NOT EXISTS idx_terrenos_geom ON public.terrenos USING GIST (geom);
@@ -3,10 +3,14 @@ import pandas as pd
 import networkx as nx
 from pyvis.network import Network
 import sys
+from indice_grafo import IndiceGrafo
+from disposicion_grafo import disposicion_por_capas
+from claves import normalizar_matricula
 
-def generar_grafo_matricula(no_matricula_inicial, db_params):
+def generar_grafo_matricula(no_matricula_inicial, db_params, indice=None):
     """
     Genera un grafo interactivo para una matrícula específica y sus familiares.
+    Si se pasa un IndiceGrafo, la familia se resuelve en memoria sin consulta recursiva.
     """
     print(f"🔎 Buscando familiares para la matrícula: {no_matricula_inicial}...")
 
@@ -18,7 +22,7 @@ def generar_grafo_matricula(no_matricula_inicial, db_params):
         SELECT m.id,
             ARRAY[m.id] AS path
         FROM public.matriculas m
-        WHERE m.no_matricula_inmobiliaria = %(start_node)s
+        WHERE m.matricula_norm = %(start_node)s
 
         UNION ALL
 
@@ -46,8 +50,8 @@ def generar_grafo_matricula(no_matricula_inicial, db_params):
     )
 
     SELECT
-        padre.no_matricula_inmobiliaria AS padre,
-        hija.no_matricula_inmobiliaria  AS hija
+        padre.matricula_norm AS padre,
+        hija.matricula_norm  AS hija
     FROM public.relacionesmatriculas rel
     JOIN public.matriculas padre ON rel.matricula_padre_id = padre.id
     JOIN public.matriculas hija  ON rel.matricula_hija_id = hija.id
@@ -56,9 +60,13 @@ def generar_grafo_matricula(no_matricula_inicial, db_params):
     """
 
     try:
-        with psycopg2.connect(**db_params) as conn:
-            # Usamos pandas para ejecutar la consulta y obtener los resultados
-            df = pd.read_sql_query(query_recursiva, conn, params={'start_node': no_matricula_inicial})
+        if indice is not None:
+            filas = indice.relaciones_familia(no_matricula_inicial)
+            df = pd.DataFrame([fila[:2] for fila in filas], columns=['padre', 'hija'])
+        else:
+            with psycopg2.connect(**db_params) as conn:
+                # Usamos pandas para ejecutar la consulta y obtener los resultados
+                df = pd.read_sql_query(query_recursiva, conn, params={'start_node': normalizar_matricula(no_matricula_inicial)})
 
         if df.empty:
             print(f"⚠️ No se encontraron relaciones para la matrícula '{no_matricula_inicial}'.")
@@ -71,24 +79,27 @@ def generar_grafo_matricula(no_matricula_inicial, db_params):
         net = Network(height="800px", width="100%", directed=True, notebook=False, cdn_resources='in_line')
         net.from_nx(g)
 
+        # Coordenadas por capas calculadas aquí: el navegador solo dibuja, sin layout jerárquico
+        posiciones = disposicion_por_capas(g, separacion_nodos=100)
         for node in net.nodes:
-            if node["id"] == no_matricula_inicial:
+            node["x"], node["y"] = posiciones[node["id"]]
+            if node["id"] == normalizar_matricula(no_matricula_inicial):
                 node["color"] = "#FF0000"
                 node["size"] = 40
 
-                net.set_options("""
+        net.set_options("""
         var options = {
           "layout": {
             "hierarchical": {
-              "enabled": true,
-              "direction": "UD",
-              "sortMethod": "directed",
-              "levelSeparation": 150,
-              "nodeSpacing": 100
-            }
+              "enabled": false
+            },
+            "improvedLayout": false
           },
           "physics": {
             "enabled": false
+          },
+          "edges": {
+            "smooth": false
           }
         }
         """)
@@ -112,9 +123,16 @@ if __name__ == "__main__":
     }
 
     # Obtenemos el número de matrícula desde los argumentos de la línea de comandos
-    if len(sys.argv) > 1:
-        matricula_a_buscar = sys.argv[1]
-        generar_grafo_matricula(matricula_a_buscar, db_credenciales)
+    # Con --indice se carga el grafo completo en memoria y la familia se resuelve sin consulta recursiva
+    usar_indice = '--indice' in sys.argv
+    argumentos = [a for a in sys.argv[1:] if a != '--indice']
+    if argumentos:
+        matricula_a_buscar = argumentos[0]
+        indice = None
+        if usar_indice:
+            with psycopg2.connect(**db_credenciales) as conn:
+                indice = IndiceGrafo.desde_db(conn)
+        generar_grafo_matricula(matricula_a_buscar, db_credenciales, indice)
     else:
-        print("🔴 Uso: python visualizar_grafo.py <numero_de_matricula>")
+        print("🔴 Uso: python visualizar_grafo.py <numero_de_matricula> [--indice]")
         print("   Ejemplo: python visualizar_grafo.py 1037472")
\ No newline at end of file